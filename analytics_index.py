@@ -0,0 +1,188 @@
+import glob
+import os
+import threading
+import numpy as np
+from config import ANALYTICS_DB, REPORTS_DIR, NORMAL_RANGES, TEXT_COLUMNS
+from database import connect
+
+
+def value_status(parameter, value):
+    """Classify a value against NORMAL_RANGES (same rules as Visualizer)"""
+    ranges = NORMAL_RANGES.get(parameter)
+    if not ranges or ranges["min"] == ranges["max"] == 0:
+        return "Unknown"
+    if value < ranges["min"]:
+        return "Low"
+    if value > ranges["max"]:
+        return "High"
+    return "Normal"
+
+
+class AnalyticsIndex:
+    """Consolidated index of numeric observations across all users' reports.
+
+    One row per (user, report, parameter) keeps each parameter's values
+    contiguous in the (parameter, month) index, so population-level
+    aggregates never open the per-user workbooks.
+    """
+
+    def __init__(self, db_path=ANALYTICS_DB):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._ensure_schema()
+
+    def _connect(self):
+        return connect(self.db_path)
+
+    def _ensure_schema(self):
+        """Create tables and indexes if they don't exist"""
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS observations (
+                    username TEXT NOT NULL,
+                    row_index INTEGER NOT NULL,
+                    month TEXT,
+                    report_type TEXT,
+                    parameter TEXT NOT NULL,
+                    value REAL NOT NULL,
+                    status TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_observations_parameter
+                    ON observations (parameter, month, status, value);
+                CREATE INDEX IF NOT EXISTS idx_observations_user
+                    ON observations (username, row_index);
+            """)
+
+    def _observations(self, username, row_index, report):
+        """Turn one report row into observation tuples"""
+        report_date = report.get("Date")
+        month = str(report_date)[:7] if report_date is not None else None
+        report_type = report.get("Report Type")
+
+        for parameter, value in report.items():
+            if parameter in TEXT_COLUMNS or value is None:
+                continue
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                continue
+            if np.isnan(value):
+                continue
+            yield (username, row_index, month, report_type, parameter, value,
+                   value_status(parameter, value))
+
+    def add_report(self, username, row_index, report):
+        """Index one newly inserted report"""
+        rows = list(self._observations(username, row_index, report))
+        with self._lock, self._connect() as conn:
+            conn.executemany("INSERT INTO observations VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def update_report(self, username, row_index, report):
+        """Re-index an edited row"""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM observations WHERE username = ? AND row_index = ?", (username, row_index))
+            conn.executemany("INSERT INTO observations VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             self._observations(username, row_index, report))
+
+    def delete_report(self, username, row_index):
+        """Remove one row; later rows shift up by one as in the workbook"""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM observations WHERE username = ? AND row_index = ?", (username, row_index))
+            conn.execute("UPDATE observations SET row_index = row_index - 1 WHERE username = ? AND row_index > ?",
+                         (username, row_index))
+
+    def reindex_user(self, username, indexed_reports):
+        """Replace a user's observations with (row_index, report) pairs"""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM observations WHERE username = ?", (username,))
+            for row_index, report in indexed_reports:
+                conn.executemany(
+                    "INSERT INTO observations VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    self._observations(username, row_index, report)
+                )
+
+    def rebuild(self, reports_dir=REPORTS_DIR):
+        """Rebuild the index from every user's workbook"""
+        from data_manager import DataManager
+
+        for path in glob.glob(os.path.join(reports_dir, "*_reports.xlsx")):
+            username = os.path.basename(path)[:-len("_reports.xlsx")]
+            manager = DataManager(username, analytics_index=self)
+            self.reindex_user(username, manager._iter_rows())
+
+    def _where(self, parameter=None, month=None, status=None, report_type=None):
+        """Build a WHERE clause for the common filters"""
+        clauses, params = [], []
+        for column, value in (("parameter", parameter), ("month", month),
+                              ("status", status), ("report_type", report_type)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def count_reports(self, parameter=None, month=None, status=None, report_type=None):
+        """Count reports with a matching observation (e.g. High SGPT this month)"""
+        where, params = self._where(parameter, month, status, report_type)
+        with self._connect() as conn:
+            return conn.execute(
+                f"SELECT COUNT(DISTINCT username || ':' || row_index) FROM observations{where}",
+                params
+            ).fetchone()[0]
+
+    def percentiles(self, parameter, q=(5, 25, 50, 75, 95), month=None, report_type=None):
+        """Get percentiles of a parameter's values"""
+        where, params = self._where(parameter, month, None, report_type)
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT value FROM observations{where}", params).fetchall()
+        values = np.array(rows, dtype=float).ravel()
+        if values.size == 0:
+            return {}
+        return dict(zip(q, np.percentile(values, q).round(3).tolist()))
+
+    def abnormal_rates(self, parameter=None, month=None, by_month=True):
+        """Get counts and Low/High rates per parameter (and per month)
+
+        Only values with a reference range count; Unknown ones (0-0 ranges)
+        would otherwise dilute the rates.
+        """
+        where, params = self._where(parameter, month)
+        where += (" AND " if where else " WHERE ") + "status IN ('Low', 'Normal', 'High')"
+        group = "parameter, month" if by_month else "parameter"
+        with self._connect() as conn:
+            rows = conn.execute(f"""
+                SELECT {group}, COUNT(*),
+                       SUM(status = 'Low'), SUM(status = 'High')
+                FROM observations{where}
+                GROUP BY {group}
+                ORDER BY {group}
+            """, params).fetchall()
+
+        results = []
+        for row in rows:
+            *keys, total, low, high = row
+            entry = {"parameter": keys[0], "total": total, "low": low, "high": high,
+                     "abnormal_rate": round((low + high) / total, 4) if total else 0.0}
+            if by_month:
+                entry["month"] = keys[1]
+            results.append(entry)
+        return results
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Cross-user analytics index")
+    parser.add_argument("command", choices=["rebuild", "rates", "percentiles"])
+    parser.add_argument("--parameter")
+    parser.add_argument("--month")
+    args = parser.parse_args()
+
+    index = AnalyticsIndex()
+    if args.command == "rebuild":
+        index.rebuild()
+        print("Analytics index rebuilt")
+    elif args.command == "rates":
+        print(json.dumps(index.abnormal_rates(args.parameter, args.month), indent=2))
+    else:
+        print(json.dumps(index.percentiles(args.parameter, month=args.month), indent=2))
@@ -1,12 +1,12 @@
 import streamlit as st
-from auth import AuthManager
-from ocr_processor import OCRProcessor
-from data_manager import DataManager
-from visualizer import Visualizer
-from config import NORMAL_RANGES, REPORT_TYPES
-import pandas as pd
-import os
-from datetime import datetime
+import difflib
+from resources import (get_auth_manager, get_data_manager, get_ocr_processor,
+                       get_visualizer, get_near_duplicate_index)
+from ingest_index import content_hash
+from config import NORMAL_RANGES, REPORT_TYPES, SESSION_COOKIE, SESSION_TOKEN_TTL
+
+# Heavy dependencies (pytesseract, pdf2image, openpyxl, ...) are imported
+# lazily by the pages that use them, so the login page renders without them
 
 # ----------------------------------
 # PAGE CONFIG
@@ -31,12 +31,47 @@ if "selected_family_member" not in st.session_state:
 if "family_members" not in st.session_state:
     st.session_state.family_members = {}
 
-auth_manager = AuthManager()
+if "session_token" not in st.session_state:
+    st.session_state.session_token = None
+
+auth_manager = get_auth_manager()
+
+# ----------------------------------
+# SESSION COOKIE
+# ----------------------------------
+def set_session_cookie(token):
+    """Store the session token in a browser cookie, or clear it when token is None.
+
+    The token never goes in the URL, where browser history, shared links
+    and screenshots would leak it.
+    """
+    max_age = SESSION_TOKEN_TTL if token else 0
+    st.html(f"""<script>
+        const secure = location.protocol === "https:" ? "; Secure" : "";
+        document.cookie = "{SESSION_COOKIE}={token or ''}; Max-Age={max_age}; Path=/; SameSite=Strict" + secure;
+    </script>""", unsafe_allow_javascript=True)
+
+
+# Tokens from older versions were kept in the URL; drop them from the address bar
+st.query_params.pop("session", None)
+
+# Resume a session from its signed token cookie (survives reconnects and new tabs)
+session_cookie = st.context.cookies.get(SESSION_COOKIE)
+if not st.session_state.logged_in and session_cookie:
+    username = auth_manager.resume_session(session_cookie)
+    if username:
+        st.session_state.logged_in = True
+        st.session_state.username = username
+        st.session_state.session_token = session_cookie
+        st.session_state.family_members = auth_manager.get_family_members(username)
 
 # ----------------------------------
 # LOGOUT
 # ----------------------------------
 def logout():
+    if st.session_state.session_token:
+        auth_manager.end_session(st.session_state.session_token)
+    st.session_state.session_token = None
     st.session_state.logged_in = False
     st.session_state.username = None
     st.session_state.selected_patient = None
@@ -66,6 +101,7 @@ def login_page():
                     st.session_state.logged_in = True
                     st.session_state.username = username
                     st.session_state.family_members = auth_manager.get_family_members(username)
+                    st.session_state.session_token = auth_manager.create_session(username)
                     st.success(msg)
                     st.rerun()
                 else:
@@ -143,18 +179,13 @@ def main_app():
         if st.button("Logout", type="primary", key="logout_button"):
             logout()
 
-    # IMPORTANT: Correct DataManager usage
-    data_manager = DataManager(st.session_state.username)
-
-    ocr = OCRProcessor()
-    visualizer = Visualizer()
-
+    # Shared per-process (and per-user) instances, created on first use
     if page == "📤 Upload Report":
-        upload_page(data_manager, ocr)
+        upload_page(get_data_manager(st.session_state.username), get_ocr_processor())
     elif page == "📊 Dashboard":
-        dashboard_page(data_manager, visualizer)
+        dashboard_page(get_data_manager(st.session_state.username), get_visualizer())
     elif page == "📋 All Reports":
-        all_reports_page(data_manager)
+        all_reports_page(get_data_manager(st.session_state.username))
     elif page == "👨‍👩‍👧‍👦 Family Profiles":
         family_profiles_page(auth_manager)
     elif page == "⚙️ Settings":
@@ -163,29 +194,138 @@ def main_app():
 # ----------------------------------
 # UPLOAD PAGE
 # ----------------------------------
+def match_family_profile(patient_name):
+    """Best-matching profile label for an OCRed patient name, or None"""
+    if not patient_name:
+        return None
+
+    candidates = {st.session_state.username: f"👤 {st.session_state.username}"}
+    for m in (st.session_state.family_members or {}).values():
+        candidates[m["name"]] = f"{m['name']} ({m['relationship']})"
+
+    best, score = None, 0.0
+    for name, label in candidates.items():
+        ratio = difflib.SequenceMatcher(None, patient_name.lower(), str(name).lower()).ratio()
+        if ratio > score:
+            best, score = label, ratio
+    return best if score >= 0.6 else None
+
 def upload_page(data_manager, ocr):
-    st.title("📤 Upload Medical Report")
+    from batch_processor import BatchProcessor
 
-    uploaded = st.file_uploader("Upload PDF Report", type=["pdf"], key="pdf_upload")
+    st.title("📤 Upload Medical Reports")
 
-    if uploaded:
-        with st.spinner("Processing OCR..."):
-            try:
-                pdf_bytes = uploaded.read()
-                parsed, text = ocr.process_pdf_report(pdf_bytes)
+    uploaded_files = st.file_uploader(
+        "Upload PDF Reports", type=["pdf"], accept_multiple_files=True, key="pdf_upload"
+    )
 
-                st.success("OCR Successful!")
-                st.json(parsed)
+    if not uploaded_files:
+        return
 
-                success, msg = data_manager.add_report(parsed)
-                if success:
-                    st.success("Report Saved 👍")
-                else:
-                    st.error(msg)
+    username = st.session_state.username
+    # Reruns keep the files in the uploader; never OCR or save them twice
+    results = st.session_state.setdefault("upload_results", {})
+    first_pages = st.session_state.setdefault("upload_first_pages", {})
+    forced = st.session_state.setdefault("upload_forced", set())
+
+    jobs = []
+    for uploaded in uploaded_files:
+        pdf_bytes = uploaded.getvalue()
+        digest = content_hash(pdf_bytes)
+
+        if digest in results:
+            with st.expander(f"✅ {uploaded.name}: Report Saved 👍"):
+                st.json(results[digest])
+        elif data_manager.find_uploaded_report(digest) is not None:
+            st.info(f"{uploaded.name}: this file has already been uploaded and saved.")
+        elif digest not in {job["digest"] for job in jobs}:
+            jobs.append({
+                "name": uploaded.name,
+                "pdf_bytes": pdf_bytes,
+                "digest": digest,
+                "first_page_text": first_pages.get(digest)
+            })
+
+    if not jobs:
+        return
 
-            except Exception as e:
-                st.error(f"Error: {str(e)}")
-                st.info("Ensure Tesseract & Poppler installed")
+    # Cheap first-page pass: catch rescans/reprints before OCRing the rest
+    near_duplicates = get_near_duplicate_index()
+
+    def near_duplicate_check(job):
+        if job["digest"] in forced:
+            return None
+        for doc_id, similarity in near_duplicates.query(username, job["first_page_text"]):
+            if data_manager.find_uploaded_report(doc_id) is not None:
+                return similarity
+        return None
+
+    # One progress bar, preview line and live value table per file
+    progress, previews, values = {}, {}, {}
+    for job in jobs:
+        progress[job["digest"]] = st.progress(0.0, text=f"{job['name']}: queued")
+        previews[job["digest"]] = st.empty()
+        values[job["digest"]] = st.empty()
+    finished, similar = [], []
+
+    for event in BatchProcessor(ocr, user=username).run(jobs, near_duplicate_check):
+        job = event["job"]
+        bar = progress[job["digest"]]
+        first_pages[job["digest"]] = job.get("first_page_text")
+
+        if event["type"] == "page":
+            bar.progress(event["page"] / max(event["total"], 1),
+                         text=f"{job['name']}: page {event['page']}/{event['total']}")
+            detected = {
+                param: value for param, value in event["partial"].items()
+                if param in NORMAL_RANGES and value is not None
+            }
+            if detected:
+                values[job["digest"]].dataframe(
+                    [{"Parameter": param, "Value": value} for param, value in detected.items()],
+                    use_container_width=True
+                )
+        elif event["type"] == "preview":
+            preview = event["preview"]
+            profile = match_family_profile(preview.get("Patient Name"))
+            previews[job["digest"]].info(
+                f"👤 {preview.get('Patient Name') or 'Unknown patient'}"
+                f" | {preview.get('Patient Age') or '?'} | {preview.get('Patient Gender') or '?'}"
+                f" | 📋 {preview.get('Report Type')}"
+                + (f" | Profile: {profile}" if profile else "")
+            )
+        elif event["type"] == "similar":
+            similar.append(job)
+            bar.progress(1.0, text=f"{job['name']}: skipped, {event['similarity']:.0%} similar to a saved report")
+        elif event["type"] == "done":
+            finished.append(event)
+            bar.progress(1.0, text=f"{job['name']}: OCR complete")
+        else:
+            bar.progress(1.0, text=f"{job['name']}: failed")
+            st.error(f"{job['name']}: {event['message']}")
+            st.info("Ensure Tesseract & Poppler installed")
+
+    if finished:
+        # One workbook write for the whole batch
+        outcomes = data_manager.add_reports(
+            [(event["parsed"], event["job"]["digest"], event["text"]) for event in finished]
+        )
+        for event, (success, msg) in zip(finished, outcomes):
+            job = event["job"]
+            if success:
+                results[job["digest"]] = event["parsed"]
+                near_duplicates.add(username, job["digest"], job["first_page_text"], kind="first_page")
+                near_duplicates.add(username, job["digest"], event["text"], kind="full_text")
+                with st.expander(f"✅ {job['name']}: " + ("Report Saved 👍" if msg == "Report added successfully" else msg)):
+                    st.json(event["parsed"])
+            else:
+                st.error(f"{job['name']}: {msg}")
+
+    if similar:
+        st.warning(f"{len(similar)} file(s) look like reports you already uploaded.")
+        if st.button("Process anyway", key="process_similar_anyway"):
+            forced.update(job["digest"] for job in similar)
+            st.rerun()
 
 # ----------------------------------
 # DASHBOARD
@@ -200,39 +340,125 @@ def dashboard_page(data_manager, visualizer):
         return
 
     st.subheader("Latest Report")
-    latest = df.iloc[-1]
+    latest = df.iloc[0]  # get_all_reports is newest first
     st.info(f"📅 {latest.get('Date','')} | 📋 {latest.get('Report Type','')}")
 
+    status_table = visualizer.create_status_table(latest.to_dict())
+    if not status_table.empty:
+        st.dataframe(status_table, use_container_width=True)
+
+    st.subheader("⚠️ Alerts")
+    alerts = visualizer.create_alert_table(df)
+    if alerts.empty:
+        st.success("No abnormal values in your history")
+    else:
+        st.dataframe(alerts, use_container_width=True)
+
+    st.subheader("📈 Trend Summary")
+    trends = data_manager.get_trend_summary()
+    if not trends.empty:
+        st.dataframe(trends, use_container_width=True)
+
     st.subheader("Trend Charts")
 
-    params = [c for c in df.columns if c not in ["Date", "Report Type", "Patient Name", "Notes"]]
+    params = [c for c in df.columns if c in NORMAL_RANGES and df[c].notna().any()]
 
-    for param in params[:6]:
-        fig = visualizer.create_multi_test_trend_chart(df, param, latest.get("Report Type", "Report"))
-        if fig:
-            st.plotly_chart(fig, use_container_width=True)
+    # Long histories are downsampled; zooming into a window redraws it at full resolution
+    zoom = st.date_input("Zoom to dates", value=(), key="dashboard_zoom")
+    x_range = tuple(zoom) if len(zoom) == 2 else None
+
+    # One small-multiples figure, reused across reruns until the data changes
+    fig = visualizer.create_dashboard_figure(
+        df, params[:6], latest.get("Report Type", "Report"),
+        x_range=x_range, data_version=data_manager.data_version()
+    )
+    if fig:
+        st.plotly_chart(fig, use_container_width=True)
 
 # ----------------------------------
 # ALL REPORTS
 # ----------------------------------
 def all_reports_page(data_manager):
+    from data_manager import get_report_columns
+    from exporter import ReportExporter, EXPORT_FORMATS, available_export_formats
+
     st.title("📋 All Reports")
 
-    df = data_manager.get_all_reports()
+    # Filters are pushed down to storage; only the visible page is loaded
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        report_type = st.selectbox("Report Type", ["All"] + REPORT_TYPES, key="reports_report_type")
+    with col2:
+        patient = st.selectbox("Profile", ["All"] + data_manager.get_distinct_values("Patient Name"), key="reports_patient")
+    with col3:
+        date_range = st.date_input("Date Range", value=(), key="reports_date_range")
+
+    report_type = None if report_type == "All" else report_type
+    patient = None if patient == "All" else patient
+    start_date, end_date = (tuple(date_range) + (None, None))[:2]
+
+    available_columns = get_report_columns(report_type)
+    columns = st.multiselect("Columns", available_columns, default=available_columns, key="reports_columns")
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        sort_by = st.selectbox("Sort By", columns or available_columns, key="reports_sort_by")
+    with col2:
+        ascending = st.radio("Order", ["Newest / Highest first", "Oldest / Lowest first"], key="reports_order") != "Newest / Highest first"
+    with col3:
+        page_size = st.selectbox("Rows per page", [25, 50, 100, 250], index=1, key="reports_page_size")
+
+    filters = dict(start_date=start_date, end_date=end_date, patient=patient, report_type=report_type)
+
+    # Answered from the full-text index; "quoted phrases" and prefix* work
+    query = st.text_input("Search report text", key="reports_search",
+                          placeholder='e.g. "fatty liver" or bilirub*')
+    if query.strip():
+        results = data_manager.search_reports(query, profile=patient, start_date=start_date, end_date=end_date,
+                                               report_type=report_type or None)
+        if results:
+            st.dataframe([{"Date": r["date"], "Profile": r["profile"], "Report Type": r["report_type"],
+                           "Match": r["snippet"]} for r in results], use_container_width=True)
+        else:
+            st.info("No reports match this search")
 
-    if df.empty:
+    page = st.session_state.get("reports_page", 1)
+    df, total = data_manager.query_reports(
+        page=page, page_size=page_size, sort_by=sort_by, ascending=ascending,
+        columns=columns or available_columns, **filters
+    )
+
+    if total == 0:
         st.info("No reports yet")
         return
 
-    st.dataframe(df, use_container_width=True)
+    page_count = (total + page_size - 1) // page_size
+    if page > page_count:
+        st.session_state.reports_page = page_count
+        st.rerun()
 
-    if os.path.exists(data_manager.excel_file):
-        with open(data_manager.excel_file, "rb") as f:
+    st.dataframe(df, use_container_width=True)
+    st.number_input("Page", min_value=1, max_value=page_count, step=1, key="reports_page")
+    st.caption(f"Showing {(page - 1) * page_size + 1}-{min(page * page_size, total)} of {total} reports")
+
+    st.subheader("Export")
+    export_format = st.selectbox("Format", available_export_formats(), key="export_format")
+
+    if st.button("Prepare Export", key="export_button"):
+        exporter = ReportExporter(data_manager)
+        try:
+            # download_button needs bytes, not a file object
+            with exporter.export_to_tempfile(export_format, columns=columns or None, **filters) as export_file:
+                export_data = export_file.read()
+        except Exception as e:
+            st.error(f"Export failed: {str(e)}")
+        else:
+            file_name, mime = EXPORT_FORMATS[export_format]
             st.download_button(
-                "Download Excel",
-                f,
-                file_name="reports.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                f"Download {export_format.upper()}",
+                export_data,
+                file_name=file_name,
+                mime=mime
             )
 
 # ----------------------------------
@@ -260,6 +486,10 @@ def settings_page():
 # RUN APP
 # ----------------------------------
 if __name__ == "__main__":
+    # Cookies are read when the browser connects, so compare against what it sent then
+    if st.session_state.session_token != session_cookie and (st.session_state.session_token or session_cookie):
+        set_session_cookie(st.session_state.session_token)
+
     if not st.session_state.logged_in:
         login_page()
     else:
@@ -1,50 +1,51 @@
-import json
 import bcrypt
-import os
-import pandas as pd  # Add this import
-from config import USERS_FILE, FAMILY_PROFILES_FILE
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from config import AUTH_WORKERS, LOGIN_RATE_LIMIT, LOGIN_RATE_WINDOW
+from user_store import UserStore
+from session_tokens import SessionTokenManager
 
-class AuthManager:
-    def __init__(self):
-        self.users_file = USERS_FILE
-        self.family_profiles_file = FAMILY_PROFILES_FILE
-        self._ensure_files()
-    
-    def _ensure_files(self):
-        """Create files if they don't exist"""
-        if not os.path.exists(self.users_file):
-            with open(self.users_file, 'w') as f:
-                json.dump({}, f)
-        
-        if not os.path.exists(self.family_profiles_file):
-            with open(self.family_profiles_file, 'w') as f:
-                json.dump({}, f)
-    
-    def _load_users(self):
-        """Load users from JSON file"""
-        try:
-            with open(self.users_file, 'r') as f:
-                return json.load(f)
-        except:
-            return {}
+# bcrypt releases the GIL, so a small shared pool keeps password checks from
+# piling up on the script threads of every session at once
+_password_pool = ThreadPoolExecutor(max_workers=AUTH_WORKERS, thread_name_prefix="bcrypt")
+
+
+class LoginRateLimiter:
+    """Sliding-window limit on password checks per username"""
     
-    def _save_users(self, users):
-        """Save users to JSON file"""
-        with open(self.users_file, 'w') as f:
-            json.dump(users, f, indent=2)
+    def __init__(self, limit=LOGIN_RATE_LIMIT, window=LOGIN_RATE_WINDOW):
+        self.limit = limit
+        self.window = window
+        self._attempts = {}
+        self._lock = threading.Lock()
     
-    def _load_family_profiles(self):
-        """Load family profiles"""
-        try:
-            with open(self.family_profiles_file, 'r') as f:
-                return json.load(f)
-        except:
-            return {}
+    def acquire(self, username):
+        """Record an attempt, returns seconds to wait (0 if allowed)"""
+        now = time.monotonic()
+        with self._lock:
+            attempts = self._attempts.setdefault(username, deque())
+            while attempts and attempts[0] <= now - self.window:
+                attempts.popleft()
+            if len(attempts) >= self.limit:
+                return int(attempts[0] + self.window - now) + 1
+            attempts.append(now)
+            return 0
     
-    def _save_family_profiles(self, profiles):
-        """Save family profiles"""
-        with open(self.family_profiles_file, 'w') as f:
-            json.dump(profiles, f, indent=2)
+    def reset(self, username):
+        with self._lock:
+            self._attempts.pop(username, None)
+
+
+_rate_limiter = LoginRateLimiter()
+
+
+class AuthManager:
+    def __init__(self, user_store=None):
+        self.user_store = user_store or UserStore()
+        self.session_tokens = SessionTokenManager(self.user_store)
     
     def hash_password(self, password):
         """Hash a password"""
@@ -56,69 +57,70 @@ class AuthManager:
     
     def signup(self, username, password, email):
         """Register a new user"""
-        users = self._load_users()
-        
-        if username in users:
+        if self.user_store.get_user(username) is not None:
             return False, "Username already exists"
         
-        users[username] = {
-            "password": self.hash_password(password),
-            "email": email,
-            "family_members": {}
-        }
-        
-        self._save_users(users)
+        hashed = _password_pool.submit(self.hash_password, password).result()
+        if not self.user_store.add_user(username, hashed, email):
+            return False, "Username already exists"
         return True, "Registration successful"
     
     def login(self, username, password):
         """Authenticate a user"""
-        users = self._load_users()
+        user = self.user_store.get_user(username)
         
-        if username not in users:
+        if user is None:
             return False, "User not found"
         
-        if self.verify_password(password, users[username]["password"]):
+        wait = _rate_limiter.acquire(username)
+        if wait:
+            return False, f"Too many login attempts. Try again in {wait} seconds"
+        
+        if _password_pool.submit(self.verify_password, password, user["password"]).result():
+            _rate_limiter.reset(username)
             return True, "Login successful"
         else:
             return False, "Incorrect password"
     
+    def create_session(self, username):
+        """Issue a signed session token after a successful login"""
+        return self.session_tokens.issue(username)
+    
+    def resume_session(self, token):
+        """Get the username for a valid session token (no bcrypt), or None"""
+        return self.session_tokens.verify(token)
+    
+    def end_session(self, token):
+        """Revoke a session token"""
+        self.session_tokens.revoke(token)
+    
     def add_family_member(self, username, member_name, age, gender, relationship):
         """Add a family member to user's profile"""
-        users = self._load_users()
+        user = self.user_store.get_user(username)
         
-        if username not in users:
+        if user is None:
             return False, "User not found"
         
-        if "family_members" not in users[username]:
-            users[username]["family_members"] = {}
-        
-        member_id = f"{member_name}_{len(users[username]['family_members']) + 1}"
-        users[username]["family_members"][member_id] = {
+        member_id = f"{member_name}_{len(user['family_members']) + 1}"
+        self.user_store.add_family_member(username, member_id, {
             "name": member_name,
             "age": age,
             "gender": gender,
             "relationship": relationship,
-            "created_at": str(pd.Timestamp.now())
-        }
-        
-        self._save_users(users)
+            "created_at": str(datetime.now())
+        })
         return True, "Family member added successfully"
     
     def get_family_members(self, username):
         """Get all family members for a user"""
-        users = self._load_users()
+        user = self.user_store.get_user(username)
         
-        if username in users and "family_members" in users[username]:
-            return users[username]["family_members"]
+        if user is not None:
+            return dict(user["family_members"])
         return {}
     
     def delete_family_member(self, username, member_id):
         """Delete a family member"""
-        users = self._load_users()
-        
-        if username in users and "family_members" in users[username]:
-            if member_id in users[username]["family_members"]:
-                del users[username]["family_members"][member_id]
-                self._save_users(users)
-                return True, "Family member deleted successfully"
+        if self.user_store.delete_family_member(username, member_id):
+            return True, "Family member deleted successfully"
         return False, "Family member not found"
\ No newline at end of file
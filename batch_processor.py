@@ -0,0 +1,79 @@
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from config import OCR_WORKERS
+from derived_values import derive_report
+from ocr_scheduler import PRIORITY_INTERACTIVE
+
+
+class BatchProcessor:
+    """OCR several uploaded PDFs concurrently on a bounded pool.
+
+    Workers push progress events onto a queue and ``run`` yields them on
+    the calling thread, so Streamlit widgets are only touched from the
+    script thread. Each event is a dict with ``type`` ("page", "preview",
+    "similar", "done" or "error") and the ``job`` it belongs to. Page 1 is
+    OCRed first so a "preview" (patient, report type) arrives after one
+    page, and later "page" events carry the values found so far in
+    ``partial`` (each page parsed once; the "done" event parses the whole
+    text). Jobs are dicts with ``name``, ``pdf_bytes``, ``digest``
+    and an optional ``first_page_text``. Pages are queued on the OCR
+    processor's scheduler under ``user`` at ``priority``.
+    """
+
+    def __init__(self, ocr, max_workers=OCR_WORKERS, user=None, priority=PRIORITY_INTERACTIVE):
+        self.ocr = ocr
+        self.max_workers = max_workers
+        self.user = user
+        self.priority = priority
+        # Tesseract spawns one OpenMP thread per core by default, which
+        # oversubscribes the CPU once several pages are OCRed in parallel
+        os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+    def run(self, jobs, near_duplicate_check=None):
+        """Process jobs, yielding progress events as they happen"""
+        events = queue.Queue()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ocr") as pool:
+            for job in jobs:
+                pool.submit(self._process, job, events, near_duplicate_check)
+
+            for _ in range(len(jobs)):
+                while True:
+                    event = events.get()
+                    yield event
+                    if event["type"] not in ("page", "preview"):
+                        break
+
+    def _process(self, job, events, near_duplicate_check):
+        """OCR one file: first page, preview, near-duplicate check, then the rest"""
+        try:
+            total_pages = self.ocr.get_page_count(job["pdf_bytes"])
+
+            if job.get("first_page_text") is None:
+                job["first_page_text"] = self.ocr.extract_page_text(job["pdf_bytes"], 1, self.user, self.priority)
+            partial = self.ocr.parse_medical_report(job["first_page_text"])
+            events.put({"type": "page", "job": job, "page": 1, "total": total_pages, "partial": dict(partial)})
+            events.put({"type": "preview", "job": job, "preview": self.ocr.preview_report(job["first_page_text"])})
+
+            similarity = near_duplicate_check(job) if near_duplicate_check else None
+            if similarity is not None:
+                events.put({"type": "similar", "job": job, "similarity": similarity})
+                return
+
+            # Stream the values found so far as each later page finishes. Each page is
+            # parsed once on its own and only fills gaps; the full text is parsed at the end.
+            pages = [job["first_page_text"]]
+            for page, total, page_text in self.ocr.iter_page_texts(job["pdf_bytes"], 2, self.user, self.priority):
+                pages.append(page_text)
+                for key, value in self.ocr.parse_medical_report(page_text).items():
+                    if partial.get(key) in (None, "") and value not in (None, ""):
+                        partial[key] = value
+                derive_report(partial)
+                events.put({"type": "page", "job": job, "page": page, "total": total, "partial": dict(partial)})
+
+            text = "\n\n".join(pages) + "\n\n"
+
+            events.put({"type": "done", "job": job, "parsed": self.ocr.parse_medical_report(text), "text": text})
+        except Exception as e:
+            events.put({"type": "error", "job": job, "message": str(e)})
@@ -0,0 +1,434 @@
+"""Concurrent-session load test for the Streamlit app.
+
+Starts ``streamlit run app.py`` against a throwaway data directory,
+registers one user per session and drives every session through login,
+upload, dashboard and all-reports over Streamlit's websocket protocol,
+the way a browser tab does. Prints latency percentiles per step, flow
+throughput and the server's CPU time and memory per session.
+
+Uploads use the fixture PDFs given with --pdf (a blank one-page PDF by
+default). Each upload gets a unique trailer so it is OCRed and saved
+rather than recognised as a re-upload. With --ocr replay (the default)
+the server runs the replay engine. Every upload's pages are pre-recorded
+from the fixture's recordings (MEDICAL_OCR_ENGINE=record, see README), or
+from --replay-text when a fixture was never recorded. Parsing, storage and
+rendering are then measured without Tesseract. --ocr tesseract runs real OCR.
+
+    python benchmarks/app_load.py --sessions 10 --iterations 3
+    python benchmarks/app_load.py --sessions 20 --pdf report.pdf --ocr tesseract
+    python benchmarks/app_load.py --sessions 10 --json app_load_history.jsonl
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STEPS = ["open", "login", "upload page", "upload", "dashboard", "all reports", "search"]
+UPLOAD_PAGE, DASHBOARD, ALL_REPORTS = "📤 Upload Report", "📊 Dashboard", "📋 All Reports"
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def blank_pdf():
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new("RGB", (850, 1100), "white").save(buffer, "PDF")
+    return buffer.getvalue()
+
+
+async def http(host, port, method, path, body=b"", content_type=None):
+    """Send one HTTP/1.1 request and return the status code"""
+    reader, writer = await asyncio.open_connection(host, port)
+    head = [f"{method} {path} HTTP/1.1", f"Host: {host}:{port}", f"Content-Length: {len(body)}",
+            "Connection: close"]
+    if content_type:
+        head.append(f"Content-Type: {content_type}")
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+    line = await reader.readline()
+    await reader.read()
+    writer.close()
+    return int(line.split()[1]) if line else 0
+
+
+class ServerStats:
+    """CPU seconds and resident memory of the server process, from /proc"""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.available = os.path.exists(f"/proc/{pid}/stat")
+        self.peak_rss = 0
+
+    def cpu(self):
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+    def rss(self):
+        with open(f"/proc/{self.pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+        return 0
+
+    async def sample(self, interval=0.2):
+        while True:
+            self.peak_rss = max(self.peak_rss, self.rss())
+            await asyncio.sleep(interval)
+
+
+class AppSession:
+    """One browser tab: a websocket session plus the widget values it would send"""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.ws = None
+        self.session_id = None
+        self.query_string = ""
+        self.widget_ids = {}  # key -> widget id seen in the last run
+        self.values = {}      # key -> (WidgetState field, value)
+        self.buttons = []     # button labels of the last run
+        self.alerts = []      # st.error messages of the last run
+        self.expanders = []   # expander labels of the last run
+        self.errors = []
+
+    async def connect(self):
+        from websockets.asyncio.client import connect
+        self.ws = await connect(f"ws://{self.host}:{self.port}/_stcore/stream",
+                                subprotocols=["streamlit"], max_size=None)
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+
+    def widget_id(self, key):
+        return self.widget_ids.get(key)
+
+    def _widget_states(self, triggers):
+        from streamlit.proto.WidgetStates_pb2 import WidgetStates
+        states = WidgetStates()
+        for key, (field, value) in self.values.items():
+            widget_id = self.widget_id(key)
+            if widget_id is None:
+                continue
+            state = states.widgets.add(id=widget_id)
+            if field == "file_uploader_state_value":
+                state.file_uploader_state_value.CopyFrom(value)
+            else:
+                setattr(state, field, value)
+        for key in triggers:
+            states.widgets.add(id=self.widget_id(key), trigger_value=True)
+        return states
+
+    async def rerun(self, triggers=()):
+        """Send a rerun with the current widget values and wait for the script to finish"""
+        from streamlit.proto.Alert_pb2 import Alert
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        message = BackMsg()
+        message.rerun_script.query_string = self.query_string
+        message.rerun_script.widget_states.CopyFrom(self._widget_states(triggers))
+        await self.ws.send(message.SerializeToString())
+
+        widget_ids, buttons, alerts, expanders = {}, [], [], []
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(await self.ws.recv())
+            kind = forward.WhichOneof("type")
+            if kind == "new_session":
+                self.session_id = forward.new_session.initialize.session_id
+                widget_ids, buttons, alerts, expanders = {}, [], [], []
+            elif kind == "page_info_changed":
+                self.query_string = forward.page_info_changed.query_string
+            elif kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                element = forward.delta.new_element
+                element_type = element.WhichOneof("type")
+                proto = getattr(element, element_type)
+                if getattr(proto, "id", ""):
+                    widget_ids[proto.id.rsplit("-", 1)[-1]] = proto.id
+                if element_type == "button":
+                    buttons.append(proto.label)
+                elif element_type == "alert" and proto.format == Alert.ERROR:
+                    alerts.append(proto.body)
+                elif element_type == "exception":
+                    self.errors.append(f"{proto.type}: {proto.message}")
+            elif kind == "delta" and forward.delta.WhichOneof("type") == "add_block":
+                if forward.delta.add_block.WhichOneof("type") == "expandable":
+                    expanders.append(forward.delta.add_block.expandable.label)
+            elif kind == "script_finished":
+                if forward.script_finished == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    continue
+                if forward.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    self.errors.append("script failed to compile")
+                self.widget_ids, self.buttons, self.alerts, self.expanders = widget_ids, buttons, alerts, expanders
+                return
+
+    async def timed(self, stats, step, action, *args):
+        started = time.perf_counter()
+        await action(*args)
+        stats[step].append(time.perf_counter() - started)
+
+    async def login(self, username, password):
+        self.values["login_username"] = ("string_value", username)
+        self.values["login_password"] = ("string_value", password)
+        await self.rerun(triggers=["login_button"])
+        if self.widget_id("navigation") is None:
+            raise RuntimeError(f"login failed for {username}: {self.alerts}")
+        del self.values["login_username"], self.values["login_password"]
+
+    async def navigate(self, page):
+        self.values["navigation"] = ("string_value", page)
+        await self.rerun()
+
+    async def upload(self, name, pdf_bytes):
+        """PUT the file the way the uploader widget does, rerun with it, then clear it"""
+        from streamlit.proto.Common_pb2 import FileUploaderState
+
+        file_id = uuid.uuid4().hex
+        path = f"/_stcore/upload_file/{self.session_id}/{file_id}"
+        boundary = uuid.uuid4().hex
+        body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{name}\"\r\n"
+                f"Content-Type: application/pdf\r\n\r\n").encode() + pdf_bytes + f"\r\n--{boundary}--\r\n".encode()
+        status = await http(self.host, self.port, "PUT", path, body, f"multipart/form-data; boundary={boundary}")
+        if status != 204:
+            raise RuntimeError(f"upload of {name} returned HTTP {status}")
+
+        state = FileUploaderState()
+        info = state.uploaded_file_info.add(name=name, size=len(pdf_bytes), file_id=file_id)
+        info.file_urls.file_id, info.file_urls.upload_url, info.file_urls.delete_url = file_id, path, path
+        self.values["pdf_upload"] = ("file_uploader_state_value", state)
+        await self.rerun()
+        # A near-duplicate of an earlier upload waits for "Process anyway"
+        if "Process anyway" in self.buttons:
+            await self.rerun(triggers=["process_similar_anyway"])
+        del self.values["pdf_upload"]
+        if self.alerts or not any(label.startswith(f"✅ {name}") for label in self.expanders):
+            raise RuntimeError(f"upload of {name} was not saved: {self.alerts}")
+
+    async def search(self, query):
+        self.values["reports_search"] = ("string_value", query)
+        await self.rerun()
+        del self.values["reports_search"]
+
+
+async def session(args, index, uploads, stats):
+    """Drive one user through args.iterations login/upload/dashboard/reports flows"""
+    await asyncio.sleep(args.ramp * index / max(args.sessions, 1))
+    app = AppSession(args.host, args.port)
+    try:
+        await app.connect()
+        await app.timed(stats, "open", app.rerun)
+        await app.timed(stats, "login", app.login, f"load{index}", args.password)
+        for iteration in range(args.iterations):
+            await app.timed(stats, "upload page", app.navigate, UPLOAD_PAGE)
+            name, pdf_bytes = uploads[iteration]
+            await app.timed(stats, "upload", app.upload, name, pdf_bytes)
+            await app.timed(stats, "dashboard", app.navigate, DASHBOARD)
+            await app.timed(stats, "all reports", app.navigate, ALL_REPORTS)
+            await app.timed(stats, "search", app.search, args.search)
+            stats["flows"] += 1
+    except Exception as e:
+        stats["failed"].append(f"session {index}: {e}")
+    finally:
+        stats["errors"] += app.errors
+        await app.close()
+
+
+def prepare(args, data_dir):
+    """Seed users and per-upload fixtures (and their OCR recordings) in data_dir"""
+    os.environ["MEDICAL_OCR_DATA_DIR"] = data_dir
+    sys.path.insert(0, ROOT)
+    from auth import AuthManager
+    from ocr_engines import ReplayEngine
+
+    auth = AuthManager()
+    for index in range(args.sessions):
+        auth.signup(f"load{index}", args.password, f"load{index}@example.com")
+
+    fixtures = []
+    for path in args.pdf or [None]:
+        if path is None:
+            fixtures.append(("blank.pdf", blank_pdf()))
+        else:
+            with open(path, "rb") as f:
+                fixtures.append((os.path.basename(path), f.read()))
+
+    source = target = None
+    if args.ocr == "replay":
+        source = ReplayEngine(args.recordings, fallback_file=args.replay_text)
+        target = ReplayEngine(os.path.join(data_dir, "ocr_recordings"), fallback_file=None)
+
+    uploads = []
+    for index in range(args.sessions):
+        uploads.append([])
+        for iteration in range(args.iterations):
+            name, pdf_bytes = fixtures[(index + iteration) % len(fixtures)]
+            variant = pdf_bytes + f"\n%load-{uuid.uuid4().hex}\n".encode("ascii")
+            if target is not None:
+                pages = source.page_count(pdf_bytes)
+                for page in range(1, pages + 1):
+                    target.record(variant, page, source.page_text(pdf_bytes, page), pages)
+            uploads[-1].append((name, variant))
+    return uploads
+
+
+async def wait_for_server(args, server, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            sys.exit(f"streamlit exited with code {server.returncode}")
+        try:
+            if await http(args.host, args.port, "GET", "/_stcore/health") == 200:
+                return
+        except OSError:
+            pass
+        await asyncio.sleep(0.5)
+    sys.exit("streamlit did not become healthy in time")
+
+
+async def run(args, server):
+    await wait_for_server(args, server)
+    monitor = ServerStats(server.pid)
+    # Import costs land on the first session; warm the server up first
+    warmup = AppSession(args.host, args.port)
+    await warmup.connect()
+    await warmup.rerun()
+    await warmup.close()
+
+    stats = {step: [] for step in STEPS}
+    stats.update(flows=0, failed=[], errors=[])
+    cpu_before = monitor.cpu() if monitor.available else None
+    rss_before = monitor.rss() if monitor.available else None
+    sampler = asyncio.create_task(monitor.sample()) if monitor.available else None
+
+    started = time.perf_counter()
+    await asyncio.gather(*(session(args, index, args.uploads[index], stats) for index in range(args.sessions)))
+    elapsed = time.perf_counter() - started
+
+    if sampler:
+        sampler.cancel()
+    results = {
+        "sessions": args.sessions, "iterations": args.iterations, "ocr": args.ocr,
+        "elapsed": elapsed, "flows": stats["flows"], "failed": stats["failed"], "errors": stats["errors"],
+        "latency": {step: stats[step] for step in STEPS},
+    }
+    if monitor.available:
+        results["cpu_seconds"] = monitor.cpu() - cpu_before
+        results["rss_before"] = rss_before
+        results["rss_peak"] = monitor.peak_rss
+    return results
+
+
+def report(results):
+    sessions = results["sessions"]
+    print(f"sessions: {sessions}  flows completed: {results['flows']}/{sessions * results['iterations']}  "
+          f"failed sessions: {len(results['failed'])}  script errors: {len(results['errors'])}")
+    for message in (results["failed"] + results["errors"])[:10]:
+        print(f"  {message}")
+
+    reruns = sum(len(values) for values in results["latency"].values())
+    print(f"throughput: {results['flows'] / results['elapsed']:.2f} flows/s, "
+          f"{reruns / results['elapsed']:.2f} steps/s over {results['elapsed']:.1f} s")
+
+    print(f"{'step':<13}{'n':>5}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}{'mean ms':>10}")
+    for step, values in results["latency"].items():
+        values = [v * 1000 for v in values]
+        if values:
+            print(f"{step:<13}{len(values):>5}{percentile(values, 50):>10.0f}{percentile(values, 90):>10.0f}"
+                  f"{percentile(values, 99):>10.0f}{max(values):>10.0f}{statistics.mean(values):>10.0f}")
+
+    if "cpu_seconds" in results:
+        mb = 1024 * 1024
+        growth = max(results["rss_peak"] - results["rss_before"], 0)
+        print(f"server CPU: {results['cpu_seconds']:.1f} s total, {results['cpu_seconds'] / sessions:.2f} s per session, "
+              f"{results['cpu_seconds'] / max(results['flows'], 1):.2f} s per flow")
+        print(f"server RSS: {results['rss_before'] / mb:.0f} MB idle, {results['rss_peak'] / mb:.0f} MB peak, "
+              f"{growth / mb / sessions:.1f} MB per session")
+    else:
+        print("server CPU/memory: unavailable (needs /proc)")
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--iterations", type=int, default=2, help="upload/dashboard/reports flows per session")
+    parser.add_argument("--ramp", type=float, default=2.0, help="seconds over which sessions start")
+    parser.add_argument("--pdf", nargs="+", help="fixture PDFs to upload (default: a blank page)")
+    parser.add_argument("--ocr", choices=["replay", "tesseract"], default="replay")
+    parser.add_argument("--recordings", default=os.path.join(ROOT, "data", "ocr_recordings"),
+                        help="recorded page texts of the fixtures (replay mode)")
+    parser.add_argument("--replay-text", default=os.path.join(ROOT, "debug_ocr_output.txt"),
+                        help="page text for fixtures that were never recorded (replay mode)")
+    parser.add_argument("--search", default="bilirubin", help="query typed on the All Reports page")
+    parser.add_argument("--password", default="loadtest")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--json", help="append results to this JSON-lines file")
+    parser.add_argument("--keep-log", action="store_true", help="print the server log when done")
+    args = parser.parse_args()
+
+    try:
+        import websockets  # noqa: F401
+    except ImportError:
+        sys.exit("This benchmark needs the websockets package (pip install websockets)")
+
+    data_dir = tempfile.mkdtemp(prefix="app_load_")
+    log_path = os.path.join(data_dir, "server.log")
+    try:
+        print(f"seeding {args.sessions} users and {args.sessions * args.iterations} uploads...", file=sys.stderr)
+        args.uploads = prepare(args, data_dir)
+        env = dict(os.environ, MEDICAL_OCR_DATA_DIR=data_dir, MEDICAL_OCR_ENGINE=args.ocr)
+        env.pop("MEDICAL_OCR_REPLAY_FALLBACK", None)  # every upload is recorded; misses should fail
+        with open(log_path, "w") as log:
+            server = subprocess.Popen(
+                [sys.executable, "-m", "streamlit", "run", "app.py", "--server.headless=true",
+                 f"--server.port={args.port}", f"--server.address={args.host}",
+                 # The harness uploads without a browser cookie, and must not restart on edits
+                 "--server.enableXsrfProtection=false", "--server.fileWatcherType=none",
+                 "--browser.gatherUsageStats=false"],
+                cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT
+            )
+            try:
+                results = asyncio.run(run(args, server))
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+        report(results)
+        if args.keep_log:
+            with open(log_path) as f:
+                print(f.read())
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "a") as f:
+            f.write(json.dumps({"revision": git_revision(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                                **results}) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Load client for the headless ingestion service.
+
+Logs in, pushes PDFs from several concurrent clients, polls every
+accepted job to completion and prints acceptance, 503 backpressure and
+latency figures. Each upload gets a unique trailer so the service's
+re-upload shortcut doesn't skip OCR.
+
+    python ingest_service.py &
+    python benchmarks/ingest_load.py sample.pdf --clients 8 --uploads 4 --create-user
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def request(host, port, method, path, body=b"", token=None, content_type="application/json"):
+    """Send one HTTP/1.1 request and return (status, headers, json body)"""
+    reader, writer = await asyncio.open_connection(host, port)
+    head = [f"{method} {path} HTTP/1.1", f"Host: {host}:{port}",
+            f"Content-Type: {content_type}", f"Content-Length: {len(body)}", "Connection: close"]
+    if token:
+        head.append(f"Authorization: Bearer {token}")
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode("latin-1")
+        if line in ("\r\n", "\n", ""):
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    payload = await reader.read()
+    writer.close()
+    return status, headers, json.loads(payload or b"{}")
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+async def client(args, token, pdf_bytes, stats):
+    """Upload args.uploads PDFs, then wait for each accepted job"""
+    jobs = []
+    for _ in range(args.uploads):
+        body = pdf_bytes + f"\n%load-{uuid.uuid4().hex}\n".encode("ascii")
+        started = time.perf_counter()
+        status, headers, payload = await request(args.host, args.port, "POST", "/reports",
+                                                 body, token, "application/pdf")
+        stats["submit"].append(time.perf_counter() - started)
+        if status == 202:
+            jobs.append((payload["job_id"], started))
+        elif status == 503:
+            stats["rejected"] += 1
+            await asyncio.sleep(float(headers.get("retry-after", 1)) if args.honor_retry else 0)
+        else:
+            stats["failed"] += 1
+
+    for job_id, started in jobs:
+        while True:
+            status, _, payload = await request(args.host, args.port, "GET", f"/jobs/{job_id}", token=token)
+            if payload.get("status") in ("done", "error"):
+                stats["complete"].append(time.perf_counter() - started)
+                stats["errors"] += payload["status"] == "error"
+                break
+            await asyncio.sleep(args.poll)
+
+
+async def run(args):
+    with open(args.pdf, "rb") as f:
+        pdf_bytes = f.read()
+
+    status, _, payload = await request(args.host, args.port, "POST", "/login",
+                                       json.dumps({"username": args.username, "password": args.password}).encode())
+    if status != 200:
+        sys.exit(f"Login failed: {payload.get('error')}")
+    token = payload["token"]
+
+    stats = {"submit": [], "complete": [], "rejected": 0, "failed": 0, "errors": 0}
+    started = time.perf_counter()
+    await asyncio.gather(*(client(args, token, pdf_bytes, stats) for _ in range(args.clients)))
+    elapsed = time.perf_counter() - started
+
+    total = args.clients * args.uploads
+    print(f"uploads: {total}  accepted: {len(stats['complete'])}  rejected (503): {stats['rejected']}  "
+          f"failed: {stats['failed']}  job errors: {stats['errors']}")
+    print(f"throughput: {len(stats['complete']) / elapsed:.2f} jobs/s over {elapsed:.1f} s")
+    for name in ("submit", "complete"):
+        values = [v * 1000 for v in stats[name]]
+        if values:
+            print(f"{name:<9} p50 {percentile(values, 50):>9.1f} ms  p95 {percentile(values, 95):>9.1f} ms  "
+                  f"max {max(values):>9.1f} ms  mean {statistics.mean(values):>9.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pdf", help="PDF file to upload")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--uploads", type=int, default=4, help="uploads per client")
+    parser.add_argument("--poll", type=float, default=0.5, help="seconds between job status polls")
+    parser.add_argument("--honor-retry", action="store_true", help="sleep for Retry-After after a 503")
+    parser.add_argument("--username", default="loadtest")
+    parser.add_argument("--password", default="loadtest")
+    parser.add_argument("--create-user", action="store_true",
+                        help="register the user in the local data directory first")
+    args = parser.parse_args()
+
+    if args.create_user:
+        sys.path.insert(0, ROOT)
+        from auth import AuthManager
+        AuthManager().signup(args.username, args.password, f"{args.username}@example.com")
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
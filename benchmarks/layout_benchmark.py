@@ -0,0 +1,87 @@
+"""Cost and accuracy of layout cropping against reading whole pages.
+
+Every page of the given PDFs is read three ways: whole at OCR_DPI (what
+runs without layout analysis), cropped on first sight (the low-DPI
+image_to_data pass that finds the regions, then the crops) and cropped
+from the stored template (the crops only). Parsed values of each page and
+of each PDF as a whole are compared with the whole-page read.
+
+    python benchmarks/layout_benchmark.py report.pdf other_report.pdf
+
+Needs Tesseract and Poppler. tests/test_ocr_layout.py checks the same
+parity on the recorded pages without them.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def run(pdf_paths, layout_db):
+    from ocr_engines import OCREngine, PopplerRasterizer, TesseractRecognizer
+    from ocr_layout import LayoutAnalyzer
+    from ocr_processor import OCRProcessor
+    rasterizer = PopplerRasterizer()
+    recognizer = TesseractRecognizer()
+    whole = OCREngine(rasterizer, recognizer)
+    layout = LayoutAnalyzer(rasterizer, recognizer, db_path=layout_db)
+    cropping = OCREngine(rasterizer, recognizer, layout=layout)
+    parse = OCRProcessor(engine=whole).parse_medical_report
+
+    rows, reports = [], []
+    for path in pdf_paths:
+        with open(path, "rb") as f:
+            pdf_bytes = f.read()
+        texts = {"whole": [], "first": [], "templated": []}
+        for page in range(1, rasterizer.page_count(pdf_bytes) + 1):
+            row = {"page": f"{os.path.basename(path)}:{page}"}
+            for name, engine in (("whole", whole), ("first", cropping), ("templated", cropping)):
+                row[name], text = timed(engine.page_text, pdf_bytes, page)
+                texts[name].append(text)
+                row[f"{name}_same"] = parse(text) == parse(texts["whole"][-1])
+            row["lookup"] = timed(layout.regions, pdf_bytes, page)[0]
+            rows.append(row)
+        joined = {name: parse("\n\n".join(pages)) for name, pages in texts.items()}
+        reports.append((os.path.basename(path), joined["first"] == joined["whole"],
+                        joined["templated"] == joined["whole"]))
+    return rows, reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pdfs", nargs="+")
+    args = parser.parse_args()
+    sys.path.insert(0, ROOT)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        rows, reports = run(args.pdfs, os.path.join(cache_dir, "layouts.db"))
+
+    print(f"{'page':<24}{'whole ms':>10}{'first ms':>10}{'same':>6}{'templated ms':>14}{'same':>6}"
+          f"{'lookup ms':>11}")
+    for row in rows:
+        print(f"{row['page']:<24}{row['whole'] * 1000:>10.0f}{row['first'] * 1000:>10.0f}"
+              f"{'yes' if row['first_same'] else 'NO':>6}{row['templated'] * 1000:>14.0f}"
+              f"{'yes' if row['templated_same'] else 'NO':>6}{row['lookup'] * 1000:>11.0f}")
+
+    # The lookup column re-renders the page at OCR_LAYOUT_DPI: what a templated page pays before its crops
+    whole = sum(row["whole"] for row in rows)
+    print()
+    for name, label in (("first", "first sight (layout pass + crops)"), ("templated", "templated (crops only)")):
+        total = sum(row[name] for row in rows)
+        print(f"{label:<36}{total:.2f}s vs {whole:.2f}s whole ({total / whole:.0%})")
+    for name, first_same, templated_same in reports:
+        print(f"{name}: parsed report {'matches' if first_same and templated_same else 'DIFFERS from'} "
+              f"the whole-page read")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Cost of the orientation pre-pass against the OCR passes it saves.
+
+Every page of the given PDFs is rendered at OCR_DPI and turned by each
+rotation to mimic phone scans. For each turn this times the full Tesseract
+pass on the turned page (what ran before the pre-pass; garbage unless the
+page is upright), the OSD pre-pass on an OCR_OSD_DPI thumbnail and the full
+pass after correcting the page, and counts the NORMAL_RANGES parameter
+names each text contains as a rough measure of whether it is usable.
+
+    python benchmarks/orientation_benchmark.py report.pdf other_report.pdf
+
+Needs Tesseract (with osd.traineddata) and Poppler.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def parameters_found(text):
+    from config import NORMAL_RANGES
+    text = text.lower()
+    return sum(name.lower() in text for name in NORMAL_RANGES)
+
+
+def run(pdf_paths, rotations, cache_path):
+    from ocr_engines import OrientationDetector, PopplerRasterizer, TesseractRecognizer, upright
+    rasterizer = PopplerRasterizer()
+    recognizer = TesseractRecognizer()
+    detector = OrientationDetector(rasterizer, recognizer, db_path=cache_path)
+    scale = detector.dpi / rasterizer.dpi
+
+    rows, cache_hits = [], []
+    for path in pdf_paths:
+        with open(path, "rb") as f:
+            pdf_bytes = f.read()
+        for page in range(1, rasterizer.page_count(pdf_bytes) + 1):
+            image = rasterizer.render(pdf_bytes, page)
+            for turn in rotations:
+                # Content turned `turn` degrees counter-clockwise needs `turn` clockwise to fix
+                scanned = image.rotate(turn, expand=True)
+                thumbnail = scanned.resize((round(scanned.width * scale), round(scanned.height * scale)))
+                raw_time, raw_text = timed(recognizer.recognize, scanned)
+                osd_time, (detected, confidence) = timed(detector.detect, thumbnail)
+                fixed_time, fixed_text = timed(recognizer.recognize, upright(scanned, detected))
+                rows.append({
+                    "page": f"{os.path.basename(path)}:{page}", "turn": turn, "detected": detected,
+                    "confidence": confidence, "osd": osd_time, "raw": raw_time,
+                    "raw_found": parameters_found(raw_text), "fixed": fixed_time,
+                    "fixed_found": parameters_found(fixed_text),
+                })
+
+            detector.rotation(pdf_bytes, page)  # populate the cache, then time a hit
+            cache_hits.append(timed(detector.rotation, pdf_bytes, page)[0])
+    return rows, cache_hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pdfs", nargs="+")
+    parser.add_argument("--rotations", type=int, nargs="+", default=[0, 90, 180, 270])
+    args = parser.parse_args()
+    sys.path.insert(0, ROOT)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        rows, cache_hits = run(args.pdfs, args.rotations, os.path.join(cache_dir, "orientation.db"))
+
+    print(f"{'page':<24}{'turn':>6}{'found':>7}{'conf':>7}{'OSD ms':>10}"
+          f"{'as scanned ms':>15}{'params':>8}{'corrected ms':>14}{'params':>8}")
+    for row in rows:
+        print(f"{row['page']:<24}{row['turn']:>6}{row['detected']:>7}{row['confidence']:>7.1f}"
+              f"{row['osd'] * 1000:>10.0f}{row['raw'] * 1000:>15.0f}{row['raw_found']:>8}"
+              f"{row['fixed'] * 1000:>14.0f}{row['fixed_found']:>8}")
+
+    # Passes on turned pages that the pre-pass corrected would have been wasted without it
+    overhead = sum(row["osd"] for row in rows)
+    full_passes = sum(row["fixed"] for row in rows)
+    avoided = [row for row in rows if row["turn"] % 360 and row["detected"] == row["turn"] % 360]
+    turned = sum(1 for row in rows if row["turn"] % 360)
+    print()
+    print(f"pre-pass overhead:     {overhead:.2f}s over {len(rows)} pages "
+          f"({overhead / full_passes:.1%} of the full passes)")
+    print(f"wasted passes avoided: {sum(row['raw'] for row in avoided):.2f}s on "
+          f"{len(avoided)}/{turned} turned pages")
+    print(f"cached lookup:         {sum(cache_hits) / len(cache_hits) * 1000:.2f} ms per page")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Storage and dashboard timings as report histories grow.
+
+Each size runs in a fresh interpreter against a throwaway data directory
+seeded with a synthetic history (every report type, values drawn around
+NORMAL_RANGES, columns from EXCEL_COLUMNS). The workbook is the only
+storage backend, so exports are timed per output format instead.
+
+    python benchmarks/scale_benchmark.py --sizes 10000 30000 100000
+    python benchmarks/scale_benchmark.py --sizes 1000 --json scale_history.jsonl
+
+Every insert rewrites the workbook, so the 100k run takes a long time.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PATIENTS = ["Asha Rao", "Vikram Rao", "Meera Rao", "Kashvi Gupta", None]
+ULTRASOUND_SIZES = {"Liver Size": (110, 160), "Spleen Size": (70, 120)}
+INSERTS = 3
+
+
+def synthetic_reports(size, seed=0):
+    """A DataFrame of `size` reports valid against EXCEL_COLUMNS and NORMAL_RANGES"""
+    import numpy as np
+    import pandas as pd
+    from config import EXCEL_COLUMNS, NORMAL_RANGES, REPORT_TYPES, TEST_PARAMETERS, TEXT_COLUMNS
+
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(index=range(size), columns=EXCEL_COLUMNS, dtype=object)
+    df["Date"] = pd.Timestamp("2000-01-01") + pd.to_timedelta(np.sort(rng.integers(0, 25 * 365, size)), unit="D")
+    df["Report Type"] = rng.choice(REPORT_TYPES, size)
+    df["Patient Name"] = rng.choice(np.array(PATIENTS, dtype=object), size)
+    df["Patient Age"] = rng.integers(1, 90, size)
+    df["Patient Gender"] = rng.choice(["Male", "Female"], size)
+    df["Notes"] = ""
+
+    all_parameters = sorted({p for params in TEST_PARAMETERS.values() for p in params})
+    for report_type in REPORT_TYPES:
+        rows = df.index[df["Report Type"] == report_type]
+        # Types without a parameter list (e.g. General Checkup) get a mix of everything
+        for parameter in TEST_PARAMETERS.get(report_type, all_parameters):
+            if parameter in TEXT_COLUMNS:
+                df.loc[rows, parameter] = "Normal" if parameter.endswith("Status") else None
+                continue
+            low, high = ULTRASOUND_SIZES.get(parameter, (NORMAL_RANGES[parameter]["min"],
+                                                          NORMAL_RANGES[parameter]["max"]))
+            # Mostly in range, with ~20% of values a little outside it
+            spread = (high - low) * 0.25
+            values = rng.uniform(max(low - spread, 0), high + spread, len(rows))
+            df.loc[rows, parameter] = np.round(values, 2)
+    return df
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def run_size(size):
+    """Runs in the child interpreter (MEDICAL_OCR_DATA_DIR points at a temp dir)"""
+    import statistics
+    from data_manager import DataManager
+    from exporter import ReportExporter, available_export_formats
+    from visualizer import Visualizer
+
+    timings = {}
+    df = synthetic_reports(size)
+    manager = DataManager("benchmark")
+    timings["seed workbook"], _ = timed(df.to_excel, manager.excel_file, index=False)
+
+    timings["load (cold)"], reports = timed(manager.get_all_reports)
+    timings["load (cached)"], _ = timed(manager.get_all_reports)
+
+    # The first insert bootstraps the ingest and trend indexes for the history
+    row = df.iloc[-1].to_dict()
+    new_report = lambda day: dict(row, Date=f"2030-01-{day:02d}", Notes=f"benchmark {day}")
+    timings["first insert (indexes)"], _ = timed(manager.add_report, new_report(1))
+    timings["insert"] = statistics.median(
+        timed(manager.add_report, new_report(day))[0] for day in range(2, 2 + INSERTS)
+    )
+
+    timings["load after insert"], reports = timed(manager.get_all_reports)
+    timings["parameter history"], _ = timed(manager.get_parameter_history, "Hemoglobin")
+    timings["query page 1"], _ = timed(manager.query_reports, page=1, page_size=50)
+    timings["trend summary"], _ = timed(manager.get_trend_summary)
+
+    exporter = ReportExporter(manager)
+    for fmt in available_export_formats():
+        timings[f"export {fmt}"], f = timed(exporter.export_to_tempfile, fmt)
+        f.close()
+
+    visualizer = Visualizer()
+    timings["trend chart"], _ = timed(visualizer.create_multi_test_trend_chart, reports, "Hemoglobin")
+    parameters = ["Hemoglobin", "Glucose", "SGPT (ALT)", "TSH", "Heart Rate", "MCV"]
+    timings["dashboard figure"], _ = timed(visualizer.create_dashboard_figure, reports, parameters)
+    timings["status classify"], _ = timed(visualizer.classify_frame, reports)
+    return timings
+
+
+def run_child(size):
+    with tempfile.TemporaryDirectory() as data_dir:
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", str(size)],
+            env=dict(os.environ, MEDICAL_OCR_DATA_DIR=data_dir), cwd=ROOT,
+            check=True, capture_output=True, text=True
+        )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 30000, 100000])
+    parser.add_argument("--json", help="append results to this JSON-lines file")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.path.insert(0, ROOT)
+        print(json.dumps(run_size(args.child)))
+        return
+
+    results = {}
+    for size in args.sizes:
+        print(f"running {size} reports...", file=sys.stderr)
+        results[size] = run_child(size)
+
+    operations = list(results[args.sizes[0]])
+    print(f"{'operation':<24}" + "".join(f"{size:>12,}" for size in args.sizes) + "   (ms)")
+    for operation in operations:
+        print(f"{operation:<24}" + "".join(f"{results[size][operation] * 1000:>12.1f}" for size in args.sizes))
+
+    if args.json:
+        with open(args.json, "a") as f:
+            f.write(json.dumps({"revision": git_revision(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                                "seconds": {str(size): results[size] for size in args.sizes}}) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Time-to-first-render of the login and dashboard pages.
+
+Each sample runs in a fresh interpreter so import costs are included, and
+uses a throwaway data directory with one seeded user and a few reports.
+
+    python benchmarks/startup_benchmark.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ["pytesseract", "pdf2image", "openpyxl", "pandas", "plotly", "ocr_processor", "visualizer"]
+
+# Runs inside the child interpreter
+SAMPLE = r"""
+import json, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+
+at = AppTest.from_file(sys.argv[1], default_timeout=120)
+if sys.argv[2] == "dashboard":
+    at.session_state.logged_in = True
+    at.session_state.username = "benchmark"
+    at.session_state.navigation = "📊 Dashboard"
+at.run()
+done = time.perf_counter()
+
+print(json.dumps({
+    "harness_import": imported - start,
+    "first_render": done - imported,
+    "errors": [str(e.value) for e in at.exception],
+    "loaded": [m for m in json.loads(sys.argv[3]) if m in sys.modules],
+}))
+"""
+
+
+def seed_data_dir(path):
+    """Create a user with a handful of reports in a throwaway data directory"""
+    env = dict(os.environ, MEDICAL_OCR_DATA_DIR=path)
+    seed = r"""
+import sys
+sys.path.insert(0, sys.argv[1])
+from auth import AuthManager
+from data_manager import DataManager
+AuthManager().signup("benchmark", "benchmark", "benchmark@example.com")
+manager = DataManager("benchmark")
+for day in range(1, 13):
+    manager.add_report({"Date": f"2025-{day:02d}-01", "Report Type": "Liver Function Test (LFT)",
+                        "Patient Name": "Benchmark", "SGPT (ALT)": 20 + day, "SGOT (AST)": 30 + day})
+"""
+    subprocess.run([sys.executable, "-c", seed, ROOT], env=env, check=True, capture_output=True)
+    return env
+
+
+def run_sample(page, env):
+    out = subprocess.run(
+        [sys.executable, "-c", SAMPLE, os.path.join(ROOT, "app.py"), page, json.dumps(HEAVY_MODULES)],
+        env=env, cwd=ROOT, check=True, capture_output=True, text=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = seed_data_dir(data_dir)
+
+        print(f"{'page':<10} {'median ms':>10} {'min ms':>8} {'max ms':>8}  heavy modules loaded")
+        for page in ("login", "dashboard"):
+            samples = [run_sample(page, env) for _ in range(args.runs)]
+            renders = [s["first_render"] * 1000 for s in samples]
+            errors = {e for s in samples for e in s["errors"]}
+            print(f"{page:<10} {statistics.median(renders):>10.1f} {min(renders):>8.1f} {max(renders):>8.1f}  "
+                  f"{', '.join(samples[-1]['loaded']) or '-'}")
+            for error in errors:
+                print(f"  error: {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,20 @@ import os
 
 # Directory paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATA_DIR = os.path.join(BASE_DIR, "data")
+DATA_DIR = os.environ.get("MEDICAL_OCR_DATA_DIR", os.path.join(BASE_DIR, "data"))
 REPORTS_DIR = os.path.join(DATA_DIR, "reports")
 USERS_FILE = os.path.join(DATA_DIR, "users.json")
 FAMILY_PROFILES_FILE = os.path.join(DATA_DIR, "family_profiles.json")
+ANALYTICS_DB = os.path.join(DATA_DIR, "analytics.db")
+USERS_DB = os.path.join(DATA_DIR, "users.db")
+INGEST_INDEX_DB = os.path.join(DATA_DIR, "ingest_index.db")
+NEAR_DUPLICATE_DB = os.path.join(DATA_DIR, "near_duplicates.db")
+TREND_STATS_DB = os.path.join(DATA_DIR, "trend_stats.db")
+SEARCH_INDEX_DB = os.path.join(DATA_DIR, "search_index.db")
+OCR_ORIENTATION_DB = os.path.join(DATA_DIR, "ocr_orientation.db")
+OCR_LAYOUT_DB = os.path.join(DATA_DIR, "ocr_layouts.db")
+OCR_QUEUE_DB = os.path.join(DATA_DIR, "ocr_queue.db")
+SESSION_SECRET_FILE = os.path.join(DATA_DIR, ".session_secret")
 
 # Create directories if they don't exist
 os.makedirs(DATA_DIR, exist_ok=True)
@@ -36,6 +46,7 @@ NORMAL_RANGES = {
     "Albumin": {"min": 3.5, "max": 5.5, "unit": "g/dL"},
     "Globulin": {"min": 2.0, "max": 3.5, "unit": "g/dL"},
     "A/G Ratio": {"min": 1.0, "max": 2.5, "unit": "ratio"},
+    "AST/ALT Ratio": {"min": 0.7, "max": 1.4, "unit": "ratio"},
     
     # Complete Blood Picture (CBP)
     "PCV/HCT": {"min": 36, "max": 50, "unit": "%"},
@@ -79,6 +90,91 @@ REPORT_TYPES = [
     "Ultrasound Report"
 ]
 
+# Identifying columns shared by every report type
+BASIC_INFO_COLUMNS = [
+    "Date",
+    "Report Type",
+    "Patient Name",
+    "Patient Age",
+    "Patient Gender",
+    "Notes",
+]
+
+# Columns that hold free text rather than numeric values
+TEXT_COLUMNS = BASIC_INFO_COLUMNS + [
+    "Gall Bladder Status",
+    "Pancreas Status",
+    "Right Kidney Size",
+    "Left Kidney Size",
+    "Urinary Bladder Status",
+    "Ultrasound Findings",
+    "Ultrasound Impression",
+]
+
+# Free-text fields indexed for search alongside the OCR text
+SEARCH_COLUMNS = [column for column in TEXT_COLUMNS
+                  if column not in ("Date", "Patient Name", "Patient Age", "Patient Gender")]
+
+# Session tokens and password checks
+SESSION_TOKEN_TTL = 7 * 24 * 3600  # seconds
+SESSION_COOKIE = "medical_ocr_session"  # browser cookie holding the token (kept out of URLs)
+AUTH_WORKERS = 4  # concurrent bcrypt checks per process
+LOGIN_RATE_LIMIT = 5  # password checks allowed per user...
+LOGIN_RATE_WINDOW = 60  # ...within this many seconds
+
+# OCR engine: "tesseract" (default), "replay" (recorded page texts, no OCR)
+# or "record" (Tesseract, saving each page for later replay)
+OCR_ENGINE = os.environ.get("MEDICAL_OCR_ENGINE", "tesseract")
+OCR_DPI = 300
+OCR_PAGE_TIMEOUT = 60  # seconds per page for rendering and for Tesseract
+OCR_FALLBACK_DPIS = [200, 150]  # retried in order when a page times out
+TESSERACT_CMD = os.environ.get("TESSERACT_CMD", r"C:\Program Files\Tesseract-OCR\tesseract.exe")
+POPPLER_PATH = os.environ.get("POPPLER_PATH", r"C:\poppler-25.12.0\Library\bin")
+OCR_RECORDINGS_DIR = os.path.join(DATA_DIR, "ocr_recordings")
+# Text served for unrecorded PDFs in replay mode (pages split on form feeds)
+OCR_REPLAY_FALLBACK = os.environ.get("MEDICAL_OCR_REPLAY_FALLBACK")
+
+# Orientation pre-pass: Tesseract OSD on a low-DPI render of each page finds
+# pages scanned sideways or upside down before the full-resolution pass
+OCR_DETECT_ORIENTATION = True
+OCR_OSD_DPI = 100
+OCR_OSD_TIMEOUT = 10  # seconds; a page whose OSD times out is read as is
+OCR_OSD_MIN_CONFIDENCE = 2.0  # below this the page is left unrotated
+
+# Layout analysis: a low-DPI pass finds the patient header and results table
+# so only those regions are read at OCR_DPI; layouts are cached per letterhead
+OCR_DETECT_LAYOUT = True
+OCR_LAYOUT_DPI = 150
+OCR_LAYOUT_MAX_COVERAGE = 0.8  # read the whole page when the regions cover more than this
+OCR_LAYOUT_MATCH_BITS = 32  # of 512 letterhead hash bits two pages may differ by and share a template
+
+# Pages OCRed at once on this machine, shared by the app and the ingestion
+# service through OCR_QUEUE_DB (also the OCR threads per app process)
+OCR_WORKERS = min(4, os.cpu_count() or 1)
+
+# Near-duplicate detection (MinHash over character shingles, banded LSH)
+SHINGLE_SIZE = 5
+MINHASH_PERMUTATIONS = 128
+LSH_BANDS = 32  # 4 rows per band: candidates from ~0.4 Jaccard upwards
+NEAR_DUPLICATE_THRESHOLD = 0.6  # rescans of the same page typically score 0.7+
+
+# Trend charts: points per series after downsampling, WebGL above this many points
+CHART_POINT_BUDGET = 1000
+CHART_WEBGL_THRESHOLD = 1000
+
+# Rows buffered per write when exporting reports
+EXPORT_CHUNK_SIZE = 500
+
+# Headless ingestion service (ingest_service.py)
+INGEST_HOST = "127.0.0.1"
+INGEST_PORT = 8600
+INGEST_QUEUE_SIZE = 32  # uploads waiting for OCR before new ones get 503
+INGEST_MAX_UPLOAD_BYTES = 25 * 1024 * 1024
+INGEST_JOB_HISTORY = 1000  # finished jobs kept for status queries
+
+# Trend statistics: values averaged in each parameter's rolling mean
+TREND_ROLLING_WINDOW = 5
+
 # Excel columns - organized by test type
 EXCEL_COLUMNS = [
     # Basic Information
@@ -112,6 +208,7 @@ EXCEL_COLUMNS = [
     "Albumin",
     "Globulin",
     "A/G Ratio",
+    "AST/ALT Ratio",
     
     # Complete Blood Picture
     "PCV/HCT",
@@ -147,7 +244,7 @@ TEST_PARAMETERS = {
     "Liver Function Test (LFT)": [
         "Total Bilirubin", "Conjugated Bilirubin", "Unconjugated Bilirubin",
         "SGOT (AST)", "SGPT (ALT)", "Alkaline Phosphatase",
-        "Total Protein", "Albumin", "Globulin", "A/G Ratio"
+        "Total Protein", "Albumin", "Globulin", "A/G Ratio", "AST/ALT Ratio"
     ],
     "Complete Blood Picture (CBP)": [
         "Hemoglobin", "RBC", "WBC", "Platelets",
@@ -171,6 +268,56 @@ TEST_PARAMETERS = {
     ]
 }
 
+# Keywords (regex fragments) the parser looks for next to each parameter's value
+PARAMETER_KEYWORDS = {
+    "Total Bilirubin": ["total bilirubin", "bilirubin.*total"],
+    "Conjugated Bilirubin": ["direct bilirubin", "conjugated bilirubin"],
+    "Unconjugated Bilirubin": ["indirect bilirubin", "unconjugated bilirubin"],
+    "SGOT (AST)": ["sgot", "ast"],
+    "SGPT (ALT)": ["sgpt", "alt"],
+    "Alkaline Phosphatase": ["alkaline phosphatase", "alp"],
+    "Total Protein": ["total protein"],
+    "Albumin": ["albumin"],
+    "Globulin": ["globulin"],
+    "A/G Ratio": ["a/g ratio", "ag ratio"],
+    "Hemoglobin": ["hemoglobin", "hb"],
+    "RBC": ["rbc"],
+    "WBC": ["wbc"],
+    "Platelets": ["platelet"],
+    "PCV/HCT": ["pcv", "hct", "hematocrit"],
+    "MCV": ["mcv"],
+    "MCH": ["mch"],
+    "MCHC": ["mchc"],
+    "RDW-CV": ["rdw"],
+    "MPV": ["mpv"],
+    "Neutrophils": ["neutrophils"],
+    "Lymphocytes": ["lymphocytes"],
+    "Monocytes": ["monocytes"],
+    "Eosinophils": ["eosinophils"],
+    "Glucose": ["glucose", "blood sugar"],
+    "Cholesterol": ["cholesterol"],
+    "T3 (Triiodothyronine)": ["t3", "triiodothyronine"],
+    "T4 (Thyroxine)": ["t4", "thyroxine"],
+    "TSH": ["tsh", "thyroid stimulating"]
+}
+
+# Keywords that identify each report type, checked in this order (first match wins)
+REPORT_TYPE_KEYWORDS = [
+    ("Ultrasound Report", ["ultrasound", "sonography", "usg", "echotexture", "mm"]),
+    ("Liver Function Test (LFT)", ["liver function", "lft", "sgot", "sgpt", "bilirubin"]),
+    ("Complete Blood Picture (CBP)", ["complete blood", "cbc", "cbp", "hemoglobin", "wbc", "rbc"]),
+    ("Thyroid Test", ["thyroid", "tsh", "t3", "t4"]),
+    ("Vitals Check", ["blood pressure", "heart rate", "temperature", "vitals"]),
+]
+
+# Patterns the parser reads patient details with, tried in order
+PATIENT_PATTERNS = {
+    "Patient Name": [r"Patient Name[:\s]*([A-Za-z\s]+)", r"Name[:\s]*([A-Za-z\s]+)", r"Patient[:\s]*([A-Za-z\s]+)"],
+    "Patient Age": [r"Age[:\s]*([0-9]+[YMD\s]*)", r"Y[:\s]*([0-9]+[YMD\s]*)", r"(\d+)[\s]*(?:years|yrs|year|Y)"],
+    "Patient Gender": [r"Gender[:\s]*([A-Za-z]+)", r"Sex[:\s]*([A-Za-z]+)", r"Male|Female"],
+}
+BLOOD_PRESSURE_PATTERN = r"(\d{2,3})/(\d{2,3})"
+
 # Color palette for distinct line graphs
 COLOR_PALETTE = [
     '#FF0000', '#00FF00', '#0000FF', '#FF00FF', '#FFFF00', '#00FFFF',
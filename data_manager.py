@@ -1,11 +1,67 @@
 import pandas as pd
 import os
-from config import REPORTS_DIR, EXCEL_COLUMNS
+import heapq
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from openpyxl import load_workbook
+from config import REPORTS_DIR, EXCEL_COLUMNS, BASIC_INFO_COLUMNS, TEST_PARAMETERS
+from analytics_index import AnalyticsIndex
+from ingest_index import IngestIndex, report_fingerprint
+from trend_stats import TrendStats
+from search_index import SearchIndex
+from derived_values import DerivedValueEngine, DERIVED_PARAMETERS, is_derived
+
+
+def get_report_columns(report_type=None):
+    """Get the columns relevant to a report type (all columns if not specified)"""
+    if report_type in TEST_PARAMETERS:
+        return BASIC_INFO_COLUMNS + TEST_PARAMETERS[report_type]
+    return list(EXCEL_COLUMNS)
+
+
+def to_date(value):
+    """Normalize a stored Date cell to a date, or None if it can't be parsed"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return datetime.strptime(str(value).strip()[:10], "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def _sort_key(value, missing_last):
+    """Comparable sort key for mixed cell values (numbers/dates before text)"""
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return (missing_last, 0, 0)
+    if isinstance(value, (date, datetime)):
+        return (not missing_last, 0, value.toordinal())
+    if isinstance(value, (int, float)):
+        return (not missing_last, 0, value)
+    return (not missing_last, 1, str(value).lower())
+
 
 class DataManager:
-    def __init__(self, username):
+    def __init__(self, username, analytics_index=None, ingest_index=None, trend_stats=None,
+                 derived_values=None, search_index=None, query_cache_size=32):
         self.username = username
         self.excel_file = os.path.join(REPORTS_DIR, f"{username}_reports.xlsx")
+        self.analytics_index = analytics_index or AnalyticsIndex()
+        self.ingest_index = ingest_index or IngestIndex()
+        self.trend_stats = trend_stats or TrendStats()
+        self.derived_values = derived_values or DerivedValueEngine()
+        self.search_index = search_index or SearchIndex()
+        # Instances are shared across sessions; serialize read-modify-write cycles
+        self._write_lock = threading.Lock()
+        self._reports_cache = None
+        # Query pages and distinct values memoized by data version (shared across sessions)
+        self._query_cache = OrderedDict()
+        self._query_cache_size = query_cache_size
+        self._query_cache_lock = threading.Lock()
         self._ensure_excel_file()
     
     def _ensure_excel_file(self):
@@ -14,28 +70,235 @@ class DataManager:
             df = pd.DataFrame(columns=EXCEL_COLUMNS)
             df.to_excel(self.excel_file, index=False)
     
-    def add_report(self, report_data):
-        """Add a new report to the Excel file"""
+    def add_report(self, report_data, content_hash=None, ocr_text=None):
+        """Add a new report to the Excel file (a no-op for duplicates)"""
+        return self.add_reports([(report_data, content_hash, ocr_text)])[0]
+    
+    def add_reports(self, reports):
+        """Add (report_data, content_hash[, ocr_text]) tuples with a single workbook write"""
+        with self._write_lock:
+            try:
+                df = pd.read_excel(self.excel_file)
+                if not df.empty and not self.ingest_index.has_user(self.username):
+                    self.ingest_index.reindex_user(self.username, self._iter_rows())
+                if not df.empty and not self.trend_stats.has_user(self.username):
+                    self._update_analytics(lambda: self.trend_stats.reindex_user(self.username, self._iter_rows()))
+                if not df.empty and not self.search_index.has_user(self.username):
+                    self._update_analytics(lambda: self.search_index.reindex_user(self.username, self._iter_rows()))
+                
+                outcomes, new_rows, uploads, seen = [], [], [], set()
+                for report_data, content_hash, *ocr_text in reports:
+                    fingerprint = report_fingerprint(report_data)
+                    if content_hash:
+                        uploads.append((content_hash, fingerprint))
+                    if fingerprint in seen or self.ingest_index.find_fingerprint(self.username, fingerprint) is not None:
+                        outcomes.append((True, "Report already saved"))
+                        continue
+                    seen.add(fingerprint)
+                    new_rows.append((len(df) + len(new_rows), fingerprint, report_data, ocr_text[0] if ocr_text else None))
+                    outcomes.append((True, "Report added successfully"))
+                
+                if new_rows:
+                    df = pd.concat([df, pd.DataFrame([row[2] for row in new_rows])], ignore_index=True)
+                    df.to_excel(self.excel_file, index=False)
+                    for row_index, fingerprint, report_data, ocr_text in new_rows:
+                        self.ingest_index.record(self.username, fingerprint, row_index)
+                        self._update_analytics(
+                            lambda: self.analytics_index.add_report(self.username, row_index, report_data)
+                        )
+                        self._update_analytics(
+                            lambda: self.trend_stats.add_report(self.username, row_index, report_data)
+                        )
+                        self._update_analytics(
+                            lambda: self.search_index.add_report(self.username, row_index, report_data, ocr_text)
+                        )
+                for content_hash, fingerprint in uploads:
+                    self.ingest_index.record_upload(self.username, content_hash, fingerprint)
+                return outcomes
+            except Exception as e:
+                return [(False, f"Error adding report: {str(e)}")] * len(reports)
+    
+    def find_uploaded_report(self, content_hash):
+        """Row index of the report saved from an identical file, or None"""
+        return self.ingest_index.find_upload(self.username, content_hash)
+    
+    def dedupe_reports(self):
+        """Merge rows with identical fingerprints, keeping the first of each"""
+        with self._write_lock:
+            try:
+                df = pd.read_excel(self.excel_file)
+                if df.empty:
+                    return True, "No duplicate reports"
+                
+                fingerprints = pd.Series(
+                    [report_fingerprint(row) for row in df.to_dict('records')],
+                    index=df.index
+                )
+                duplicates = int(fingerprints.duplicated().sum())
+                if duplicates:
+                    # Fill gaps (e.g. Notes, Age) from later copies, then keep one row each
+                    df = df.groupby(fingerprints, sort=False).first()
+                    df = df.reset_index(drop=True)
+                    df.to_excel(self.excel_file, index=False)
+                    self._update_analytics(self._reindex_analytics)
+                    self._update_analytics(lambda: self.trend_stats.reindex_user(self.username, self._iter_rows()))
+                    self._update_analytics(lambda: self.search_index.reindex_user(self.username, self._iter_rows()))
+                self.ingest_index.reindex_user(self.username, self._iter_rows())
+                return True, f"Removed {duplicates} duplicate reports"
+            except Exception as e:
+                return False, f"Error removing duplicates: {str(e)}"
+    
+    def data_version(self):
+        """Changes whenever the workbook is rewritten"""
         try:
-            df = pd.read_excel(self.excel_file)
-            new_row = pd.DataFrame([report_data])
-            df = pd.concat([df, new_row], ignore_index=True)
-            df.to_excel(self.excel_file, index=False)
-            return True, "Report added successfully"
-        except Exception as e:
-            return False, f"Error adding report: {str(e)}"
+            stat = os.stat(self.excel_file)
+            return (self.excel_file, stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
     
     def get_all_reports(self):
-        """Get all reports for the user"""
+        """Get all reports for the user (reused until the workbook changes)"""
+        version = self.data_version()
+        cached = self._reports_cache
+        if cached is not None and cached[0] == version:
+            return cached[1].copy()
+        
         try:
             df = pd.read_excel(self.excel_file)
             if 'Date' in df.columns:
                 df['Date'] = pd.to_datetime(df['Date'])
                 df = df.sort_values('Date', ascending=False)
-            return df
+            # Fill derived values for historical and edited rows; unchanged rows are cached
+            df = self.derived_values.apply(df, key=self.username)
+            self._reports_cache = (version, df)
+            return df.copy()
         except Exception as e:
             return pd.DataFrame(columns=EXCEL_COLUMNS)
     
+    def _cached(self, key, compute):
+        """compute() memoized until the workbook changes"""
+        key = (self.data_version(),) + key
+        with self._query_cache_lock:
+            if key in self._query_cache:
+                self._query_cache.move_to_end(key)
+                return self._query_cache[key]
+        
+        result = compute()
+        with self._query_cache_lock:
+            self._query_cache[key] = result
+            while len(self._query_cache) > self._query_cache_size:
+                self._query_cache.popitem(last=False)
+        return result
+    
+    def iter_reports(self, columns=None, start_date=None, end_date=None,
+                     patient=None, report_type=None):
+        """Stream report rows as dicts without loading the whole workbook"""
+        for _, record in self._iter_rows(columns, start_date, end_date, patient, report_type):
+            yield record
+    
+    def _iter_rows(self, columns=None, start_date=None, end_date=None,
+                   patient=None, report_type=None):
+        """Yield (index, row) pairs matching the filters, read in read-only mode"""
+        try:
+            workbook = load_workbook(self.excel_file, read_only=True)
+        except Exception:
+            return
+        
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = next(rows, None)
+            if not header:
+                return
+            
+            positions = {name: i for i, name in enumerate(header) if name is not None}
+            if columns is None:
+                columns = list(positions)
+            
+            def cell(values, column):
+                i = positions.get(column)
+                return values[i] if i is not None and i < len(values) else None
+            
+            for index, values in enumerate(rows):
+                if report_type and cell(values, "Report Type") != report_type:
+                    continue
+                if patient and str(cell(values, "Patient Name")) != str(patient):
+                    continue
+                
+                report_date = to_date(cell(values, "Date"))
+                if start_date and (report_date is None or report_date < start_date):
+                    continue
+                if end_date and (report_date is None or report_date > end_date):
+                    continue
+                
+                record = {column: cell(values, column) for column in columns}
+                if "Date" in record and report_date is not None:
+                    record["Date"] = report_date
+                yield index, record
+        finally:
+            workbook.close()
+    
+    def query_reports(self, page=1, page_size=50, sort_by="Date", ascending=False,
+                      columns=None, start_date=None, end_date=None,
+                      patient=None, report_type=None):
+        """Get one page of filtered, sorted reports and the total match count"""
+        columns = list(columns or get_report_columns(report_type))
+        key = ("query", page, page_size, sort_by, ascending, tuple(columns),
+               start_date, end_date, patient, report_type)
+        df, total = self._cached(key, lambda: self._query_reports(
+            page, page_size, sort_by, ascending, columns, start_date, end_date, patient, report_type
+        ))
+        return df.copy(), total
+    
+    def _query_reports(self, page, page_size, sort_by, ascending, columns,
+                       start_date, end_date, patient, report_type):
+        fetch = columns + [sort_by] if sort_by and sort_by not in columns else list(columns)
+        # Derived columns on the page need their inputs too
+        derived = [column for column in columns if column in DERIVED_PARAMETERS]
+        if derived:
+            fetch += [column for column in self.derived_values.inputs if column not in fetch]
+        rows = self._iter_rows(fetch, start_date, end_date, patient, report_type)
+        
+        total = 0
+        def counted(items):
+            nonlocal total
+            for item in items:
+                total += 1
+                yield item
+        
+        # Only the rows up to the end of the requested page are kept in memory
+        keep = max(page, 1) * page_size
+        if not sort_by:
+            window = [item for _, item in zip(range(keep), counted(rows))]
+            for _ in counted(rows):
+                pass
+        elif ascending:
+            window = heapq.nsmallest(keep, counted(rows), key=lambda item: _sort_key(item[1].get(sort_by), True))
+        else:
+            window = heapq.nlargest(keep, counted(rows), key=lambda item: _sort_key(item[1].get(sort_by), False))
+        
+        window = window[keep - page_size:]
+        df = pd.DataFrame(
+            [[row.get(col) for col in fetch] for _, row in window],
+            columns=fetch,
+            index=[index for index, _ in window]
+        )
+        if derived and not df.empty:
+            df = self.derived_values.apply(df, key=self.username)
+        df = df[columns]
+        if 'Date' in df.columns:
+            df['Date'] = pd.to_datetime(df['Date'])
+        return df, total
+    
+    def get_distinct_values(self, column):
+        """Get the distinct non-empty values of one column"""
+        def distinct():
+            values = set()
+            for row in self.iter_reports(columns=[column]):
+                if row[column] is not None:
+                    values.add(str(row[column]))
+            return sorted(values)
+        return list(self._cached(("distinct", column), distinct))
+    
     def get_latest_report(self):
         """Get the most recent report"""
         df = self.get_all_reports()
@@ -51,24 +314,73 @@ class DataManager:
             return history
         return pd.DataFrame()
     
+    def get_trend_summary(self, profile=None):
+        """Get rolling mean, slope, last change and out-of-range streak per parameter"""
+        if not self.trend_stats.has_user(self.username):
+            with self._write_lock:
+                self._update_analytics(lambda: self.trend_stats.reindex_user(self.username, self._iter_rows()))
+        return self.trend_stats.summary(self.username, profile)
+    
+    def search_reports(self, query, profile=None, start_date=None, end_date=None, report_type=None, limit=50):
+        """Full-text search over OCR text and findings (see SearchIndex.search)"""
+        if not self.search_index.has_user(self.username):
+            with self._write_lock:
+                self._update_analytics(lambda: self.search_index.reindex_user(self.username, self._iter_rows()))
+        return self.search_index.search(self.username, query, profile, start_date, end_date, report_type, limit)
+    
     def delete_report(self, index):
         """Delete a report by index"""
-        try:
-            df = pd.read_excel(self.excel_file)
-            df = df.drop(index)
-            df.to_excel(self.excel_file, index=False)
-            return True, "Report deleted successfully"
-        except Exception as e:
-            return False, f"Error deleting report: {str(e)}"
+        with self._write_lock:
+            try:
+                df = pd.read_excel(self.excel_file)
+                df = df.drop(index)
+                df.to_excel(self.excel_file, index=False)
+                self._update_analytics(lambda: self.analytics_index.delete_report(self.username, index))
+                self._update_analytics(lambda: self.ingest_index.delete_report(self.username, index))
+                self._update_analytics(lambda: self.trend_stats.delete_report(self.username, index))
+                self._update_analytics(lambda: self.search_index.delete_report(self.username, index))
+                return True, "Report deleted successfully"
+            except Exception as e:
+                return False, f"Error deleting report: {str(e)}"
     
     def update_report(self, index, report_data):
         """Update an existing report"""
+        with self._write_lock:
+            try:
+                df = pd.read_excel(self.excel_file)
+                previous = df.loc[index].to_dict()
+                for key, value in report_data.items():
+                    if key in df.columns:
+                        # Empty columns load as float64, which rejects text
+                        if isinstance(value, str) and df[key].dtype != object:
+                            df[key] = df[key].astype(object)
+                        df.at[index, key] = value
+                # Drop derived values whose inputs were edited so they are recomputed on read;
+                # measured values (not what the old inputs gave) are kept
+                changed = set(report_data)
+                for name, spec in DERIVED_PARAMETERS.items():
+                    if (name in df.columns and name not in report_data and changed & set(spec.inputs)
+                            and is_derived(previous, name)):
+                        df.at[index, name] = None
+                        changed.add(name)
+                df.to_excel(self.excel_file, index=False)
+                updated = df.loc[index].to_dict()
+                self._update_analytics(lambda: self.analytics_index.update_report(self.username, index, updated))
+                self._update_analytics(lambda: self.ingest_index.update_report(self.username, index, updated))
+                self._update_analytics(lambda: self.trend_stats.update_report(self.username, index, updated))
+                self._update_analytics(lambda: self.search_index.update_report(self.username, index, updated))
+                return True, "Report updated successfully"
+            except Exception as e:
+                return False, f"Error updating report: {str(e)}"
+    
+    def _reindex_analytics(self):
+        """Re-index all of this user's rows (after a rewrite such as dedupe)"""
+        self.analytics_index.reindex_user(self.username, self._iter_rows())
+        self.ingest_index.reindex_user(self.username, self._iter_rows())
+    
+    def _update_analytics(self, update):
+        """Apply an analytics index update without failing the save"""
         try:
-            df = pd.read_excel(self.excel_file)
-            for key, value in report_data.items():
-                if key in df.columns:
-                    df.at[index, key] = value
-            df.to_excel(self.excel_file, index=False)
-            return True, "Report updated successfully"
+            update()
         except Exception as e:
-            return False, f"Error updating report: {str(e)}"
\ No newline at end of file
+            print(f"⚠️ Analytics index update failed: {str(e)}")
\ No newline at end of file
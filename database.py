@@ -0,0 +1,17 @@
+import sqlite3
+from contextlib import contextmanager
+
+
+@contextmanager
+def connect(db_path, timeout=30):
+    """SQLite connection that commits (or rolls back on error) and is always closed.
+
+    ``with sqlite3.connect(...)`` only ends the transaction; the connection
+    stays open until it is garbage collected.
+    """
+    conn = sqlite3.connect(db_path, timeout=timeout)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
@@ -0,0 +1,120 @@
+import threading
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+# A parameter computed from others; ``compute`` takes and returns numeric Series
+DerivedParameter = namedtuple("DerivedParameter", ["inputs", "compute", "decimals"])
+
+
+def _difference(total, part):
+    result = total - part
+    return result.where(result >= 0)
+
+
+def _ratio(numerator, denominator):
+    return numerator / denominator.where(denominator > 0)
+
+
+# Evaluated in order, so later entries may use earlier ones (A/G needs Globulin).
+# A measured value always wins; derived values only fill gaps.
+DERIVED_PARAMETERS = {
+    "Globulin": DerivedParameter(("Total Protein", "Albumin"), _difference, 2),
+    "A/G Ratio": DerivedParameter(("Albumin", "Globulin"), _ratio, 2),
+    "Unconjugated Bilirubin": DerivedParameter(("Total Bilirubin", "Conjugated Bilirubin"), _difference, 2),
+    "AST/ALT Ratio": DerivedParameter(("SGOT (AST)", "SGPT (ALT)"), _ratio, 2),
+}
+
+DERIVED_COLUMNS = list(DERIVED_PARAMETERS)
+
+
+def derive_frame(df, registry=DERIVED_PARAMETERS):
+    """Compute every derived column for a whole frame at once"""
+    def numeric(column):
+        if column in df.columns:
+            return pd.to_numeric(df[column], errors="coerce").astype(float)
+        return pd.Series(np.nan, index=df.index)
+
+    values = {}
+    for name, spec in registry.items():
+        args = [values[column] if column in values else numeric(column) for column in spec.inputs]
+        values[name] = numeric(name).fillna(spec.compute(*args).round(spec.decimals))
+    return pd.DataFrame(values, index=df.index)
+
+
+def derive_report(report, registry=DERIVED_PARAMETERS):
+    """Fill missing derived values in a single report dict (in place)"""
+    derived = derive_frame(pd.DataFrame([report]), registry).iloc[0]
+    for name, value in derived.items():
+        if report.get(name) is None and not pd.isna(value):
+            report[name] = float(value)
+    return report
+
+
+def is_derived(report, name, registry=DERIVED_PARAMETERS):
+    """True if report[name] is what its inputs compute to (filled in, not measured)"""
+    def number(column):
+        return pd.to_numeric(pd.Series([report.get(column)], dtype=object), errors="coerce").astype(float)
+
+    spec = registry[name]
+    value = number(name).iloc[0]
+    computed = spec.compute(*[number(column) for column in spec.inputs]).round(spec.decimals).iloc[0]
+    return not (pd.isna(value) or pd.isna(computed)) and abs(value - computed) <= 10 ** -spec.decimals / 2
+
+
+class DerivedValueEngine:
+    """Fill derived columns into report frames, reusing earlier results.
+
+    Results are cached per key (e.g. a username): each row is hashed on
+    the columns the registry reads and only rows whose inputs were not
+    seen before are recomputed; rows that merely shifted position after
+    a delete are served from the cache.
+    """
+
+    def __init__(self, registry=DERIVED_PARAMETERS):
+        self.registry = registry
+        self.columns = list(registry)
+        self.inputs = list(dict.fromkeys(
+            [column for spec in registry.values() for column in spec.inputs] + self.columns
+        ))
+        self._rows = {}  # key -> derived values indexed by input hash
+        self._lock = threading.Lock()
+
+    def _input_hashes(self, df):
+        inputs = pd.DataFrame({
+            column: pd.to_numeric(df[column], errors="coerce").astype(float)
+            if column in df.columns else np.nan
+            for column in self.inputs
+        }, index=df.index)
+        return pd.util.hash_pandas_object(inputs, index=False).to_numpy()
+
+    def apply(self, df, key=None):
+        """Get a copy of df with every derived column filled in"""
+        if key is None:
+            return df.assign(**derive_frame(df, self.registry))
+
+        with self._lock:
+            known = self._rows.get(key)
+
+        hashes = self._input_hashes(df)
+        hit = np.isin(hashes, known.index.to_numpy()) if known is not None else np.zeros(len(df), dtype=bool)
+
+        derived = pd.DataFrame(np.nan, index=df.index, columns=self.columns)
+        if hit.any():
+            derived.loc[hit] = known.loc[hashes[hit]].to_numpy()
+        if not hit.all():
+            derived.loc[~hit] = derive_frame(df.loc[~hit], self.registry).to_numpy()
+
+        result = df.assign(**derived)
+        rows = pd.DataFrame(derived.to_numpy(), index=hashes, columns=self.columns)
+        if known is not None and len(known) < 4 * max(len(rows), 1):
+            # Keep earlier rows too (pages and full frames share the cache)
+            rows = pd.concat([rows, known])
+        with self._lock:
+            self._rows[key] = rows[~rows.index.duplicated()]
+        return result
+
+    def invalidate(self, key):
+        """Forget everything cached for a key"""
+        with self._lock:
+            self._rows.pop(key, None)
@@ -0,0 +1,136 @@
+import csv
+import io
+import tempfile
+from datetime import date
+from openpyxl import Workbook
+from config import TEXT_COLUMNS, EXPORT_CHUNK_SIZE
+from data_manager import get_report_columns
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = None
+    pq = None
+
+# Export format -> (file name, MIME type)
+EXPORT_FORMATS = {
+    "xlsx": ("reports.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv": ("reports.csv", "text/csv"),
+    "parquet": ("reports.parquet", "application/vnd.apache.parquet"),
+}
+
+
+def available_export_formats():
+    """Get the export formats usable in this environment"""
+    return [fmt for fmt in EXPORT_FORMATS if fmt != "parquet" or pa is not None]
+
+
+class ReportExporter:
+    def __init__(self, data_manager, chunk_size=EXPORT_CHUNK_SIZE):
+        self.data_manager = data_manager
+        self.chunk_size = chunk_size
+
+    def export(self, fileobj, fmt="xlsx", report_type=None, start_date=None,
+               end_date=None, patient=None, columns=None):
+        """Stream matching reports into a binary file object, returns rows written"""
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format: {fmt}")
+
+        columns = columns or get_report_columns(report_type)
+        rows = self.data_manager.iter_reports(
+            columns=columns,
+            start_date=start_date,
+            end_date=end_date,
+            patient=patient,
+            report_type=report_type
+        )
+
+        writer = getattr(self, f"_write_{fmt}")
+        return writer(fileobj, columns, self._chunks(rows, columns))
+
+    def export_to_tempfile(self, fmt="xlsx", **filters):
+        """Export into a spooled temporary file rewound for reading"""
+        tmp = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+        self.export(tmp, fmt, **filters)
+        tmp.seek(0)
+        return tmp
+
+    def _chunks(self, rows, columns):
+        """Group streamed rows into lists of value tuples"""
+        chunk = []
+        for row in rows:
+            chunk.append(tuple(row.get(col) for col in columns))
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _write_xlsx(self, fileobj, columns, chunks):
+        """Write rows with openpyxl's write-only mode"""
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet("Reports")
+        sheet.append(columns)
+
+        count = 0
+        for chunk in chunks:
+            for values in chunk:
+                sheet.append(values)
+            count += len(chunk)
+
+        workbook.save(fileobj)
+        return count
+
+    def _write_csv(self, fileobj, columns, chunks):
+        """Write rows as UTF-8 CSV, one chunk at a time"""
+        text = io.TextIOWrapper(fileobj, encoding="utf-8", newline="")
+        writer = csv.writer(text)
+        writer.writerow(columns)
+
+        count = 0
+        for chunk in chunks:
+            writer.writerows(chunk)
+            text.flush()
+            count += len(chunk)
+
+        text.detach()
+        return count
+
+    def _write_parquet(self, fileobj, columns, chunks):
+        """Write rows as Parquet, one row group per chunk"""
+        if pa is None:
+            raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)")
+
+        schema = pa.schema([(col, self._arrow_type(col)) for col in columns])
+        count = 0
+        with pq.ParquetWriter(fileobj, schema) as writer:
+            for chunk in chunks:
+                arrays = [
+                    pa.array([self._arrow_value(col, values[i]) for values in chunk], type=schema.field(i).type)
+                    for i, col in enumerate(columns)
+                ]
+                writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+                count += len(chunk)
+        return count
+
+    def _arrow_type(self, column):
+        """Parquet column type for a report column"""
+        if column == "Date":
+            return pa.date32()
+        if column in TEXT_COLUMNS:
+            return pa.string()
+        return pa.float64()
+
+    def _arrow_value(self, column, value):
+        """Coerce a stored cell to its Parquet column type"""
+        if value is None:
+            return None
+        if column == "Date":
+            return value if isinstance(value, date) else None
+        if column in TEXT_COLUMNS:
+            return str(value)
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
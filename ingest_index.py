@@ -0,0 +1,159 @@
+import glob
+import hashlib
+import json
+import os
+import threading
+from config import INGEST_INDEX_DB, REPORTS_DIR
+from database import connect
+
+# Columns that identify a report; everything else numeric is a parameter value
+FINGERPRINT_KEYS = ["Patient Name", "Date", "Report Type"]
+FINGERPRINT_IGNORED = {"Notes", "Patient Age", "Patient Gender"}
+
+
+def content_hash(pdf_bytes):
+    """SHA-256 of the uploaded file"""
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+def _normalize(value):
+    """Normalize a cell so OCR/Excel round-trips compare equal"""
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    if hasattr(value, "strftime"):
+        return value.strftime("%Y-%m-%d")
+    if isinstance(value, (int, float)):
+        return round(float(value), 3)
+    text = " ".join(str(value).split()).lower()
+    try:
+        return round(float(text), 3)
+    except ValueError:
+        return text or None
+
+
+def report_fingerprint(report):
+    """Hash of patient, date, report type and all parameter values"""
+    normalized = {}
+    for column, value in report.items():
+        if column in FINGERPRINT_IGNORED:
+            continue
+        value = _normalize(value)
+        if column == "Date" and isinstance(value, str):
+            value = value[:10]
+        if value is not None or column in FINGERPRINT_KEYS:
+            normalized[column] = value
+    payload = json.dumps(normalized, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class IngestIndex:
+    """Hash index of ingested uploads and report fingerprints per user.
+
+    ``fingerprints`` maps each stored row's fingerprint to its row index
+    and is rebuilt when rows shift; ``uploads`` maps a file's content hash
+    to the fingerprint it produced, so a re-upload is recognised before
+    any OCR runs (and forgotten once that report is deleted).
+    """
+
+    def __init__(self, db_path=INGEST_INDEX_DB):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._ensure_schema()
+
+    def _connect(self):
+        return connect(self.db_path)
+
+    def _ensure_schema(self):
+        """Create tables if they don't exist"""
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS fingerprints (
+                    username TEXT NOT NULL,
+                    fingerprint TEXT NOT NULL,
+                    row_index INTEGER NOT NULL,
+                    PRIMARY KEY (username, fingerprint)
+                );
+                CREATE TABLE IF NOT EXISTS uploads (
+                    username TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    fingerprint TEXT NOT NULL,
+                    PRIMARY KEY (username, content_hash)
+                );
+            """)
+
+    def has_user(self, username):
+        """Check whether a user's rows have been indexed yet"""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT 1 FROM fingerprints WHERE username = ? LIMIT 1", (username,)
+            ).fetchone() is not None
+
+    def find_fingerprint(self, username, fingerprint):
+        """Row index of a stored report with this fingerprint, or None"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT row_index FROM fingerprints WHERE username = ? AND fingerprint = ?",
+                (username, fingerprint)
+            ).fetchone()
+        return row[0] if row else None
+
+    def find_upload(self, username, digest):
+        """Row index of the report a previously uploaded file produced, or None"""
+        with self._connect() as conn:
+            row = conn.execute("""
+                SELECT f.row_index FROM uploads u
+                JOIN fingerprints f ON f.username = u.username AND f.fingerprint = u.fingerprint
+                WHERE u.username = ? AND u.content_hash = ?
+            """, (username, digest)).fetchone()
+        return row[0] if row else None
+
+    def record(self, username, fingerprint, row_index, digest=None):
+        """Record a stored report (and the upload it came from)"""
+        with self._lock, self._connect() as conn:
+            conn.execute("INSERT OR IGNORE INTO fingerprints VALUES (?, ?, ?)",
+                         (username, fingerprint, row_index))
+        if digest:
+            self.record_upload(username, digest, fingerprint)
+
+    def record_upload(self, username, digest, fingerprint):
+        """Map an uploaded file to the report fingerprint it produced"""
+        with self._lock, self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO uploads VALUES (?, ?, ?)",
+                         (username, digest, fingerprint))
+
+    def update_report(self, username, row_index, report):
+        """Re-fingerprint an edited row"""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM fingerprints WHERE username = ? AND row_index = ?", (username, row_index))
+            conn.execute("INSERT OR IGNORE INTO fingerprints VALUES (?, ?, ?)",
+                         (username, report_fingerprint(report), row_index))
+
+    def delete_report(self, username, row_index):
+        """Remove one row; later rows shift up by one as in the workbook"""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM fingerprints WHERE username = ? AND row_index = ?", (username, row_index))
+            conn.execute("UPDATE fingerprints SET row_index = row_index - 1 WHERE username = ? AND row_index > ?",
+                         (username, row_index))
+
+    def reindex_user(self, username, indexed_reports):
+        """Rebuild a user's fingerprints from (row_index, report) pairs"""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM fingerprints WHERE username = ?", (username,))
+            conn.executemany(
+                "INSERT OR IGNORE INTO fingerprints VALUES (?, ?, ?)",
+                ((username, report_fingerprint(report), row_index) for row_index, report in indexed_reports)
+            )
+
+
+if __name__ == "__main__":
+    import argparse
+    from data_manager import DataManager
+
+    parser = argparse.ArgumentParser(description="Deduplicate stored reports")
+    parser.add_argument("command", choices=["dedupe"])
+    parser.parse_args()
+
+    for path in sorted(glob.glob(os.path.join(REPORTS_DIR, "*_reports.xlsx"))):
+        username = os.path.basename(path)[:-len("_reports.xlsx")]
+        success, msg = DataManager(username).dedupe_reports()
+        print(f"{username}: {msg}")
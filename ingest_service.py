@@ -0,0 +1,313 @@
+"""Headless HTTP ingestion service for pushing PDFs without the Streamlit UI.
+
+    python ingest_service.py --port 8600
+
+Endpoints (JSON in and out, bearer tokens from /login):
+
+    POST /login          {"username": ..., "password": ...} -> {"token": ...}
+    POST /reports        raw PDF body -> 202 {"job_id": ..., "status": "queued"}
+    GET  /jobs/<job_id>  -> {"status": "queued"|"running"|"done"|"error", ...}
+    GET  /health         -> queue depth and worker counts
+
+OCR runs in a process pool; uploads wait in a bounded queue, served
+round-robin across users, and get 503 with Retry-After once it is full.
+Pages share the machine's OCR_WORKERS slots with the Streamlit app and
+yield to its interactive uploads (see ocr_scheduler.py).
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit
+from config import (INGEST_HOST, INGEST_PORT, INGEST_QUEUE_SIZE, INGEST_MAX_UPLOAD_BYTES,
+                    INGEST_JOB_HISTORY, OCR_WORKERS)
+from ingest_index import content_hash
+from ocr_scheduler import PRIORITY_BATCH
+from resources import get_auth_manager, get_data_manager
+
+STATUS_TEXT = {200: "OK", 202: "Accepted", 400: "Bad Request", 401: "Unauthorized",
+               404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+               500: "Internal Server Error", 503: "Service Unavailable"}
+
+_worker_ocr = None
+
+
+def _init_worker():
+    """Build one OCRProcessor per pool process"""
+    global _worker_ocr
+    # One Tesseract thread per process; the pool provides the parallelism
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+    from ocr_processor import OCRProcessor
+    from ocr_scheduler import OCRScheduler
+    # One page at a time per process; pages wait in the queue shared with the app
+    _worker_ocr = OCRProcessor(scheduler=OCRScheduler(workers=1))
+
+
+def _process_pdf(pdf_bytes, username):
+    """Runs in a pool process: OCR and parse one PDF"""
+    # Batch pages share OCR_WORKERS slots with the app and yield to its interactive uploads
+    parsed, text = _worker_ocr.process_pdf_report(pdf_bytes, user=username, priority=PRIORITY_BATCH)
+    return parsed, text
+
+
+class FairQueue:
+    """Bounded queue that hands out items round-robin across users.
+
+    One user pushing a hundred PDFs doesn't make another user's single
+    upload wait behind all of them.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._users = OrderedDict()  # user -> deque of items
+        self._size = 0
+        self._ready = asyncio.Semaphore(0)
+
+    def qsize(self):
+        return self._size
+
+    def put_nowait(self, user, item):
+        """Queue an item, or raise asyncio.QueueFull"""
+        if self._size >= self.maxsize:
+            raise asyncio.QueueFull
+        self._users.setdefault(user, deque()).append(item)
+        self._size += 1
+        self._ready.release()
+
+    async def get(self):
+        """Next item of the user who has waited longest"""
+        await self._ready.acquire()
+        user, items = next(iter(self._users.items()))
+        item = items.popleft()
+        if items:
+            self._users.move_to_end(user)
+        else:
+            del self._users[user]
+        self._size -= 1
+        return item
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class IngestService:
+    """Accepts uploads over HTTP and feeds them to a pool of OCR processes.
+
+    ``workers`` coroutines drain the bounded queue round-robin across
+    users, each keeping one PDF in the process pool at a time, so the
+    queue length is the only backlog. Jobs are kept in memory (the last
+    INGEST_JOB_HISTORY finished ones) and are only visible to the user
+    who submitted them.
+    """
+
+    def __init__(self, workers=OCR_WORKERS, queue_size=INGEST_QUEUE_SIZE,
+                 max_upload=INGEST_MAX_UPLOAD_BYTES):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.max_upload = max_upload
+        self.jobs = OrderedDict()
+        self.auth_manager = get_auth_manager()
+        self._queue = None
+        self._pool = None
+        self._tasks = []
+
+    async def start(self, host=INGEST_HOST, port=INGEST_PORT):
+        """Start the pool, OCR workers and HTTP listener"""
+        self._queue = FairQueue(self.queue_size)
+        # Spawned, not forked: forking while bcrypt/to_thread workers hold locks can deadlock the child
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                         mp_context=multiprocessing.get_context("spawn"))
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        return await asyncio.start_server(self._handle, host, port)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._pool.shutdown(cancel_futures=True)
+
+    # ---------------- jobs ----------------
+
+    def _forget_old_jobs(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job["status"] in ("done", "error")]
+        for job_id in finished[:max(0, len(finished) - INGEST_JOB_HISTORY)]:
+            del self.jobs[job_id]
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job_id, pdf_bytes = await self._queue.get()
+            job = self.jobs[job_id]
+            job["status"] = "running"
+            job["started"] = time.time()
+            try:
+                parsed, text = await loop.run_in_executor(self._pool, _process_pdf, pdf_bytes, job["username"])
+                data_manager = get_data_manager(job["username"])
+                success, msg = await asyncio.to_thread(data_manager.add_report, parsed, job["digest"], text)
+                job.update(status="done" if success else "error", message=msg, result=parsed)
+            except Exception as e:
+                job.update(status="error", message=str(e))
+            finally:
+                job["finished"] = time.time()
+                self._forget_old_jobs()
+
+    async def submit(self, username, pdf_bytes):
+        """Queue a PDF for OCR, or raise HTTPError(503) when the queue is full"""
+        digest = content_hash(pdf_bytes)
+        job_id = uuid.uuid4().hex
+        job = {"job_id": job_id, "username": username, "digest": digest,
+               "status": "queued", "submitted": time.time()}
+
+        # Re-uploads of a saved file are answered without OCR
+        existing = await asyncio.to_thread(get_data_manager(username).find_uploaded_report, digest)
+        if existing is not None:
+            job.update(status="done", message="Report already saved", finished=time.time())
+        else:
+            try:
+                self._queue.put_nowait(username, (job_id, pdf_bytes))
+            except asyncio.QueueFull:
+                raise HTTPError(503, "OCR queue is full, retry later", {"Retry-After": "5"})
+        self.jobs[job_id] = job
+        return job
+
+    # ---------------- HTTP ----------------
+
+    def _authenticate(self, headers):
+        authorization = headers.get("authorization", "")
+        username = None
+        if authorization.lower().startswith("bearer "):
+            username = self.auth_manager.resume_session(authorization[7:].strip())
+        if username is None:
+            raise HTTPError(401, "Missing or invalid session token")
+        return username
+
+    async def _route(self, method, path, headers, body):
+        if path == "/health":
+            return 200, {"queued": self._queue.qsize(), "queue_size": self.queue_size,
+                         "workers": self.workers,
+                         "running": sum(job["status"] == "running" for job in self.jobs.values())}
+
+        if path == "/login":
+            if method != "POST":
+                raise HTTPError(405, "Use POST")
+            try:
+                credentials = json.loads(body or b"{}")
+                username, password = credentials["username"], credentials["password"]
+            except (ValueError, KeyError, TypeError):
+                raise HTTPError(400, "Expected JSON with username and password")
+            success, msg = await asyncio.to_thread(self.auth_manager.login, username, password)
+            if not success:
+                raise HTTPError(401, msg)
+            return 200, {"token": self.auth_manager.create_session(username)}
+
+        username = self._authenticate(headers)
+
+        if path == "/reports":
+            if method != "POST":
+                raise HTTPError(405, "Use POST")
+            if not body.startswith(b"%PDF"):
+                raise HTTPError(400, "Body must be a PDF file")
+            job = await self.submit(username, body)
+            return 202, self._public(job)
+
+        if path.startswith("/jobs/"):
+            job = self.jobs.get(path[len("/jobs/"):])
+            if job is None or job["username"] != username:
+                raise HTTPError(404, "Unknown job")
+            return 200, self._public(job)
+
+        raise HTTPError(404, "Not found")
+
+    @staticmethod
+    def _public(job):
+        return {key: value for key, value in job.items() if key != "username"}
+
+    async def _read_request(self, reader):
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        if not request_line:
+            return None
+        try:
+            method, target, _ = request_line.split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "Malformed request line")
+
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1")
+            if line in ("\r\n", "\n", ""):
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get("content-length") or 0)
+        if length > self.max_upload:
+            raise HTTPError(413, f"Uploads are limited to {self.max_upload // (1024 * 1024)} MB")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), urlsplit(target).path, headers, body
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await self._read_request(reader)
+            if request is None:
+                writer.close()
+                return
+            status, payload = await self._route(*request)
+            headers = {}
+        except HTTPError as e:
+            status, payload, headers = e.status, {"error": str(e)}, e.headers
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        except Exception as e:
+            status, payload, headers = 500, {"error": str(e)}, {}
+        await self._respond(writer, status, payload, headers)
+
+    async def _respond(self, writer, status, payload, headers):
+        body = json.dumps(payload, default=str).encode("utf-8")
+        head = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+                "Content-Type: application/json",
+                f"Content-Length: {len(body)}",
+                "Connection: close"]
+        head += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+
+async def serve(host=INGEST_HOST, port=INGEST_PORT, workers=OCR_WORKERS, queue_size=INGEST_QUEUE_SIZE):
+    service = IngestService(workers=workers, queue_size=queue_size)
+    server = await service.start(host, port)
+    print(f"Ingestion service listening on http://{host}:{port} "
+          f"({workers} OCR workers, queue of {queue_size})")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Headless PDF ingestion service")
+    parser.add_argument("--host", default=INGEST_HOST)
+    parser.add_argument("--port", type=int, default=INGEST_PORT)
+    parser.add_argument("--workers", type=int, default=OCR_WORKERS)
+    parser.add_argument("--queue-size", type=int, default=INGEST_QUEUE_SIZE)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.queue_size))
+    except KeyboardInterrupt:
+        pass
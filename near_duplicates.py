@@ -0,0 +1,140 @@
+import hashlib
+import re
+import threading
+import zlib
+import numpy as np
+from config import (NEAR_DUPLICATE_DB, SHINGLE_SIZE, MINHASH_PERMUTATIONS,
+                    LSH_BANDS, NEAR_DUPLICATE_THRESHOLD)
+from database import connect
+
+_PRIME = np.uint64(4294967311)  # smallest prime above 2**32
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """Character shingles of normalized OCR text, hashed to 32 bits"""
+    normalized = " ".join(re.sub(r"[^a-z0-9.]+", " ", text.lower()).split())
+    if len(normalized) < size:
+        return np.array([zlib.crc32(normalized.encode("utf-8"))], dtype=np.uint64) if normalized else np.array([], dtype=np.uint64)
+    return np.unique(np.fromiter(
+        (zlib.crc32(normalized[i:i + size].encode("utf-8")) for i in range(len(normalized) - size + 1)),
+        dtype=np.uint64
+    ))
+
+
+class MinHasher:
+    """MinHash signatures from universal hashes (a*x + b) mod p"""
+
+    def __init__(self, num_perm=MINHASH_PERMUTATIONS, seed=1):
+        rng = np.random.RandomState(seed)
+        # a, b < 2**31 keep a*x + b below 2**64 for 32-bit x
+        self.a = rng.randint(1, 2 ** 31, size=num_perm).astype(np.uint64)
+        self.b = rng.randint(0, 2 ** 31, size=num_perm).astype(np.uint64)
+
+    def signature(self, text):
+        """MinHash signature of text, or None if it has no shingles (blank page)"""
+        hashed = shingles(text)
+        if hashed.size == 0:
+            return None
+        return ((np.outer(self.a, hashed) + self.b[:, None]) % _PRIME).min(axis=1)
+
+
+class NearDuplicateIndex:
+    """Banded LSH over MinHash signatures of report OCR text.
+
+    Each signature is split into LSH_BANDS bands; a document lands in one
+    bucket per band, so a query only compares against documents sharing a
+    bucket instead of every stored report. Documents are keyed by the
+    upload's content hash and indexed per ``kind`` (first page / full text).
+    """
+
+    def __init__(self, db_path=NEAR_DUPLICATE_DB, bands=LSH_BANDS):
+        self.db_path = db_path
+        self.hasher = MinHasher()
+        self.bands = bands
+        self.rows_per_band = self.hasher.a.size // bands
+        self._lock = threading.Lock()
+        self._ensure_schema()
+
+    def _connect(self):
+        return connect(self.db_path)
+
+    def _ensure_schema(self):
+        """Create tables and indexes if they don't exist"""
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS signatures (
+                    username TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    doc_id TEXT NOT NULL,
+                    signature BLOB NOT NULL,
+                    PRIMARY KEY (username, kind, doc_id)
+                );
+                CREATE TABLE IF NOT EXISTS buckets (
+                    username TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    band INTEGER NOT NULL,
+                    bucket TEXT NOT NULL,
+                    doc_id TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_buckets
+                    ON buckets (username, kind, band, bucket);
+            """)
+
+    def _band_keys(self, signature):
+        """One bucket key per band"""
+        r = self.rows_per_band
+        return [hashlib.sha1(signature[i * r:(i + 1) * r].tobytes()).hexdigest()[:16]
+                for i in range(self.bands)]
+
+    def add(self, username, doc_id, text, kind="first_page"):
+        """Index a document's text; blank text is not indexed"""
+        signature = self.hasher.signature(text)
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM buckets WHERE username = ? AND kind = ? AND doc_id = ?",
+                         (username, kind, doc_id))
+            if signature is None:
+                # Blank pages all share one signature and would match each other
+                conn.execute("DELETE FROM signatures WHERE username = ? AND kind = ? AND doc_id = ?",
+                             (username, kind, doc_id))
+                return
+            conn.execute("INSERT OR REPLACE INTO signatures VALUES (?, ?, ?, ?)",
+                         (username, kind, doc_id, signature.tobytes()))
+            conn.executemany(
+                "INSERT INTO buckets VALUES (?, ?, ?, ?, ?)",
+                [(username, kind, band, key, doc_id) for band, key in enumerate(self._band_keys(signature))]
+            )
+
+    def remove(self, username, doc_id):
+        """Drop a document from every kind"""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM buckets WHERE username = ? AND doc_id = ?", (username, doc_id))
+            conn.execute("DELETE FROM signatures WHERE username = ? AND doc_id = ?", (username, doc_id))
+
+    def query(self, username, text, kind="first_page", threshold=NEAR_DUPLICATE_THRESHOLD):
+        """Get [(doc_id, estimated Jaccard similarity)] above threshold, best first"""
+        signature = self.hasher.signature(text)
+        if signature is None:
+            return []
+        keys = self._band_keys(signature)
+
+        with self._connect() as conn:
+            candidates = {
+                row[0] for band, key in enumerate(keys)
+                for row in conn.execute(
+                    "SELECT doc_id FROM buckets WHERE username = ? AND kind = ? AND band = ? AND bucket = ?",
+                    (username, kind, band, key)
+                )
+            }
+            matches = []
+            for doc_id in candidates:
+                stored = conn.execute(
+                    "SELECT signature FROM signatures WHERE username = ? AND kind = ? AND doc_id = ?",
+                    (username, kind, doc_id)
+                ).fetchone()
+                if stored is None:
+                    continue
+                similarity = float(np.mean(np.frombuffer(stored[0], dtype=np.uint64) == signature))
+                if similarity >= threshold:
+                    matches.append((doc_id, round(similarity, 3)))
+
+        return sorted(matches, key=lambda match: match[1], reverse=True)
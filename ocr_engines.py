@@ -0,0 +1,347 @@
+import hashlib
+import json
+import os
+import threading
+from config import (OCR_ENGINE, OCR_DPI, OCR_FALLBACK_DPIS, OCR_PAGE_TIMEOUT, TESSERACT_CMD,
+                    POPPLER_PATH, OCR_RECORDINGS_DIR, OCR_REPLAY_FALLBACK, OCR_DETECT_ORIENTATION,
+                    OCR_ORIENTATION_DB, OCR_OSD_DPI, OCR_OSD_TIMEOUT, OCR_OSD_MIN_CONFIDENCE,
+                    OCR_DETECT_LAYOUT)
+from database import connect
+from ocr_layout import LayoutAnalyzer, crop_regions, is_results_line
+
+
+class OCRTimeoutError(Exception):
+    """A page took longer than its time budget"""
+
+
+def page_hash(pdf_bytes, page_number):
+    """Key of one page of one PDF (no rasterization needed)"""
+    return hashlib.sha256(hashlib.sha256(pdf_bytes).digest() + str(page_number).encode()).hexdigest()
+
+
+class PopplerRasterizer:
+    """Renders PDF pages to PIL images with pdf2image/Poppler"""
+
+    def __init__(self, poppler_path=POPPLER_PATH, dpi=OCR_DPI):
+        if poppler_path and os.path.exists(poppler_path):
+            print(f"✓ Poppler configured: {poppler_path}")
+        else:
+            if poppler_path:
+                print(f"⚠️ Poppler not found at: {poppler_path}, using PATH")
+            poppler_path = None
+        self.poppler_path = poppler_path
+        self.dpi = dpi
+
+    def page_count(self, pdf_bytes):
+        from pdf2image import pdfinfo_from_bytes
+        return int(pdfinfo_from_bytes(pdf_bytes, poppler_path=self.poppler_path)["Pages"])
+
+    def render(self, pdf_bytes, page_number, dpi=None, timeout=None):
+        from pdf2image import convert_from_bytes
+        from pdf2image.exceptions import PDFPopplerTimeoutError
+        try:
+            images = convert_from_bytes(pdf_bytes, dpi=dpi or self.dpi, first_page=page_number,
+                                        last_page=page_number, poppler_path=self.poppler_path,
+                                        timeout=timeout)
+        except PDFPopplerTimeoutError:
+            raise OCRTimeoutError(f"Rendering page {page_number} took longer than {timeout}s")
+        return images[0] if images else None
+
+
+class TesseractRecognizer:
+    """Reads text from a page image with pytesseract"""
+
+    def __init__(self, tesseract_cmd=TESSERACT_CMD, lang="eng", config="--psm 6 --oem 3"):
+        import pytesseract
+        if tesseract_cmd and os.path.exists(tesseract_cmd):
+            pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+            print(f"✓ Tesseract configured: {tesseract_cmd}")
+        elif tesseract_cmd:
+            print(f"⚠️ Tesseract not found at: {tesseract_cmd}, using PATH")
+        self.lang = lang
+        self.config = config
+
+    @staticmethod
+    def _run(call, timeout, what):
+        """Run one pytesseract call, turning its timeout into OCRTimeoutError"""
+        try:
+            # pytesseract kills the tesseract process once the timeout expires
+            return call(timeout or 0)
+        except RuntimeError as e:
+            if "timeout" in str(e).lower():
+                raise OCRTimeoutError(f"{what} took longer than {timeout}s")
+            raise
+
+    def recognize(self, image, timeout=None):
+        import pytesseract
+        return self._run(lambda t: pytesseract.image_to_string(image, lang=self.lang, config=self.config,
+                                                                timeout=t), timeout, "Tesseract")
+
+    def lines(self, image, timeout=None):
+        """Text lines with their pixel boxes: [(text, left, top, right, bottom)]"""
+        import pytesseract
+        data = self._run(lambda t: pytesseract.image_to_data(image, lang=self.lang, config=self.config,
+                                                             output_type=pytesseract.Output.DICT, timeout=t),
+                         timeout, "Layout analysis")
+        lines = {}
+        for i, word in enumerate(data["text"]):
+            if not word.strip():
+                continue
+            key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+            left, top = data["left"][i], data["top"][i]
+            right, bottom = left + data["width"][i], top + data["height"][i]
+            if key in lines:
+                text, l, t, r, b = lines[key]
+                lines[key] = (text + " " + word, min(l, left), min(t, top), max(r, right), max(b, bottom))
+            else:
+                lines[key] = (word, left, top, right, bottom)
+        return list(lines.values())
+
+    def detect_orientation(self, image, timeout=None):
+        """(clockwise degrees that make the page upright, confidence) from Tesseract OSD"""
+        import pytesseract
+        try:
+            osd = self._run(lambda t: pytesseract.image_to_osd(image, output_type=pytesseract.Output.DICT,
+                                                               timeout=t), timeout, "Orientation detection")
+        except pytesseract.TesseractError:
+            # Too little text to judge (or no osd.traineddata): leave the page as it is
+            return 0, 0.0
+        return osd.get("rotate", 0) % 360, osd.get("orientation_conf", 0.0)
+
+
+class OrientationDetector:
+    """Orientation pre-pass run before a page's full-resolution OCR.
+
+    Phone-scanned pages often arrive rotated, and Tesseract then spends a
+    whole pass producing garbage. OSD on a low-DPI render costs a fraction
+    of that pass; the rotation it finds is cached per page hash so
+    re-uploads and retries never run it twice.
+    """
+
+    def __init__(self, rasterizer, recognizer, db_path=OCR_ORIENTATION_DB, dpi=OCR_OSD_DPI,
+                 timeout=OCR_OSD_TIMEOUT, min_confidence=OCR_OSD_MIN_CONFIDENCE):
+        self.rasterizer = rasterizer
+        self.recognizer = recognizer
+        self.db_path = db_path
+        self.dpi = dpi
+        self.timeout = timeout
+        self.min_confidence = min_confidence
+        self._lock = threading.Lock()
+        self._ensure_schema()
+
+    def _connect(self):
+        return connect(self.db_path)
+
+    def _ensure_schema(self):
+        """Create the cache table if it doesn't exist"""
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS orientations (
+                    page_hash TEXT PRIMARY KEY,
+                    rotate INTEGER NOT NULL,
+                    confidence REAL NOT NULL
+                )
+            """)
+
+    def cached(self, key):
+        """Cached rotation for a page hash, or None"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT rotate FROM orientations WHERE page_hash = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def detect(self, image):
+        """Rotation for a page image, 0 unless OSD is confident"""
+        rotate, confidence = self.recognizer.detect_orientation(image, timeout=self.timeout)
+        return (rotate if confidence >= self.min_confidence else 0), confidence
+
+    def rotation(self, pdf_bytes, page_number):
+        """Clockwise degrees to turn a page before OCR"""
+        key = page_hash(pdf_bytes, page_number)
+        rotate = self.cached(key)
+        if rotate is not None:
+            return rotate
+
+        try:
+            thumbnail = self.rasterizer.render(pdf_bytes, page_number, dpi=self.dpi, timeout=self.timeout)
+            if thumbnail is None:
+                return 0
+            rotate, confidence = self.detect(thumbnail)
+        except OCRTimeoutError as e:
+            # Not cached, so a later attempt with more headroom can still try
+            print(f"⚠️ Page {page_number} orientation: {e}")
+            return 0
+
+        with self._lock, self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO orientations VALUES (?, ?, ?)", (key, rotate, confidence))
+        return rotate
+
+
+def upright(image, rotate):
+    """Turn a page image clockwise by ``rotate`` degrees"""
+    # PIL rotates counter-clockwise
+    return image.rotate(-rotate, expand=True) if rotate else image
+
+
+class OCREngine:
+    """A rasterizer plus a recognizer; OCRProcessor only talks to this.
+
+    Any object with ``page_count(pdf_bytes)`` and
+    ``page_text(pdf_bytes, page_number)`` can stand in for an engine.
+    """
+
+    name = "ocr"
+
+    def __init__(self, rasterizer, recognizer, name=None, timeout=OCR_PAGE_TIMEOUT,
+                 fallback_dpis=OCR_FALLBACK_DPIS, orientation=None, layout=None):
+        self.rasterizer = rasterizer
+        self.recognizer = recognizer
+        self.orientation = orientation
+        self.layout = layout
+        self.name = name or self.name
+        self.timeout = timeout
+        self.fallback_dpis = list(fallback_dpis)
+
+    def page_count(self, pdf_bytes):
+        return self.rasterizer.page_count(pdf_bytes)
+
+    def page_text(self, pdf_bytes, page_number):
+        """Render and read one page, retrying at lower DPI if it runs out of time"""
+        rotate = self.orientation.rotation(pdf_bytes, page_number) if self.orientation else 0
+        if rotate:
+            print(f"↻ Page {page_number}: rotating {rotate}° before OCR")
+        template_id, regions = self._regions(pdf_bytes, page_number, rotate)
+        for dpi in [self.rasterizer.dpi] + self.fallback_dpis:
+            try:
+                image = self.rasterizer.render(pdf_bytes, page_number, dpi=dpi, timeout=self.timeout)
+                if image is None:
+                    return ""
+                image = upright(image, rotate)
+                if regions:
+                    text = "\n\n".join(self.recognizer.recognize(crop, timeout=self.timeout)
+                                        for crop in crop_regions(image, regions))
+                    if any(is_results_line(line) for line in text.splitlines()):
+                        return text
+                    print(f"⚠️ Page {page_number}: no results in the detected regions, reading the whole page")
+                    if template_id is not None:
+                        self.layout.forget(template_id)
+                    regions = None
+                return self.recognizer.recognize(image, timeout=self.timeout)
+            except OCRTimeoutError as e:
+                print(f"⚠️ Page {page_number} at {dpi} DPI: {e}")
+                error = e
+        raise OCRTimeoutError(f"Page {page_number} could not be read within {self.timeout}s "
+                              f"at any resolution ({error})")
+
+    def _regions(self, pdf_bytes, page_number, rotate):
+        """(template id, regions) from the layout pass, (None, None) to read the page whole"""
+        if not self.layout:
+            return None, None
+        try:
+            return self.layout.regions(pdf_bytes, page_number, orient=lambda image: upright(image, rotate))
+        except OCRTimeoutError as e:
+            print(f"⚠️ Page {page_number} layout: {e}")
+            return None, None
+
+
+def tesseract_engine(tesseract_cmd=TESSERACT_CMD, poppler_path=POPPLER_PATH,
+                     detect_orientation=OCR_DETECT_ORIENTATION, detect_layout=OCR_DETECT_LAYOUT):
+    """The default engine: Poppler at OCR_DPI, then Tesseract (after the OSD and layout passes)"""
+    rasterizer = PopplerRasterizer(poppler_path)
+    recognizer = TesseractRecognizer(tesseract_cmd)
+    orientation = OrientationDetector(rasterizer, recognizer) if detect_orientation else None
+    layout = LayoutAnalyzer(rasterizer, recognizer) if detect_layout else None
+    return OCREngine(rasterizer, recognizer, name="tesseract", orientation=orientation, layout=layout)
+
+
+class ReplayEngine:
+    """Serves recorded page texts instead of running OCR.
+
+    Recordings live in ``recordings_dir`` as ``<page_hash>.txt`` plus a
+    ``manifest.json`` of page counts per PDF. PDFs that were never
+    recorded get ``fallback_file`` (e.g. debug_ocr_output.txt, pages split
+    on form feeds) if one is set, so parsing, storage and UI throughput
+    can be measured deterministically without Tesseract or Poppler.
+    """
+
+    name = "replay"
+
+    def __init__(self, recordings_dir=OCR_RECORDINGS_DIR, fallback_file=OCR_REPLAY_FALLBACK):
+        self.recordings_dir = recordings_dir
+        os.makedirs(recordings_dir, exist_ok=True)
+        self.fallback_pages = None
+        if fallback_file:
+            with open(fallback_file, "r", encoding="utf-8") as f:
+                self.fallback_pages = f.read().split("\f")
+
+    @property
+    def _manifest_path(self):
+        return os.path.join(self.recordings_dir, "manifest.json")
+
+    def _manifest(self):
+        try:
+            with open(self._manifest_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _missing(self):
+        return KeyError("No OCR recording for this PDF (set OCR_REPLAY_FALLBACK or record it first)")
+
+    def page_count(self, pdf_bytes):
+        count = self._manifest().get(hashlib.sha256(pdf_bytes).hexdigest())
+        if count is not None:
+            return count
+        if self.fallback_pages is not None:
+            return len(self.fallback_pages)
+        raise self._missing()
+
+    def page_text(self, pdf_bytes, page_number):
+        path = os.path.join(self.recordings_dir, page_hash(pdf_bytes, page_number) + ".txt")
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read()
+        if self.fallback_pages is not None and page_number <= len(self.fallback_pages):
+            return self.fallback_pages[page_number - 1]
+        raise self._missing()
+
+    def record(self, pdf_bytes, page_number, text, page_count=None):
+        """Store one page's text (and the PDF's page count)"""
+        with open(os.path.join(self.recordings_dir, page_hash(pdf_bytes, page_number) + ".txt"),
+                  "w", encoding="utf-8") as f:
+            f.write(text)
+        if page_count is not None:
+            manifest = self._manifest()
+            manifest[hashlib.sha256(pdf_bytes).hexdigest()] = page_count
+            tmp_path = self._manifest_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(manifest, f)
+            os.replace(tmp_path, self._manifest_path)
+
+
+class RecordingEngine:
+    """Runs a live engine and records every page for later replay"""
+
+    name = "record"
+
+    def __init__(self, engine, replay):
+        self.engine = engine
+        self.replay = replay
+
+    def page_count(self, pdf_bytes):
+        return self.engine.page_count(pdf_bytes)
+
+    def page_text(self, pdf_bytes, page_number):
+        text = self.engine.page_text(pdf_bytes, page_number)
+        self.replay.record(pdf_bytes, page_number, text, self.engine.page_count(pdf_bytes))
+        return text
+
+
+def create_engine(name=OCR_ENGINE):
+    """Build the engine named in config ("tesseract", "replay" or "record")"""
+    if name == "tesseract":
+        return tesseract_engine()
+    if name == "replay":
+        return ReplayEngine()
+    if name == "record":
+        return RecordingEngine(tesseract_engine(), ReplayEngine(fallback_file=None))
+    raise ValueError(f"Unknown OCR engine: {name}")
@@ -0,0 +1,271 @@
+import json
+import re
+import statistics
+import threading
+from PIL import Image, ImageOps
+from config import (PARAMETER_KEYWORDS, NORMAL_RANGES, OCR_LAYOUT_DB, OCR_LAYOUT_DPI, OCR_PAGE_TIMEOUT,
+                    OCR_LAYOUT_MAX_COVERAGE, OCR_LAYOUT_MATCH_BITS, REPORT_TYPE_KEYWORDS, PATIENT_PATTERNS,
+                    BLOOD_PRESSURE_PATTERN)
+from database import connect
+
+# A results line names a parameter and carries a number
+PARAMETER_RE = re.compile(
+    r"\b(?:" + "|".join(sorted({keyword for keywords in PARAMETER_KEYWORDS.values() for keyword in keywords}
+                               | {re.escape(name.lower()) for name in NORMAL_RANGES}, key=len, reverse=True))
+    + r")", re.IGNORECASE)
+NUMBER_RE = re.compile(r"\d")
+# Anything OCRProcessor's parser matches, matched the way it does (substrings, no word
+# boundaries): a line it would read must survive cropping or the parsed report changes
+PARSED_RE = re.compile("|".join(
+    [keyword for keywords in PARAMETER_KEYWORDS.values() for keyword in keywords]
+    + [re.escape(keyword) for _, keywords in REPORT_TYPE_KEYWORDS for keyword in keywords]
+    + [pattern for patterns in PATIENT_PATTERNS.values() for pattern in patterns]
+    + [BLOOD_PRESSURE_PATTERN]), re.IGNORECASE)
+# Narrative reports are read whole (findings and impressions are free text)
+PROSE_RE = re.compile(r"\b(?:ultrasound|sonography|usg|echotexture|impression|findings)\b", re.IGNORECASE)
+
+LETTERHEAD_FRACTION = 0.15  # top of the page hashed to recognise a lab's layout
+HASH_SIZE = (33, 16)  # difference hash over this grid: 32 x 16 = 512 bits
+INK_GRID = (20, 100)  # columns x rows of the coarse ink map kept with each template
+TEMPLATES_PER_LETTERHEAD = 8  # layouts kept per lab (one per panel, say)
+
+
+def is_results_line(text):
+    return bool(PARAMETER_RE.search(text) and NUMBER_RE.search(text))
+
+
+def letterhead_signature(image):
+    """Difference hash of the page's top strip, or None if it is blank"""
+    gray = image.convert("L")
+    strip = gray.crop((0, 0, gray.width, max(1, int(gray.height * LETTERHEAD_FRACTION))))
+    # Hash only the inked part so margins and scan offsets don't count
+    box = ImageOps.invert(strip).point(lambda p: 255 if p > 64 else 0).getbbox()
+    if box is None:
+        return None  # no letterhead to tell labs apart
+    pixels = strip.crop(box).resize(HASH_SIZE).tobytes()
+    width = HASH_SIZE[0]
+    bits = "".join("1" if pixels[row * width + col] > pixels[row * width + col + 1] else "0"
+                   for row in range(HASH_SIZE[1]) for col in range(width - 1))
+    return f"{int(bits, 2):0128x}"
+
+
+def signature_distance(a, b):
+    """Differing bits between two signatures (as ints)"""
+    return bin(a ^ b).count("1")
+
+
+def ink_map(image):
+    """Which cells of a coarse INK_GRID over the page hold any ink, as a '0'/'1' string"""
+    ink = ImageOps.invert(image.convert("L")).point(lambda p: 255 if p > 96 else 0)
+    return "".join("1" if cell > 4 else "0" for cell in ink.resize(INK_GRID, Image.BOX).tobytes())
+
+
+def fits_template(ink, template_ink, regions):
+    """True if the page has no ink outside the template's regions that its own page lacked.
+
+    A longer table, a moved block or another panel puts ink where the
+    template had none and its crops don't reach, so the template would
+    silently cut values off. The template's ink is grown by one cell to
+    absorb small scan offsets.
+    """
+    cols, rows = INK_GRID
+    for index, cell in enumerate(ink):
+        if cell != "1":
+            continue
+        row, col = divmod(index, cols)
+        if any(template_ink[r * cols + c] == "1"
+               for r in range(max(row - 1, 0), min(row + 2, rows))
+               for c in range(max(col - 1, 0), min(col + 2, cols))):
+            continue
+        x, y = (col + 0.5) / cols, (row + 0.5) / rows
+        if not any(left <= x <= right and top <= y <= bottom for left, top, right, bottom in regions):
+            return False
+    return True
+
+
+def find_regions(lines, image, max_coverage=OCR_LAYOUT_MAX_COVERAGE):
+    """Boxes around every line the parser reads, as page fractions (left, top, right, bottom).
+
+    A line is kept if the parser would match anything on it, along with
+    the lines either side because its patterns run across line breaks.
+    Kept lines are clustered top to bottom, padded by a line height and
+    then grown to the nearest blank row of the horizontal projection
+    profile, so a line the low-DPI pass only half saw isn't cut through.
+    None means the page should be read whole.
+    """
+    if not lines or PROSE_RE.search(" ".join(line[0] for line in lines)):
+        return None
+    if not any(is_results_line(line[0]) for line in lines):
+        return None
+    lines = sorted(lines, key=lambda line: line[2])
+    read = {index for index, line in enumerate(lines) if PARSED_RE.search(line[0])}
+    kept = [line for index, line in enumerate(lines) if read & {index - 1, index, index + 1}]
+
+    line_height = statistics.median(bottom - top for _, _, top, _, bottom in kept)
+    clusters = []
+    for _, left, top, right, bottom in kept:
+        if clusters and top - clusters[-1][3] <= 3 * line_height:
+            cluster = clusters[-1]
+            clusters[-1] = [min(cluster[0], left), cluster[1], max(cluster[2], right), max(cluster[3], bottom)]
+        else:
+            clusters.append([left, top, right, bottom])
+
+    gray = image.convert("L")
+    width, height = gray.size
+    pixels = gray.load()
+    step = max(1, width // 400)
+
+    def blank(row):
+        return all(pixels[x, row] > 160 for x in range(0, width, step))
+
+    regions = []
+    for left, top, right, bottom in clusters:
+        pad = int(line_height)
+        left, right = max(0, left - 2 * pad), min(width, right + 2 * pad)
+        top, bottom = max(0, top - pad), min(height - 1, bottom + pad)
+        for _ in range(pad):
+            if top == 0 or blank(top):
+                break
+            top -= 1
+        for _ in range(pad):
+            if bottom == height - 1 or blank(bottom):
+                break
+            bottom += 1
+        regions.append((left / width, top / height, right / width, (bottom + 1) / height))
+
+    coverage = sum((right - left) * (bottom - top) for left, top, right, bottom in regions)
+    return regions if coverage <= max_coverage else None
+
+
+def crop_regions(image, regions):
+    """Cut page-fraction regions out of a full-resolution render"""
+    width, height = image.size
+    return [image.crop((round(left * width), round(top * height), round(right * width), round(bottom * height)))
+            for left, top, right, bottom in regions]
+
+
+class LayoutAnalyzer:
+    """Finds which parts of a page are worth reading at full resolution.
+
+    A low-DPI pass locates the lines the parser reads (patient header,
+    results table); letterheads, addresses, barcodes and disclaimers
+    around them are never read at OCR_DPI. The regions found are stored as a template under a hash of the
+    page's letterhead, with a coarse map of where the page had ink. Later
+    pages from the same lab reuse a template only if they have no ink
+    outside its regions that its own page lacked; otherwise they are
+    analyzed and add a template of their own. A template whose crops yield
+    no results is dropped and the page is read whole.
+    """
+
+    def __init__(self, rasterizer, recognizer, db_path=OCR_LAYOUT_DB, dpi=OCR_LAYOUT_DPI,
+                 timeout=OCR_PAGE_TIMEOUT, match_bits=OCR_LAYOUT_MATCH_BITS):
+        self.rasterizer = rasterizer
+        self.recognizer = recognizer
+        self.db_path = db_path
+        self.dpi = dpi
+        self.timeout = timeout
+        self.match_bits = match_bits
+        self._lock = threading.Lock()
+        self._templates = []  # [id, signature as int, regions, ink, hits] decoded from the table
+        self._version = None  # (row count, max id) of the table when _templates was read
+        self._ensure_schema()
+
+    def _connect(self):
+        return connect(self.db_path)
+
+    def _ensure_schema(self):
+        """Create the template table if it doesn't exist"""
+        with self._connect() as conn:
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(layout_templates)")]
+            if columns and "ink" not in columns:
+                # Templates from before ink maps can't be checked; they are only a cache
+                conn.execute("DROP TABLE layout_templates")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS layout_templates (
+                    id INTEGER PRIMARY KEY,
+                    signature TEXT NOT NULL,
+                    regions TEXT NOT NULL,
+                    ink TEXT NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS idx_layout_templates_signature
+                    ON layout_templates (signature);
+            """)
+
+    def templates(self):
+        """Stored templates, decoded once and re-read only after a page (of any process) adds or drops one"""
+        with self._lock, self._connect() as conn:
+            version = conn.execute("SELECT COUNT(*), MAX(id) FROM layout_templates").fetchone()
+            if version != self._version:
+                rows = conn.execute("SELECT id, signature, regions, ink, hits FROM layout_templates").fetchall()
+                self._templates = [[template_id, int(stored, 16), [tuple(region) for region in json.loads(regions)],
+                                    template_ink, hits]
+                                   for template_id, stored, regions, template_ink, hits in rows]
+                self._version = version
+            return self._templates
+
+    def template(self, signature, ink):
+        """(template id, regions) of the closest stored template this page fits, or None"""
+        if signature is None:
+            return None
+        signature = int(signature, 16)
+        candidates = sorted(self.templates(),
+                            key=lambda entry: (signature_distance(signature, entry[1]), -entry[4], entry[0]))
+        for entry in candidates:
+            template_id, stored, regions, template_ink, _ = entry
+            if signature_distance(signature, stored) > self.match_bits:
+                break
+            if fits_template(ink, template_ink, regions):
+                with self._lock, self._connect() as conn:
+                    found = conn.execute("UPDATE layout_templates SET hits = hits + 1 WHERE id = ?",
+                                         (template_id,)).rowcount
+                    if not found:
+                        # Dropped by another process since it was read
+                        self._version = None
+                        continue
+                    entry[4] += 1
+                return template_id, regions
+        return None
+
+    def remember(self, signature, regions, ink):
+        """Store a page's layout, keeping the most used few per letterhead"""
+        with self._lock, self._connect() as conn:
+            cursor = conn.execute("INSERT INTO layout_templates (signature, regions, ink) VALUES (?, ?, ?)",
+                                  (signature, json.dumps(regions), ink))
+            conn.execute("""
+                DELETE FROM layout_templates WHERE signature = ? AND id NOT IN (
+                    SELECT id FROM layout_templates WHERE signature = ? ORDER BY hits DESC, id DESC LIMIT ?
+                )
+            """, (signature, signature, TEMPLATES_PER_LETTERHEAD))
+            return cursor.lastrowid
+
+    def forget(self, template_id):
+        """Drop a template that no longer fits its lab's pages"""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM layout_templates WHERE id = ?", (template_id,))
+
+    def analyze(self, image):
+        """Regions of an upright page image (any DPI), or None to read it whole"""
+        return find_regions(self.recognizer.lines(image, timeout=self.timeout), image)
+
+    def regions(self, pdf_bytes, page_number, orient=None):
+        """(template id, regions) for a page; regions is None to read it whole.
+
+        orient(image) turns the low-DPI render upright first.
+        """
+        image = self.rasterizer.render(pdf_bytes, page_number, dpi=self.dpi, timeout=self.timeout)
+        if image is None:
+            return None, None
+        if orient:
+            image = orient(image)
+
+        signature = letterhead_signature(image)
+        ink = ink_map(image)
+        template = self.template(signature, ink)
+        if template:
+            return template
+
+        regions = self.analyze(image)
+        if regions and signature is not None:
+            return self.remember(signature, regions, ink), regions
+        return None, regions
@@ -1,103 +1,88 @@
-import pytesseract
-from pdf2image import convert_from_bytes
-from PIL import Image
 import re
 from datetime import datetime
 import os
-from config import EXCEL_COLUMNS, TEST_PARAMETERS
+from config import (EXCEL_COLUMNS, TEST_PARAMETERS, PARAMETER_KEYWORDS, REPORT_TYPE_KEYWORDS, PATIENT_PATTERNS,
+                    BLOOD_PRESSURE_PATTERN)
+from derived_values import derive_report
+from ocr_engines import create_engine
+from ocr_scheduler import OCRScheduler, PRIORITY_INTERACTIVE
 
 class OCRProcessor:
-    def __init__(self):
-        """Local Machine Configuration - Add your paths below"""
-        print("Environment:", os.name)
-        
-        # ===========================================
-        # ADD YOUR TESSERACT PATH HERE
-        tesseract_path = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
-        # ===========================================
-        
-        if os.path.exists(tesseract_path):
-            pytesseract.pytesseract.tesseract_cmd = tesseract_path
-            print(f"✓ Tesseract configured: {tesseract_path}")
-        else:
-            print(f"⚠️ Tesseract not found at: {tesseract_path}")
-            print("Please update tesseract_path variable with correct path")
+    def __init__(self, engine=None, scheduler=None):
+        """Parse reports from text produced by an OCR engine (Tesseract by default)
         
-        # ===========================================
-        # ADD YOUR POPPLER PATH HERE
-        # ===========================================
-        poppler_path = r"C:\poppler-25.12.0\Library\bin"
-        if os.path.exists(poppler_path):
-            self.poppler_path = poppler_path
-            print(f"✓ Poppler configured: {poppler_path}")
-        else:
-            print(f"⚠️ Poppler not found at: {poppler_path}")
-            print("Please update poppler_path variable with correct path")
-            self.poppler_path = None
+        Pages are OCRed on a shared scheduler: interactive work before
+        batch work, round-robin across users.
+        """
+        print("Environment:", os.name)
+        self.engine = engine or create_engine()
+        self.scheduler = scheduler or OCRScheduler()
+        print(f"OCR engine: {self.engine.name}")
+    
+    def get_page_count(self, pdf_bytes):
+        """Number of pages in a PDF (no rasterization)"""
+        return self.engine.page_count(pdf_bytes)
+    
+    def extract_page_text(self, pdf_bytes, page_number=1, user=None, priority=PRIORITY_INTERACTIVE):
+        """OCR a single page, e.g. a cheap first-page pass before the full run"""
+        try:
+            return self.scheduler.submit(self.engine.page_text, pdf_bytes, page_number,
+                                         user=user, priority=priority).result()
+        except Exception as e:
+            raise Exception(f"Error processing PDF: {str(e)}")
     
-    def extract_text_from_pdf(self, pdf_bytes):
-        """Convert PDF to images and extract text using OCR"""
+    def iter_page_texts(self, pdf_bytes, start_page=1, user=None, priority=PRIORITY_INTERACTIVE):
+        """OCR pages on the scheduler, yielding (page, total_pages, text) in page order"""
+        total_pages = self.get_page_count(pdf_bytes)
+        futures = [
+            self.scheduler.submit(self.engine.page_text, pdf_bytes, page_number, user=user, priority=priority)
+            for page_number in range(start_page, total_pages + 1)
+        ]
         try:
-            if self.poppler_path:
-                images = convert_from_bytes(
-                    pdf_bytes,
-                    poppler_path=self.poppler_path,
-                    dpi=300
-                )
-            else:
-                images = convert_from_bytes(
-                    pdf_bytes,
-                    dpi=300
-                )
+            for page_number, future in enumerate(futures, start_page):
+                yield page_number, total_pages, future.result()
+        finally:
+            # Drop queued pages if the caller stops early
+            for future in futures:
+                future.cancel()
+    
+    def extract_text_from_pdf(self, pdf_bytes, first_page_text=None, progress_callback=None,
+                              user=None, priority=PRIORITY_INTERACTIVE):
+        """Convert PDF to images and extract text using OCR
+        
+        Pass first_page_text when page 1 was already OCRed to skip it;
+        progress_callback(page, total_pages) is called after each page.
+        """
+        try:
+            start_page = 1 if first_page_text is None else 2
             
-            text = ""
-            for i, img in enumerate(images):
-                print(f"Processing page {i+1}/{len(images)}...")
-                
-                page_text = pytesseract.image_to_string(
-                    img,
-                    lang="eng",
-                    config="--psm 6 --oem 3"
-                )
+            text = "" if first_page_text is None else first_page_text + "\n\n"
+            for i, total_pages, page_text in self.iter_page_texts(pdf_bytes, start_page, user, priority):
+                print(f"Processing page {i}/{total_pages}...")
                 
                 text += page_text + "\n\n"
+                if progress_callback:
+                    progress_callback(i, total_pages)
             
             return text
         
         except Exception as e:
             raise Exception(f"Error processing PDF: {str(e)}")
     
+    def preview_report(self, first_page_text):
+        """Patient details and report type from page 1, before the full OCR"""
+        preview = self.extract_patient_info(first_page_text)
+        preview["Report Type"] = self.detect_report_type(first_page_text)
+        return preview
+    
     def detect_report_type(self, text):
         """Automatically detect the type of medical report"""
         text_lower = text.lower()
         
-        # Check for Ultrasound
-        if any(keyword in text_lower for keyword in 
-               ['ultrasound', 'sonography', 'usg', 'echotexture', 'mm']):
-            return "Ultrasound Report"
-        
-        # Check for Liver Function Test
-        elif any(keyword in text_lower for keyword in 
-                 ['liver function', 'lft', 'sgot', 'sgpt', 'bilirubin']):
-            return "Liver Function Test (LFT)"
-        
-        # Check for Complete Blood Picture
-        elif any(keyword in text_lower for keyword in 
-                 ['complete blood', 'cbc', 'cbp', 'hemoglobin', 'wbc', 'rbc']):
-            return "Complete Blood Picture (CBP)"
-        
-        # Check for Thyroid Test
-        elif any(keyword in text_lower for keyword in 
-                 ['thyroid', 'tsh', 't3', 't4']):
-            return "Thyroid Test"
-        
-        # Check for Vitals
-        elif any(keyword in text_lower for keyword in 
-                 ['blood pressure', 'heart rate', 'temperature', 'vitals']):
-            return "Vitals Check"
-        
-        else:
-            return "Blood Test"
+        for report_type, keywords in REPORT_TYPE_KEYWORDS:
+            if any(keyword in text_lower for keyword in keywords):
+                return report_type
+        return "Blood Test"
     
     def extract_patient_info(self, text):
         """Extract patient information from report"""
@@ -107,44 +92,14 @@ class OCRProcessor:
             "Patient Gender": None
         }
         
-        # Extract Patient Name
-        name_patterns = [
-            r"Patient Name[:\s]*([A-Za-z\s]+)",
-            r"Name[:\s]*([A-Za-z\s]+)",
-            r"Patient[:\s]*([A-Za-z\s]+)"
-        ]
-        
-        for pattern in name_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                patient_info["Patient Name"] = match.group(1).strip()
-                break
-        
-        # Extract Age
-        age_patterns = [
-            r"Age[:\s]*([0-9]+[YMD\s]*)",
-            r"Y[:\s]*([0-9]+[YMD\s]*)",
-            r"(\d+)[\s]*(?:years|yrs|year|Y)"
-        ]
-        
-        for pattern in age_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                patient_info["Patient Age"] = match.group(1).strip()
-                break
-        
-        # Extract Gender
-        gender_patterns = [
-            r"Gender[:\s]*([A-Za-z]+)",
-            r"Sex[:\s]*([A-Za-z]+)",
-            r"Male|Female"
-        ]
-        
-        for pattern in gender_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                patient_info["Patient Gender"] = match.group(0).strip()
-                break
+        for field, patterns in PATIENT_PATTERNS.items():
+            for pattern in patterns:
+                match = re.search(pattern, text, re.IGNORECASE)
+                if match:
+                    # Gender patterns without a group ("Male|Female") use the whole match
+                    value = match.group(0) if field == "Patient Gender" else match.group(1)
+                    patient_info[field] = value.strip()
+                    break
         
         return patient_info
     
@@ -235,64 +190,27 @@ class OCRProcessor:
             data.update(ultrasound_data)
             return data
         
-        # Regular medical test parameters
-        keyword_map = {
-            "Total Bilirubin": ["total bilirubin", "bilirubin.*total"],
-            "Conjugated Bilirubin": ["direct bilirubin", "conjugated bilirubin"],
-            "Unconjugated Bilirubin": ["indirect bilirubin", "unconjugated bilirubin"],
-            "SGOT (AST)": ["sgot", "ast"],
-            "SGPT (ALT)": ["sgpt", "alt"],
-            "Alkaline Phosphatase": ["alkaline phosphatase", "alp"],
-            "Total Protein": ["total protein"],
-            "Albumin": ["albumin"],
-            "Globulin": ["globulin"],
-            "A/G Ratio": ["a/g ratio", "ag ratio"],
-            "Hemoglobin": ["hemoglobin", "hb"],
-            "RBC": ["rbc"],
-            "WBC": ["wbc"],
-            "Platelets": ["platelet"],
-            "PCV/HCT": ["pcv", "hct", "hematocrit"],
-            "MCV": ["mcv"],
-            "MCH": ["mch"],
-            "MCHC": ["mchc"],
-            "RDW-CV": ["rdw"],
-            "MPV": ["mpv"],
-            "Neutrophils": ["neutrophils"],
-            "Lymphocytes": ["lymphocytes"],
-            "Monocytes": ["monocytes"],
-            "Eosinophils": ["eosinophils"],
-            "Glucose": ["glucose", "blood sugar"],
-            "Cholesterol": ["cholesterol"],
-            "T3 (Triiodothyronine)": ["t3", "triiodothyronine"],
-            "T4 (Thyroxine)": ["t4", "thyroxine"],
-            "TSH": ["tsh", "thyroid stimulating"]
-        }
-        
         # Extract values for all parameters
-        for param_name, keywords in keyword_map.items():
+        for param_name, keywords in PARAMETER_KEYWORDS.items():
             value = self.extract_value_with_keywords(text, keywords)
             if value is not None:
                 data[param_name] = value
         
         # Extract blood pressure
-        bp = re.findall(r"(\d{2,3})/(\d{2,3})", text)
+        bp = re.findall(BLOOD_PRESSURE_PATTERN, text)
         if bp:
             data["Blood Pressure Systolic"] = float(bp[0][0])
             data["Blood Pressure Diastolic"] = float(bp[0][1])
         
-        # Calculate derived values
-        if data["Albumin"] and data["Total Protein"]:
-            if not data["Globulin"]:
-                data["Globulin"] = round(data["Total Protein"] - data["Albumin"], 2)
-            
-            if data["Globulin"] and not data["A/G Ratio"] and data["Globulin"] > 0:
-                data["A/G Ratio"] = round(data["Albumin"] / data["Globulin"], 2)
+        # Calculate derived values (Globulin, A/G Ratio, ...) the report didn't print
+        derive_report(data)
         
         return data
     
-    def process_pdf_report(self, pdf_bytes):
+    def process_pdf_report(self, pdf_bytes, first_page_text=None, progress_callback=None,
+                           user=None, priority=PRIORITY_INTERACTIVE):
         """Main method to process PDF and return structured data"""
-        text = self.extract_text_from_pdf(pdf_bytes)
+        text = self.extract_text_from_pdf(pdf_bytes, first_page_text, progress_callback, user, priority)
         parsed_data = self.parse_medical_report(text)
         return parsed_data, text
     
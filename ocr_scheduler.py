@@ -0,0 +1,167 @@
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from config import OCR_QUEUE_DB, OCR_WORKERS
+from database import connect
+
+PRIORITY_INTERACTIVE = 0  # uploads a user is watching
+PRIORITY_BATCH = 1        # backfills and programmatic ingestion
+
+POLL_INTERVAL = 0.05  # seconds between claim attempts while other processes hold the slots
+HEARTBEAT_INTERVAL = 2.0  # seconds between liveness updates of a process's tickets
+STALE_AFTER = 30.0  # tickets of a process silent for this long are dropped (it died)
+
+
+class OCRScheduler:
+    """Runs page-sized OCR tasks in priority order across every process.
+
+    Each submitted page becomes a ticket in a SQLite queue shared by all
+    schedulers on the same ``db_path`` (the Streamlit app and each ingest
+    pool process). At most ``slots`` tickets run at once across all of
+    them. Waiting tickets are ordered by priority (interactive before
+    batch), then round-robin across users (the user served longest ago
+    goes first), then by age. So an interactive upload overtakes queued
+    batch pages, and one user's hundred-page backfill can't starve
+    another user's single upload.
+
+    A process runs one of its own tickets only when fewer tickets rank
+    ahead of it than there are free slots, which keeps slots free for
+    better-ranked tickets of other processes. Tesseract runs as a
+    subprocess, so ``workers`` threads are enough to keep that many of
+    this process's pages in flight.
+    """
+
+    def __init__(self, workers=OCR_WORKERS, db_path=OCR_QUEUE_DB, slots=OCR_WORKERS):
+        self.workers = workers
+        self.db_path = db_path
+        self.slots = slots
+        self.owner = uuid.uuid4().hex
+        self._tasks = {}  # ticket id -> (future, fn, args), not yet claimed
+        self._condition = threading.Condition()
+        self._threads = []
+        self._ensure_schema()
+
+    def _connect(self):
+        return connect(self.db_path)
+
+    def _ensure_schema(self):
+        """Create tables if they don't exist"""
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS tickets (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    owner TEXT NOT NULL,
+                    priority INTEGER NOT NULL,
+                    user TEXT NOT NULL,
+                    running INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE TABLE IF NOT EXISTS owners (
+                    owner TEXT PRIMARY KEY,
+                    heartbeat REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS served (
+                    user TEXT PRIMARY KEY,
+                    turn INTEGER NOT NULL
+                );
+            """)
+
+    def _start(self):
+        if self._threads:
+            return
+        self._threads = [threading.Thread(target=self._run, name=f"ocr-{i}", daemon=True)
+                         for i in range(self.workers)]
+        self._threads.append(threading.Thread(target=self._heartbeat, name="ocr-heartbeat", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, fn, *args, user=None, priority=PRIORITY_INTERACTIVE):
+        """Queue fn(*args) and return a Future for its result"""
+        future = Future()
+        with self._condition:
+            self._start()
+            with self._connect() as conn:
+                conn.execute("INSERT OR REPLACE INTO owners VALUES (?, ?)", (self.owner, time.time()))
+                ticket = conn.execute("INSERT INTO tickets (owner, priority, user) VALUES (?, ?, ?)",
+                                      (self.owner, priority, user or "")).lastrowid
+            self._tasks[ticket] = (future, fn, args)
+            self._condition.notify()
+        future.add_done_callback(lambda f: self._cancelled(ticket) if f.cancelled() else None)
+        return future
+
+    def _cancelled(self, ticket):
+        with self._condition:
+            if self._tasks.pop(ticket, None) is not None:
+                self._finish(ticket)
+
+    def pending(self):
+        """Queued ticket counts per (priority, user) across all processes"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT priority, user, COUNT(*) FROM tickets WHERE running = 0 GROUP BY priority, user"
+            ).fetchall()
+        return {(priority, user or None): count for priority, user, count in rows}
+
+    def _claim(self):
+        """Mark the best of this process's tickets running if it may run now, else None"""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            stale = [owner for owner, in conn.execute("SELECT owner FROM owners WHERE heartbeat < ?",
+                                                      (time.time() - STALE_AFTER,))]
+            for owner in stale:
+                conn.execute("DELETE FROM tickets WHERE owner = ?", (owner,))
+                conn.execute("DELETE FROM owners WHERE owner = ?", (owner,))
+
+            free = self.slots - conn.execute("SELECT COUNT(*) FROM tickets WHERE running = 1").fetchone()[0]
+            if free <= 0:
+                return None
+            ahead = conn.execute("""
+                SELECT t.id, t.owner, t.user FROM tickets t LEFT JOIN served s ON s.user = t.user
+                WHERE t.running = 0
+                ORDER BY t.priority, COALESCE(s.turn, 0), t.id
+                LIMIT ?
+            """, (free,)).fetchall()
+            for ticket, owner, user in ahead:
+                if owner == self.owner and ticket in self._tasks:
+                    conn.execute("UPDATE tickets SET running = 1 WHERE id = ?", (ticket,))
+                    conn.execute("INSERT OR REPLACE INTO served VALUES (?, (SELECT COALESCE(MAX(turn), 0) + 1 "
+                                 "FROM served))", (user,))
+                    return ticket
+        return None
+
+    def _finish(self, ticket):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM tickets WHERE id = ?", (ticket,))
+
+    def _heartbeat(self):
+        """Keep this process's tickets from being taken for a dead process's"""
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            try:
+                with self._connect() as conn:
+                    conn.execute("INSERT OR REPLACE INTO owners VALUES (?, ?)", (self.owner, time.time()))
+            except Exception as e:
+                print(f"⚠️ OCR scheduler heartbeat failed: {str(e)}")
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._tasks:
+                    self._condition.wait()
+                ticket = self._claim()
+                if ticket is None:
+                    # Slots are busy or better-ranked tickets are waiting (maybe in another process)
+                    self._condition.wait(POLL_INTERVAL)
+                    continue
+                future, fn, args = self._tasks.pop(ticket)
+
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(fn(*args))
+                    except BaseException as e:
+                        future.set_exception(e)
+            finally:
+                self._finish(ticket)
+                with self._condition:
+                    self._condition.notify_all()
@@ -0,0 +1,57 @@
+import streamlit as st
+
+# Streamlit re-executes app.py on every rerun; st.cache_resource keeps one
+# instance of each service for the whole server process. Outside a Streamlit
+# server (ingest_service.py, benchmarks) it caches in memory the same way.
+# Heavy modules are imported inside the factories, on first use.
+
+
+@st.cache_resource(show_spinner=False)
+def get_auth_manager():
+    from auth import AuthManager
+    return AuthManager()
+
+
+@st.cache_resource(show_spinner=False)
+def get_analytics_index():
+    from analytics_index import AnalyticsIndex
+    return AnalyticsIndex()
+
+
+@st.cache_resource(show_spinner=False)
+def get_trend_stats():
+    from trend_stats import TrendStats
+    return TrendStats()
+
+
+@st.cache_resource(show_spinner=False)
+def get_search_index():
+    from search_index import SearchIndex
+    return SearchIndex()
+
+
+@st.cache_resource(show_spinner=False)
+def get_data_manager(username):
+    """One DataManager per user, sharing the analytics, trend and search indexes"""
+    from data_manager import DataManager
+    return DataManager(username, analytics_index=get_analytics_index(),
+                       trend_stats=get_trend_stats(), search_index=get_search_index())
+
+
+@st.cache_resource(show_spinner=False)
+def get_ocr_processor():
+    """OCRProcessor builds the configured OCR engine once; pytesseract is imported here"""
+    from ocr_processor import OCRProcessor
+    return OCRProcessor()
+
+
+@st.cache_resource(show_spinner=False)
+def get_visualizer():
+    from visualizer import Visualizer
+    return Visualizer()
+
+
+@st.cache_resource(show_spinner=False)
+def get_near_duplicate_index():
+    from near_duplicates import NearDuplicateIndex
+    return NearDuplicateIndex()
@@ -0,0 +1,251 @@
+import re
+import threading
+from collections import defaultdict
+from datetime import date
+from config import SEARCH_INDEX_DB, SEARCH_COLUMNS
+from database import connect
+from ingest_index import report_fingerprint
+from trend_stats import report_day, report_profile
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+FIELD_GAP = 16  # positions skipped between fields so phrases don't span them
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+
+def parse_query(query):
+    """Split a query into phrases (lists of terms); a trailing * makes a prefix"""
+    clauses = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', query):
+        if phrase:
+            terms = tokenize(phrase)
+            if terms:
+                clauses.append((terms, False))
+        else:
+            prefix = word.endswith("*")
+            terms = tokenize(word)
+            if terms:
+                clauses.append((terms, prefix))
+    return clauses
+
+
+class SearchIndex:
+    """Persistent inverted index over report OCR text and free-text fields.
+
+    ``postings`` holds one row per (user, term, report) with the term's
+    positions, so term and prefix lookups are index range scans and
+    phrases are checked from positions alone. ``documents`` keeps each
+    report's profile, date and text for scoping and snippets. Rows are
+    keyed by workbook row index and shifted on delete like the other
+    indexes; OCR text is matched back by report fingerprint on reindex.
+    """
+
+    def __init__(self, db_path=SEARCH_INDEX_DB):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._ensure_schema()
+
+    def _connect(self):
+        return connect(self.db_path)
+
+    def _ensure_schema(self):
+        """Create tables and indexes if they don't exist"""
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    username TEXT NOT NULL,
+                    row_index INTEGER NOT NULL,
+                    profile TEXT NOT NULL,
+                    day INTEGER,
+                    report_type TEXT,
+                    fingerprint TEXT,
+                    ocr_text TEXT,
+                    fields_text TEXT,
+                    PRIMARY KEY (username, row_index)
+                );
+                CREATE TABLE IF NOT EXISTS postings (
+                    username TEXT NOT NULL,
+                    term TEXT NOT NULL,
+                    row_index INTEGER NOT NULL,
+                    positions TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_postings_term
+                    ON postings (username, term, row_index);
+                CREATE INDEX IF NOT EXISTS idx_postings_row
+                    ON postings (username, row_index);
+                CREATE TABLE IF NOT EXISTS indexed_users (
+                    username TEXT PRIMARY KEY
+                );
+            """)
+
+    @staticmethod
+    def _fields_text(report):
+        parts = []
+        for column in SEARCH_COLUMNS:
+            value = report.get(column)
+            if value is not None and not (isinstance(value, float) and value != value):
+                parts.append(str(value))
+        return "\n".join(parts)
+
+    @staticmethod
+    def _postings(ocr_text, fields_text):
+        """term -> positions over OCR text then each field line"""
+        positions = defaultdict(list)
+        offset = 0
+        for block in [ocr_text or ""] + (fields_text or "").split("\n"):
+            tokens = tokenize(block)
+            for i, token in enumerate(tokens):
+                positions[token].append(offset + i)
+            offset += len(tokens) + FIELD_GAP
+        return positions
+
+    def _insert(self, conn, username, row_index, report, ocr_text):
+        fields_text = self._fields_text(report)
+        report_type = report.get("Report Type")
+        conn.execute("INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (
+            username, row_index, report_profile(report), report_day(report.get("Date")),
+            str(report_type) if report_type is not None else None,
+            report_fingerprint(report), ocr_text, fields_text
+        ))
+        conn.executemany("INSERT INTO postings VALUES (?, ?, ?, ?)", [
+            (username, term, row_index, ",".join(map(str, positions)))
+            for term, positions in self._postings(ocr_text, fields_text).items()
+        ])
+
+    def _remove(self, conn, username, row_index):
+        conn.execute("DELETE FROM postings WHERE username = ? AND row_index = ?", (username, row_index))
+        conn.execute("DELETE FROM documents WHERE username = ? AND row_index = ?", (username, row_index))
+
+    def has_user(self, username):
+        """Check whether a user's rows have been indexed yet"""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT 1 FROM indexed_users WHERE username = ?", (username,)
+            ).fetchone() is not None
+
+    def add_report(self, username, row_index, report, ocr_text=None):
+        """Index one newly inserted report (and the OCR text it came from)"""
+        with self._lock, self._connect() as conn:
+            self._insert(conn, username, row_index, report, ocr_text)
+
+    def update_report(self, username, row_index, report):
+        """Re-index an edited row, keeping its OCR text"""
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT ocr_text FROM documents WHERE username = ? AND row_index = ?",
+                               (username, row_index)).fetchone()
+            self._remove(conn, username, row_index)
+            self._insert(conn, username, row_index, report, row[0] if row else None)
+
+    def delete_report(self, username, row_index):
+        """Remove one row; later rows shift up by one as in the workbook"""
+        with self._lock, self._connect() as conn:
+            self._remove(conn, username, row_index)
+            for table in ("documents", "postings"):
+                conn.execute(f"UPDATE {table} SET row_index = row_index - 1 WHERE username = ? AND row_index > ?",
+                             (username, row_index))
+
+    def reindex_user(self, username, indexed_reports):
+        """Rebuild a user's index from (row_index, report) pairs"""
+        with self._lock, self._connect() as conn:
+            ocr_texts = dict(conn.execute(
+                "SELECT fingerprint, ocr_text FROM documents WHERE username = ? AND ocr_text IS NOT NULL",
+                (username,)
+            ).fetchall())
+            conn.execute("DELETE FROM postings WHERE username = ?", (username,))
+            conn.execute("DELETE FROM documents WHERE username = ?", (username,))
+            conn.execute("INSERT OR IGNORE INTO indexed_users VALUES (?)", (username,))
+            for row_index, report in indexed_reports:
+                self._insert(conn, username, row_index, report, ocr_texts.get(report_fingerprint(report)))
+
+    def _term_postings(self, conn, username, term, prefix):
+        """row_index -> positions for a term (or every term starting with it)"""
+        if prefix:
+            rows = conn.execute(
+                "SELECT row_index, positions FROM postings WHERE username = ? AND term >= ? AND term < ?",
+                (username, term, term + "￿")
+            )
+        else:
+            rows = conn.execute(
+                "SELECT row_index, positions FROM postings WHERE username = ? AND term = ?",
+                (username, term)
+            )
+        found = defaultdict(set)
+        for row_index, positions in rows:
+            found[row_index].update(map(int, positions.split(",")))
+        return found
+
+    def _clause_rows(self, conn, username, terms, prefix):
+        """Rows matching a term, prefix or phrase, with a hit count each"""
+        postings = [self._term_postings(conn, username, term, prefix and i == len(terms) - 1)
+                    for i, term in enumerate(terms)]
+        rows = set(postings[0]).intersection(*postings[1:])
+        hits = {}
+        for row_index in rows:
+            starts = postings[0][row_index]
+            for offset, term_postings in enumerate(postings[1:], 1):
+                starts = {p for p in starts if p + offset in term_postings[row_index]}
+            if starts:
+                hits[row_index] = len(starts)
+        return hits
+
+    def search(self, username, query, profile=None, start_date=None, end_date=None, report_type=None, limit=50):
+        """Reports matching every term/"phrase"/prefix* in the query, best first"""
+        clauses = parse_query(query)
+        if not clauses:
+            return []
+
+        with self._connect() as conn:
+            scores = None
+            for terms, prefix in clauses:
+                hits = self._clause_rows(conn, username, terms, prefix)
+                scores = hits if scores is None else {
+                    row: scores[row] + hits[row] for row in scores.keys() & hits.keys()
+                }
+                if not scores:
+                    return []
+
+            filters, params = ["username = ?"], [username]
+            if profile is not None:
+                filters.append("profile = ?")
+                params.append(profile)
+            if start_date is not None:
+                filters.append("day >= ?")
+                params.append(report_day(start_date))
+            if end_date is not None:
+                filters.append("day <= ?")
+                params.append(report_day(end_date))
+            if report_type is not None:
+                filters.append("report_type = ?")
+                params.append(str(report_type))
+
+            matches = []
+            rows = sorted(scores)
+            for start in range(0, len(rows), 500):
+                chunk = rows[start:start + 500]
+                matches += conn.execute(
+                    f"SELECT row_index, profile, day, report_type, ocr_text, fields_text FROM documents "
+                    f"WHERE {' AND '.join(filters)} AND row_index IN ({','.join('?' * len(chunk))})",
+                    params + chunk
+                ).fetchall()
+
+        first_term = clauses[0][0][0]
+        results = [{
+            "row_index": row_index,
+            "profile": profile or "Unknown",
+            "date": date.fromordinal(day) if day else None,
+            "report_type": report_type,
+            "score": scores[row_index],
+            "snippet": self._snippet((fields_text or "") + "\n" + (ocr_text or ""), first_term),
+        } for row_index, profile, day, report_type, ocr_text, fields_text in matches]
+        results.sort(key=lambda result: (-result["score"], -(result["date"] or date.min).toordinal()))
+        return results[:limit]
+
+    @staticmethod
+    def _snippet(text, term, width=60):
+        match = re.search(re.escape(term), text, re.IGNORECASE)
+        if not match:
+            return " ".join(text.split())[:2 * width]
+        start = max(0, match.start() - width)
+        return ("…" if start else "") + " ".join(text[start:match.end() + width].split()) + "…"
@@ -0,0 +1,94 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+from config import SESSION_SECRET_FILE, SESSION_TOKEN_TTL
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def load_secret(path=SESSION_SECRET_FILE):
+    """Load the signing secret, creating it on first use"""
+    env_secret = os.environ.get("SESSION_SECRET")
+    if env_secret:
+        return env_secret.encode("utf-8")
+
+    if not os.path.exists(path):
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            pass  # created concurrently by another process
+        else:
+            with os.fdopen(fd, "w") as f:
+                f.write(secrets.token_hex(32))
+
+    with open(path, "r") as f:
+        return f.read().strip().encode("utf-8")
+
+
+class SessionTokenManager:
+    """Signed, expiring session tokens with a local revocation list.
+
+    A token is ``payload.signature`` where the payload carries the username,
+    expiry and a random token id, and the signature is HMAC-SHA256 over the
+    payload. Verifying one costs a hash and a primary-key lookup instead of
+    a bcrypt check.
+    """
+
+    def __init__(self, user_store, secret=None, ttl=SESSION_TOKEN_TTL):
+        self.user_store = user_store
+        self.secret = secret or load_secret()
+        self.ttl = ttl
+
+    def _sign(self, payload):
+        return _b64encode(hmac.new(self.secret, payload.encode("ascii"), hashlib.sha256).digest())
+
+    def issue(self, username):
+        """Issue a new session token for a user"""
+        claims = {"u": username, "exp": int(time.time()) + self.ttl, "jti": secrets.token_hex(8)}
+        payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+        return f"{payload}.{self._sign(payload)}"
+
+    def _claims(self, token):
+        """Decode a token whose signature is valid, or None"""
+        # Tokens arrive from cookies and headers anyone can set
+        if not isinstance(token, str) or not token.isascii():
+            return None
+        try:
+            payload, signature = token.split(".")
+        except ValueError:
+            return None
+
+        if not hmac.compare_digest(signature, self._sign(payload)):
+            return None
+        try:
+            claims = json.loads(_b64decode(payload))
+        except ValueError:
+            return None
+        return claims if isinstance(claims, dict) else None
+
+    def verify(self, token):
+        """Get the username for a valid, unexpired, unrevoked token, or None"""
+        claims = self._claims(token)
+        if not claims or claims.get("exp", 0) < time.time():
+            return None
+        if self.user_store.is_token_revoked(claims.get("jti")):
+            return None
+        if self.user_store.get_user(claims.get("u")) is None:
+            return None
+        return claims["u"]
+
+    def revoke(self, token):
+        """Revoke a token (e.g. on logout)"""
+        claims = self._claims(token)
+        if claims:
+            self.user_store.revoke_token(claims.get("jti"), claims.get("exp", 0))
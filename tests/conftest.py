@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# config creates and uses DATA_DIR at import time; keep tests off the real data/
+os.environ.setdefault("MEDICAL_OCR_DATA_DIR", tempfile.mkdtemp(prefix="medical_ocr_tests_"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,188 @@
+"""Layout cropping on the recorded pages (debug_page_*.jpg, debug_ocr_output.txt).
+
+Tesseract isn't needed: each recorded page is rebuilt at any DPI from its
+scan's letterhead strip and its recorded OCR lines, every line drawn in
+its own ink colour. The stub recognizer "reads" a line when all of its
+ink is in the image it is given, so a crop that cuts a line off loses it
+the way Tesseract would, and it counts the pixels it reads as a stand-in
+for Tesseract's time (which grows with the image area).
+"""
+import functools
+import os
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+from config import OCR_DPI, OCR_LAYOUT_DPI
+from ocr_engines import OCREngine
+from ocr_layout import LETTERHEAD_FRACTION, LayoutAnalyzer, letterhead_signature, signature_distance
+from ocr_processor import OCRProcessor
+from ocr_scheduler import OCRScheduler
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGE_INCHES = (8.27, 11.69)  # A4
+PDF = b"recorded pages"
+
+
+def recorded_pages():
+    with open(os.path.join(ROOT, "debug_ocr_output.txt"), encoding="utf-8") as f:
+        texts = [text for text in f.read().split("\n\n\n") if text.strip()]
+    return [(os.path.join(ROOT, f"debug_page_{number}.jpg"), text) for number, text in enumerate(texts, 1)]
+
+
+class RecordedPages:
+    """Rasterizer that draws the recorded pages"""
+
+    dpi = OCR_DPI
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.renders = {}  # (page, dpi) -> (image, [(text, box, ink colour, ink pixels)])
+
+    def page_count(self, pdf_bytes):
+        return len(self.pages)
+
+    def render(self, pdf_bytes, page_number, dpi=None, timeout=None):
+        return self.draw(page_number, dpi or self.dpi)[0].copy()
+
+    def draw(self, page_number, dpi):
+        if (page_number, dpi) in self.renders:
+            return self.renders[page_number, dpi]
+        scan_path, text = self.pages[page_number - 1]
+        width, height = round(PAGE_INCHES[0] * dpi), round(PAGE_INCHES[1] * dpi)
+        image = Image.new("RGB", (width, height), "white")
+        with Image.open(scan_path) as scan:
+            strip = scan.crop((0, 0, scan.width, int(scan.height * LETTERHEAD_FRACTION * 0.8)))
+            strip = strip.resize((width, int(height * LETTERHEAD_FRACTION * 0.8)))
+            # Grey, so no scan pixel has a line's ink colour
+            image.paste(strip.convert("L").convert("RGB"), (0, 0))
+
+        draw = ImageDraw.Draw(image)
+        draw.fontmode = "1"  # no anti-aliasing: every ink pixel has the line's colour
+        font = ImageFont.load_default(size=round(dpi * 0.11))
+        pitch = round(dpi * 0.16)
+        y, lines = int(height * LETTERHEAD_FRACTION), []
+        for text_line in text.splitlines():
+            if text_line.strip():
+                colour = (len(lines) + 1, 0, 60)
+                box = draw.textbbox((round(dpi * 0.5), y), text_line, font=font)
+                draw.text((round(dpi * 0.5), y), text_line, fill=colour, font=font)
+                lines.append([text_line, box, colour, 0])
+            y += pitch
+        counts = {colour: count for count, colour in image.getcolors(width * height)}
+        for line in lines:
+            line[3] = counts.get(line[2], 0)
+        image.info.update(page=page_number, dpi=dpi)
+        self.renders[page_number, dpi] = image, lines
+        return self.renders[page_number, dpi]
+
+
+class InkRecognizer:
+    """Reads the recorded lines whose ink is wholly inside an image"""
+
+    def __init__(self, rasterizer):
+        self.rasterizer = rasterizer
+        self.pixels = 0  # area of every image read, a proxy for Tesseract time
+
+    def _lines(self, image):
+        self.pixels += image.width * image.height
+        _, lines = self.rasterizer.draw(image.info["page"], image.info["dpi"])
+        counts = {colour: count for count, colour in image.getcolors(image.width * image.height)}
+        return [line for line in lines if line[3] and counts.get(line[2], 0) == line[3]]
+
+    def recognize(self, image, timeout=None):
+        return "\n".join(text for text, *_ in self._lines(image))
+
+    def lines(self, image, timeout=None):
+        return [(text, *box) for text, box, *_ in self._lines(image)]
+
+
+@functools.cache
+def recorded_rasterizer():
+    return RecordedPages(recorded_pages())
+
+
+def engine(tmp_path, layout):
+    rasterizer = recorded_rasterizer()
+    recognizer = InkRecognizer(rasterizer)
+    analyzer = LayoutAnalyzer(rasterizer, recognizer, db_path=str(tmp_path / "layouts.db")) if layout else None
+    return OCREngine(rasterizer, recognizer, layout=analyzer)
+
+
+@pytest.fixture(scope="module")
+def parser(tmp_path_factory):
+    tmp_path = tmp_path_factory.mktemp("parser")
+    return OCRProcessor(engine=engine(tmp_path, layout=False),
+                        scheduler=OCRScheduler(db_path=str(tmp_path / "ocr_queue.db")))
+
+
+def read_all(engine):
+    return [engine.page_text(PDF, page) for page in range(1, engine.page_count(PDF) + 1)]
+
+
+def test_cropped_pages_parse_like_whole_pages(tmp_path, parser):
+    whole = read_all(engine(tmp_path, layout=False))
+    cropping = engine(tmp_path, layout=True)
+    first, templated = read_all(cropping), read_all(cropping)
+
+    assert any(text != page for text, page in zip(first, whole)), "no page was cropped"
+    for texts in (first, templated):
+        for text, page in zip(texts, whole):
+            assert parser.parse_medical_report(text) == parser.parse_medical_report(page)
+        # Pages are parsed together as one report too
+        assert parser.parse_medical_report("\n\n".join(texts)) == parser.parse_medical_report("\n\n".join(whole))
+
+
+def test_cropping_reads_less_than_whole_pages(tmp_path):
+    whole, cropping = engine(tmp_path, layout=False), engine(tmp_path, layout=True)
+    read_all(whole)
+    read_all(cropping)
+    untemplated = cropping.recognizer.pixels
+    read_all(cropping)
+    templated = cropping.recognizer.pixels - untemplated
+    pages = whole.recognizer.pixels
+    print(f"\npixels read: whole pages {pages}, first sight {untemplated} ({untemplated / pages:.0%}), "
+          f"templated {templated} ({templated / pages:.0%})")
+    # A page seen for the first time also pays the low-DPI layout pass (a quarter of a page at
+    # OCR_LAYOUT_DPI), which the template saves on later pages of the same lab
+    assert (OCR_LAYOUT_DPI / OCR_DPI) ** 2 <= 0.25
+    assert templated < untemplated
+    assert templated < pages
+
+
+def test_pages_of_a_lab_share_a_template(tmp_path):
+    cropping = engine(tmp_path, layout=True)
+    read_all(cropping)
+    templates = cropping.layout.templates()
+    assert templates
+    # Reading the pages again finds a stored template for each cropped page, with no new ones
+    read_all(cropping)
+    assert [entry[0] for entry in cropping.layout.templates()] == [entry[0] for entry in templates]
+
+
+def test_templates_are_decoded_once(tmp_path, monkeypatch):
+    cropping = engine(tmp_path, layout=True)
+    read_all(cropping)
+    cropping.layout.templates()  # picks up the templates the last pages added
+    loads = []
+    monkeypatch.setattr("ocr_layout.json.loads", lambda value: loads.append(value) or [])
+    read_all(cropping)
+    assert loads == []
+
+
+def test_forgotten_template_is_not_reused(tmp_path):
+    cropping = engine(tmp_path, layout=True)
+    read_all(cropping)
+    entry = cropping.layout.templates()[0]
+    # Dropped behind this analyzer's back, as another process would
+    other = LayoutAnalyzer(cropping.rasterizer, cropping.recognizer, db_path=cropping.layout.db_path)
+    other.forget(entry[0])
+    assert entry[0] not in [stored[0] for stored in cropping.layout.templates()]
+
+
+def test_letterhead_signatures_of_recorded_scans():
+    signatures = []
+    for number in range(1, 11):
+        with Image.open(os.path.join(ROOT, f"debug_page_{number}.jpg")) as scan:
+            signatures.append(int(letterhead_signature(scan), 16))
+    # Identical scans hash identically; every page differs from itself by nothing
+    assert all(signature_distance(signature, signature) == 0 for signature in signatures)
+    assert len(set(signatures)) > 1
@@ -0,0 +1,112 @@
+"""Orientation pre-pass on recorded scans turned like phone photos.
+
+Tesseract OSD isn't needed: the stub recognizer finds the turn that makes
+a thumbnail match the upright scan, with the confidence the test sets.
+"""
+import os
+import pytest
+from PIL import Image, ImageChops
+from ocr_engines import OCREngine, OCRTimeoutError, OrientationDetector, upright
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TURNS = [0, 90, 180, 270]
+PDF = b"scanned pdf"
+
+
+@pytest.fixture(scope="module")
+def scan():
+    with Image.open(os.path.join(ROOT, "debug_page_1.jpg")) as image:
+        return image.convert("L").resize((413, 584))
+
+
+def same(a, b):
+    return a.size == b.size and ImageChops.difference(a, b).getbbox() is None
+
+
+class TurnedScan:
+    """Rasterizer serving a scan turned ``turn`` degrees counter-clockwise"""
+
+    dpi = 300
+
+    def __init__(self, scan, turn):
+        self.page = scan.rotate(turn, expand=True)
+        self.renders = []
+
+    def page_count(self, pdf_bytes):
+        return 1
+
+    def render(self, pdf_bytes, page_number, dpi=None, timeout=None):
+        self.renders.append(dpi)
+        return self.page.copy()
+
+
+class MatchingOSD:
+    """Reports the clockwise turn that makes an image match the upright scan"""
+
+    def __init__(self, scan, confidence=10.0, timeout=False):
+        self.scan = scan
+        self.confidence = confidence
+        self.timeout = timeout
+        self.read = []
+
+    def detect_orientation(self, image, timeout=None):
+        if self.timeout:
+            raise OCRTimeoutError("Orientation detection took longer than 10s")
+        rotate = next(turn for turn in TURNS if same(upright(image, turn), self.scan))
+        return rotate, self.confidence
+
+    def recognize(self, image, timeout=None):
+        self.read.append(image)
+        return "text"
+
+
+def detector(tmp_path, scan, turn, **osd):
+    return OrientationDetector(TurnedScan(scan, turn), MatchingOSD(scan, **osd),
+                               db_path=str(tmp_path / "orientation.db"))
+
+
+@pytest.mark.parametrize("turn", TURNS)
+def test_upright_undoes_a_counter_clockwise_turn(scan, turn):
+    assert same(upright(scan.rotate(turn, expand=True), turn), scan)
+
+
+def test_upright_leaves_unturned_pages_alone(scan):
+    assert upright(scan, 0) is scan
+
+
+@pytest.mark.parametrize("turn", TURNS)
+def test_rotation_finds_the_turn(tmp_path, scan, turn):
+    orientation = detector(tmp_path, scan, turn)
+    assert orientation.rotation(PDF, 1) == turn
+    assert orientation.rasterizer.renders == [orientation.dpi]
+
+
+def test_rotation_is_cached_per_page(tmp_path, scan):
+    orientation = detector(tmp_path, scan, 90)
+    assert orientation.rotation(PDF, 1) == 90
+    assert orientation.rotation(PDF, 1) == 90
+    assert len(orientation.rasterizer.renders) == 1
+    # Another detector on the same cache (another process) doesn't render either
+    again = OrientationDetector(orientation.rasterizer, orientation.recognizer, db_path=orientation.db_path)
+    assert again.rotation(PDF, 1) == 90
+    assert len(orientation.rasterizer.renders) == 1
+
+
+def test_low_confidence_leaves_the_page_as_is(tmp_path, scan):
+    orientation = detector(tmp_path, scan, 180, confidence=0.5)
+    assert orientation.rotation(PDF, 1) == 0
+
+
+def test_timeout_reads_the_page_as_is_and_retries_later(tmp_path, scan):
+    orientation = detector(tmp_path, scan, 270, timeout=True)
+    assert orientation.rotation(PDF, 1) == 0
+    orientation.recognizer.timeout = False
+    assert orientation.rotation(PDF, 1) == 270
+
+
+@pytest.mark.parametrize("turn", TURNS)
+def test_engine_reads_the_page_upright(tmp_path, scan, turn):
+    orientation = detector(tmp_path, scan, turn)
+    engine = OCREngine(orientation.rasterizer, orientation.recognizer, orientation=orientation)
+    engine.page_text(PDF, 1)
+    assert same(orientation.recognizer.read[-1], scan)
@@ -0,0 +1,106 @@
+import asyncio
+import threading
+import time
+import pytest
+from database import connect
+from ingest_service import FairQueue
+from ocr_scheduler import OCRScheduler, PRIORITY_BATCH, PRIORITY_INTERACTIVE
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "ocr_queue.db")
+
+
+def recorder(order, delay=0.05):
+    def page(name):
+        order.append(name)
+        time.sleep(delay)
+        return name
+    return page
+
+
+def test_interactive_page_overtakes_queued_batch_pages(db_path):
+    # Two schedulers on one queue stand in for the ingest pool and the app
+    ingest = OCRScheduler(workers=1, db_path=db_path, slots=1)
+    app = OCRScheduler(workers=1, db_path=db_path, slots=1)
+    order, started = [], threading.Event()
+    page = recorder(order, delay=0.2)
+
+    def first_batch_page(name):
+        started.set()
+        return page(name)
+
+    batch = [ingest.submit(first_batch_page, "batch-1", user="lab", priority=PRIORITY_BATCH)]
+    assert started.wait(5)
+    batch += [ingest.submit(page, f"batch-{i}", user="lab", priority=PRIORITY_BATCH) for i in range(2, 5)]
+    interactive = app.submit(page, "interactive", user="alice", priority=PRIORITY_INTERACTIVE)
+
+    assert interactive.result(10) == "interactive"
+    for future in batch:
+        future.result(10)
+    assert order == ["batch-1", "interactive", "batch-2", "batch-3", "batch-4"]
+
+
+def test_users_take_turns_within_a_priority(db_path):
+    scheduler = OCRScheduler(workers=1, db_path=db_path, slots=1)
+    order, gate = [], threading.Event()
+    page = recorder(order, delay=0)
+    blocker = scheduler.submit(gate.wait, 5, user="gate")
+    futures = [scheduler.submit(page, f"a{i}", user="a") for i in range(1, 4)]
+    futures.append(scheduler.submit(page, "b1", user="b"))
+    gate.set()
+    blocker.result(5)
+    for future in futures:
+        future.result(5)
+    assert order == ["a1", "b1", "a2", "a3"]
+
+
+def test_slots_bound_pages_across_schedulers(db_path):
+    schedulers = [OCRScheduler(workers=3, db_path=db_path, slots=2) for _ in range(2)]
+    lock, running, peak = threading.Lock(), [0], [0]
+
+    def page():
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+
+    futures = [scheduler.submit(page, user=f"user{i}") for scheduler in schedulers for i in range(4)]
+    for future in futures:
+        future.result(10)
+    assert peak[0] == 2
+
+
+def test_tickets_of_a_dead_process_are_dropped(db_path):
+    scheduler = OCRScheduler(workers=1, db_path=db_path, slots=1)
+    with connect(db_path) as conn:
+        conn.execute("INSERT INTO owners VALUES ('gone', ?)", (time.time() - 3600,))
+        conn.execute("INSERT INTO tickets (owner, priority, user, running) VALUES ('gone', 0, 'x', 1)")
+    assert scheduler.submit(lambda: "ran").result(5) == "ran"
+
+
+def test_cancelled_pages_leave_the_queue(db_path):
+    scheduler = OCRScheduler(workers=1, db_path=db_path, slots=1)
+    gate = threading.Event()
+    blocker = scheduler.submit(gate.wait, 5)
+    queued = scheduler.submit(lambda: "never")
+    assert queued.cancel()
+    assert scheduler.pending() == {}
+    gate.set()
+    blocker.result(5)
+
+
+def test_fair_queue_serves_users_round_robin():
+    async def drain():
+        queue = FairQueue(maxsize=4)
+        for item in ("a1", "a2", "a3"):
+            queue.put_nowait("a", item)
+        queue.put_nowait("b", "b1")
+        with pytest.raises(asyncio.QueueFull):
+            queue.put_nowait("c", "c1")
+        return [await queue.get() for _ in range(4)], queue.qsize()
+
+    assert asyncio.run(drain()) == (["a1", "b1", "a2", "a3"], 0)
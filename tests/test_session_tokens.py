@@ -0,0 +1,44 @@
+import base64
+import json
+import pytest
+from session_tokens import SessionTokenManager
+from user_store import UserStore
+
+
+@pytest.fixture
+def tokens(tmp_path):
+    store = UserStore(db_path=str(tmp_path / "users.db"), users_file=str(tmp_path / "users.json"),
+                      family_profiles_file=str(tmp_path / "family.json"))
+    store.add_user("alice", "hash", "alice@example.com")
+    return SessionTokenManager(store, secret=b"test-secret")
+
+
+def test_issued_token_verifies(tokens):
+    assert tokens.verify(tokens.issue("alice")) == "alice"
+
+
+def test_revoked_token_is_rejected(tokens):
+    token = tokens.issue("alice")
+    tokens.revoke(token)
+    assert tokens.verify(token) is None
+
+
+@pytest.mark.parametrize("token", [
+    None, 42, "", ".", "abc", "a.b.c", "é.abc", "abc.é", "abc.\x00", "\ud800.abc",
+    "!!!.abc", "e30.abc",
+])
+def test_malformed_tokens_are_rejected(tokens, token):
+    assert tokens.verify(token) is None
+    tokens.revoke(token)  # must not raise either
+
+
+@pytest.mark.parametrize("claims", [[1, 2], "alice", 7, None])
+def test_signed_non_object_claims_are_rejected(tokens, claims):
+    payload = base64.urlsafe_b64encode(json.dumps(claims).encode()).rstrip(b"=").decode()
+    assert tokens.verify(f"{payload}.{tokens._sign(payload)}") is None
+
+
+def test_tampered_payload_is_rejected(tokens):
+    payload, signature = tokens.issue("alice").split(".")
+    forged = base64.urlsafe_b64encode(b'{"u":"alice","exp":9999999999,"jti":"x"}').rstrip(b"=").decode()
+    assert tokens.verify(f"{forged}.{signature}") is None
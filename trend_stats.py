@@ -0,0 +1,236 @@
+import json
+import threading
+import pandas as pd
+from config import TREND_STATS_DB, TREND_ROLLING_WINDOW, TEXT_COLUMNS
+from database import connect
+from analytics_index import value_status
+
+SUMMARY_COLUMNS = ["Profile", "Parameter", "Count", "Last Value", "Last Change",
+                   "Rolling Mean", "Slope / 30 days", "Out of Range Streak"]
+
+
+def report_day(value):
+    """Ordinal day of a Date cell, or None if it can't be parsed"""
+    if value is None:
+        return None
+    try:
+        timestamp = pd.Timestamp(value)
+    except (TypeError, ValueError):
+        return None
+    return None if pd.isna(timestamp) else timestamp.toordinal()
+
+
+def report_profile(report):
+    """Profile a report belongs to (its patient name, '' if unknown)"""
+    name = report.get("Patient Name")
+    return "" if name is None or (isinstance(name, float) and name != name) else str(name).strip()
+
+
+def _fresh_stats():
+    return {"count": 0, "anchor": None, "last_day": None, "last_value": None, "prev_value": None,
+            "window": [], "sum_x": 0.0, "sum_y": 0.0, "sum_xx": 0.0, "sum_xy": 0.0, "streak": 0}
+
+
+def _append(stats, day, value, out_of_range, window=TREND_ROLLING_WINDOW):
+    """Fold one observation (in date order) into a series' running stats"""
+    if stats["anchor"] is None:
+        stats["anchor"] = day
+    # Days are measured from the series' first point so the sums stay small
+    x = float(day - stats["anchor"])
+    stats["count"] += 1
+    stats["prev_value"], stats["last_value"] = stats["last_value"], value
+    stats["last_day"] = day
+    stats["window"] = (stats["window"] + [value])[-window:]
+    stats["sum_x"] += x
+    stats["sum_y"] += value
+    stats["sum_xx"] += x * x
+    stats["sum_xy"] += x * value
+    stats["streak"] = stats["streak"] + 1 if out_of_range else 0
+    return stats
+
+
+class TrendStats:
+    """Materialized per-profile trend statistics for each parameter.
+
+    ``trend_points`` keeps one row per (report, parameter) and
+    ``trend_stats`` one row per (user, profile, parameter) with running
+    sums for the least-squares slope, the last few values for the rolling
+    mean and the current out-of-range streak. Reports arriving in date
+    order are folded in O(1); back-dated inserts, edits and deletes only
+    replay the affected series, never the user's whole history.
+    """
+
+    def __init__(self, db_path=TREND_STATS_DB):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._ensure_schema()
+
+    def _connect(self):
+        return connect(self.db_path)
+
+    def _ensure_schema(self):
+        """Create tables and indexes if they don't exist"""
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS trend_points (
+                    username TEXT NOT NULL,
+                    profile TEXT NOT NULL,
+                    parameter TEXT NOT NULL,
+                    row_index INTEGER NOT NULL,
+                    day INTEGER NOT NULL,
+                    value REAL NOT NULL,
+                    out_of_range INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_trend_points_series
+                    ON trend_points (username, profile, parameter, day, row_index);
+                CREATE INDEX IF NOT EXISTS idx_trend_points_row
+                    ON trend_points (username, row_index);
+                CREATE TABLE IF NOT EXISTS trend_stats (
+                    username TEXT NOT NULL,
+                    profile TEXT NOT NULL,
+                    parameter TEXT NOT NULL,
+                    stats TEXT NOT NULL,
+                    PRIMARY KEY (username, profile, parameter)
+                );
+                CREATE TABLE IF NOT EXISTS indexed_users (
+                    username TEXT PRIMARY KEY
+                );
+            """)
+
+    def _points(self, username, row_index, report):
+        """Turn one report row into (profile, parameter, row, day, value, out_of_range) tuples"""
+        day = report_day(report.get("Date"))
+        if day is None:
+            return []
+        profile = report_profile(report)
+
+        points = []
+        for parameter, value in report.items():
+            if parameter in TEXT_COLUMNS or value is None:
+                continue
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                continue
+            if value != value:
+                continue
+            points.append((profile, parameter, row_index, day, value,
+                           int(value_status(parameter, value) in ("Low", "High"))))
+        return points
+
+    def _load(self, conn, username, profile, parameter):
+        row = conn.execute(
+            "SELECT stats FROM trend_stats WHERE username = ? AND profile = ? AND parameter = ?",
+            (username, profile, parameter)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _store(self, conn, username, profile, parameter, stats):
+        if stats["count"]:
+            conn.execute("INSERT OR REPLACE INTO trend_stats VALUES (?, ?, ?, ?)",
+                         (username, profile, parameter, json.dumps(stats)))
+        else:
+            conn.execute("DELETE FROM trend_stats WHERE username = ? AND profile = ? AND parameter = ?",
+                         (username, profile, parameter))
+
+    def _replay(self, conn, username, profile, parameter):
+        """Recompute one series from its points"""
+        stats = _fresh_stats()
+        for day, value, out_of_range in conn.execute("""
+            SELECT day, value, out_of_range FROM trend_points
+            WHERE username = ? AND profile = ? AND parameter = ?
+            ORDER BY day, row_index
+        """, (username, profile, parameter)):
+            _append(stats, day, value, out_of_range)
+        self._store(conn, username, profile, parameter, stats)
+
+    def _insert(self, conn, username, points):
+        """Add points, folding in-order ones and replaying back-dated series"""
+        conn.executemany("INSERT INTO trend_points VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         [(username,) + point for point in points])
+        for profile, parameter, _, day, value, out_of_range in points:
+            stats = self._load(conn, username, profile, parameter) or _fresh_stats()
+            if stats["last_day"] is not None and day < stats["last_day"]:
+                self._replay(conn, username, profile, parameter)
+            else:
+                self._store(conn, username, profile, parameter, _append(stats, day, value, out_of_range))
+
+    def _remove(self, conn, username, row_index):
+        """Drop one row's points and replay the series they belonged to"""
+        series = conn.execute(
+            "SELECT DISTINCT profile, parameter FROM trend_points WHERE username = ? AND row_index = ?",
+            (username, row_index)
+        ).fetchall()
+        conn.execute("DELETE FROM trend_points WHERE username = ? AND row_index = ?", (username, row_index))
+        for profile, parameter in series:
+            self._replay(conn, username, profile, parameter)
+
+    def has_user(self, username):
+        """Check whether a user's rows have been indexed yet"""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT 1 FROM indexed_users WHERE username = ?", (username,)
+            ).fetchone() is not None
+
+    def add_report(self, username, row_index, report):
+        """Fold one newly appended report into its series"""
+        points = self._points(username, row_index, report)
+        with self._lock, self._connect() as conn:
+            self._insert(conn, username, points)
+
+    def update_report(self, username, row_index, report):
+        """Replace one row's values (e.g. after an edit)"""
+        points = self._points(username, row_index, report)
+        with self._lock, self._connect() as conn:
+            self._remove(conn, username, row_index)
+            self._insert(conn, username, points)
+
+    def delete_report(self, username, row_index):
+        """Remove one row; later rows shift up by one as in the workbook"""
+        with self._lock, self._connect() as conn:
+            self._remove(conn, username, row_index)
+            conn.execute("UPDATE trend_points SET row_index = row_index - 1 WHERE username = ? AND row_index > ?",
+                         (username, row_index))
+
+    def reindex_user(self, username, indexed_reports):
+        """Rebuild a user's statistics from (row_index, report) pairs"""
+        points = [point for row_index, report in indexed_reports
+                  for point in self._points(username, row_index, report)]
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM trend_points WHERE username = ?", (username,))
+            conn.execute("DELETE FROM trend_stats WHERE username = ?", (username,))
+            # Recorded even when there are no rows, so has_user doesn't trigger another rebuild
+            conn.execute("INSERT OR IGNORE INTO indexed_users VALUES (?)", (username,))
+            conn.executemany("INSERT INTO trend_points VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             [(username,) + point for point in points])
+            for profile, parameter in {(point[0], point[1]) for point in points}:
+                self._replay(conn, username, profile, parameter)
+
+    def summary(self, username, profile=None):
+        """Get one row of trend statistics per (profile, parameter)"""
+        query = "SELECT profile, parameter, stats FROM trend_stats WHERE username = ?"
+        params = [username]
+        if profile is not None:
+            query += " AND profile = ?"
+            params.append(profile)
+        with self._connect() as conn:
+            rows = conn.execute(query + " ORDER BY profile, parameter", params).fetchall()
+
+        summary = []
+        for profile, parameter, stats in rows:
+            stats = json.loads(stats)
+            n = stats["count"]
+            denominator = n * stats["sum_xx"] - stats["sum_x"] ** 2
+            slope = (n * stats["sum_xy"] - stats["sum_x"] * stats["sum_y"]) / denominator if denominator else None
+            change = stats["last_value"] - stats["prev_value"] if stats["prev_value"] is not None else None
+            summary.append([
+                profile or "Unknown",
+                parameter,
+                n,
+                stats["last_value"],
+                round(change, 3) if change is not None else None,
+                round(sum(stats["window"]) / len(stats["window"]), 3),
+                round(slope * 30, 3) if slope is not None else None,
+                stats["streak"],
+            ])
+        return pd.DataFrame(summary, columns=SUMMARY_COLUMNS)
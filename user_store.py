@@ -0,0 +1,183 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from config import USERS_DB, USERS_FILE, FAMILY_PROFILES_FILE
+from database import connect
+
+# Per-user records cached per database file, shared across AuthManager instances
+_caches = {}
+_caches_lock = threading.Lock()
+
+MEMBER_FIELDS = ["name", "age", "gender", "relationship", "created_at"]
+
+
+class UserStore:
+    """SQLite-backed users and family members with an in-process cache.
+
+    Lookups and writes touch a single user's rows. Cached records are
+    dropped whenever the database file's mtime changes, so writes from
+    other processes are picked up on the next call.
+    """
+
+    def __init__(self, db_path=USERS_DB, users_file=USERS_FILE,
+                 family_profiles_file=FAMILY_PROFILES_FILE):
+        self.db_path = db_path
+        self.users_file = users_file
+        self.family_profiles_file = family_profiles_file
+        self._ensure_schema()
+        self._migrate_json()
+
+    def _connect(self):
+        return connect(self.db_path)
+
+    def _ensure_schema(self):
+        """Create tables if they don't exist"""
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS users (
+                    username TEXT PRIMARY KEY,
+                    password TEXT NOT NULL,
+                    email TEXT
+                );
+                CREATE TABLE IF NOT EXISTS family_members (
+                    username TEXT NOT NULL,
+                    member_id TEXT NOT NULL,
+                    name TEXT,
+                    age,
+                    gender TEXT,
+                    relationship TEXT,
+                    created_at TEXT,
+                    PRIMARY KEY (username, member_id)
+                );
+                CREATE TABLE IF NOT EXISTS revoked_tokens (
+                    token_id TEXT PRIMARY KEY,
+                    expires_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+            """)
+
+    def _load_json(self, path):
+        """Load a legacy JSON file, empty if missing or unreadable"""
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _migrate_json(self):
+        """One-off import of users.json and family_profiles.json"""
+        with self._connect() as conn:
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+                return
+
+            users = self._load_json(self.users_file)
+            profiles = self._load_json(self.family_profiles_file)
+
+            for username, user in users.items():
+                conn.execute(
+                    "INSERT OR IGNORE INTO users VALUES (?, ?, ?)",
+                    (username, user.get("password"), user.get("email"))
+                )
+
+            for username in set(users) | set(profiles):
+                members = dict(profiles.get(username) or {})
+                members.update(users.get(username, {}).get("family_members") or {})
+                for member_id, member in members.items():
+                    self._insert_member(conn, username, member_id, member, replace=False)
+
+            conn.execute("INSERT INTO meta VALUES ('json_migrated', '1')")
+
+    def _insert_member(self, conn, username, member_id, member, replace=True):
+        """Insert a family member row"""
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        conn.execute(
+            f"{verb} INTO family_members VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (username, member_id, *[member.get(field) for field in MEMBER_FIELDS])
+        )
+
+    def _cache(self):
+        """Get this database's cache, cleared if the file changed since last use"""
+        try:
+            stamp = os.stat(self.db_path).st_mtime_ns
+        except OSError:
+            stamp = None
+
+        with _caches_lock:
+            entry = _caches.get(self.db_path)
+            if entry is None or entry["stamp"] != stamp:
+                entry = {"stamp": stamp, "users": {}}
+                _caches[self.db_path] = entry
+            return entry["users"]
+
+    def _invalidate(self):
+        with _caches_lock:
+            _caches.pop(self.db_path, None)
+
+    def get_user(self, username):
+        """Get a user record with its family members, or None"""
+        cache = self._cache()
+        if username in cache:
+            return cache[username]
+
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT password, email FROM users WHERE username = ?", (username,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            members = {}
+            for member_id, *values in conn.execute(
+                f"SELECT member_id, {', '.join(MEMBER_FIELDS)} FROM family_members "
+                "WHERE username = ? ORDER BY rowid", (username,)
+            ):
+                members[member_id] = dict(zip(MEMBER_FIELDS, values))
+
+        user = {"password": row[0], "email": row[1], "family_members": members}
+        cache[username] = user
+        return user
+
+    def add_user(self, username, password_hash, email):
+        """Create a user, returns False if the username is taken"""
+        try:
+            with self._connect() as conn:
+                conn.execute("INSERT INTO users VALUES (?, ?, ?)", (username, password_hash, email))
+        except sqlite3.IntegrityError:
+            return False
+        finally:
+            self._invalidate()
+        return True
+
+    def add_family_member(self, username, member_id, member):
+        """Add (or replace) one family member"""
+        with self._connect() as conn:
+            self._insert_member(conn, username, member_id, member)
+        self._invalidate()
+
+    def delete_family_member(self, username, member_id):
+        """Delete one family member, returns False if it didn't exist"""
+        with self._connect() as conn:
+            deleted = conn.execute(
+                "DELETE FROM family_members WHERE username = ? AND member_id = ?",
+                (username, member_id)
+            ).rowcount
+        self._invalidate()
+        return deleted > 0
+
+    def revoke_token(self, token_id, expires_at):
+        """Add a session token to the revocation list and purge expired entries"""
+        with self._connect() as conn:
+            conn.execute("INSERT OR IGNORE INTO revoked_tokens VALUES (?, ?)", (token_id, expires_at))
+            conn.execute("DELETE FROM revoked_tokens WHERE expires_at < ?", (time.time(),))
+
+    def is_token_revoked(self, token_id):
+        """Check the revocation list for a session token"""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT 1 FROM revoked_tokens WHERE token_id = ?", (token_id,)
+            ).fetchone() is not None
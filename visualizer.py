@@ -1,11 +1,87 @@
 import plotly.graph_objects as go
 import plotly.express as px
+from plotly.subplots import make_subplots
+import math
+import threading
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
-from config import NORMAL_RANGES, COLOR_PALETTE
+from config import NORMAL_RANGES, COLOR_PALETTE, CHART_POINT_BUDGET, CHART_WEBGL_THRESHOLD
+
+# Status codes returned by the vectorized classifier
+STATUS_UNKNOWN, STATUS_LOW, STATUS_NORMAL, STATUS_HIGH = 0, 1, 2, 3
+STATUS_LABELS = np.array(["Unknown", "Low", "Normal", "High"])
+
+
+class RangeTable:
+    """NORMAL_RANGES as aligned NumPy arrays, built once per process"""
+    
+    def __init__(self, normal_ranges=NORMAL_RANGES):
+        self.parameters = list(normal_ranges)
+        self.positions = {param: i for i, param in enumerate(self.parameters)}
+        self.mins = np.array([normal_ranges[p]["min"] for p in self.parameters], dtype=float)
+        self.maxs = np.array([normal_ranges[p]["max"] for p in self.parameters], dtype=float)
+        # 0-0 marks a parameter with no reference range (ultrasound sizes)
+        self.unranged = (self.mins == 0) & (self.maxs == 0)
+    
+    def classify(self, df):
+        """Low/Normal/High code matrix (int8) for every ranged column of df"""
+        columns = [c for c in df.columns if c in self.positions]
+        values = df[columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+        idx = [self.positions[c] for c in columns]
+        
+        # Same rules as check_value_status: below min is Low, above max is High
+        codes = np.full(values.shape, STATUS_NORMAL, dtype=np.int8)
+        codes[values < self.mins[idx]] = STATUS_LOW
+        codes[values > self.maxs[idx]] = STATUS_HIGH
+        codes[np.isnan(values) | self.unranged[idx]] = STATUS_UNKNOWN
+        return pd.DataFrame(codes, index=df.index, columns=columns)
+
+
+RANGE_TABLE = RangeTable()
+
+
+def lttb_downsample(x, y, threshold):
+    """Largest-Triangle-Three-Buckets: indices of at most threshold points
+    
+    Keeps the first and last points and, from each bucket in between, the
+    point forming the largest triangle with the previously kept point and
+    the next bucket's average, which preserves peaks and troughs.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    
+    keep = np.empty(threshold, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        
+        areas = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a]) -
+            (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(areas.argmax())
+        keep[i + 1] = a
+    return keep
+
 
 class Visualizer:
-    def __init__(self):
+    def __init__(self, figure_cache_size=32):
         self.normal_ranges = NORMAL_RANGES
+        self.range_table = RANGE_TABLE
+        # Dashboard figures memoized by data version (shared across sessions)
+        self._figure_cache = OrderedDict()
+        self._figure_cache_size = figure_cache_size
+        self._figure_cache_lock = threading.Lock()
     
     def check_value_status(self, parameter, value):
         """Check if a value is within normal range"""
@@ -13,6 +89,8 @@ class Visualizer:
             return "Unknown", "#808080"
         
         ranges = self.normal_ranges[parameter]
+        if ranges["min"] == ranges["max"] == 0:
+            return "Unknown", "#808080"
         if value < ranges["min"]:
             return "Low", "#FF4444"
         elif value > ranges["max"]:
@@ -20,25 +98,66 @@ class Visualizer:
         else:
             return "Normal", "#00CC00"
     
+    def classify_frame(self, df):
+        """Status codes for a whole report frame in one vectorized pass"""
+        return self.range_table.classify(df)
+    
     def create_status_table(self, latest_values):
         """Create a status summary table"""
+        row = pd.DataFrame([latest_values])
+        codes = self.classify_frame(row).iloc[0]
         data = []
         
-        for param, value in latest_values.items():
-            if param in self.normal_ranges and value is not None and not pd.isna(value):
-                status, color = self.check_value_status(param, value)
+        for param, code in codes.items():
+            if code != STATUS_UNKNOWN:
+                value = latest_values[param]
                 ranges = self.normal_ranges[param]
                 data.append({
                     "Parameter": param,
                     "Value": f"{value} {ranges['unit']}",
                     "Normal Range": f"{ranges['min']} - {ranges['max']} {ranges['unit']}",
-                    "Status": status
+                    "Status": STATUS_LABELS[code]
                 })
         
         return pd.DataFrame(data)
     
-    def create_multi_test_trend_chart(self, df, parameter, report_type=None):
-        """Create a multi-line trend chart showing all tests of same type"""
+    def create_alert_table(self, df):
+        """Abnormal-value counts per parameter across a report history"""
+        codes = self.classify_frame(df)
+        if codes.empty:
+            return pd.DataFrame()
+        
+        matrix = codes.to_numpy()
+        low = (matrix == STATUS_LOW).sum(axis=0)
+        high = (matrix == STATUS_HIGH).sum(axis=0)
+        measured = (matrix != STATUS_UNKNOWN).sum(axis=0)
+        
+        alerts = pd.DataFrame({
+            "Parameter": codes.columns,
+            "Low": low,
+            "High": high,
+            "Measured": measured,
+        })
+        
+        if 'Date' in df.columns:
+            abnormal = (matrix == STATUS_LOW) | (matrix == STATUS_HIGH)
+            # NaT is the smallest int64, so it never wins the max
+            dates = pd.to_datetime(df['Date'], errors='coerce').to_numpy(dtype='datetime64[ns]').view('int64')
+            missing = np.iinfo(np.int64).min
+            last = np.where(abnormal, dates[:, None], missing).max(axis=0)
+            alerts["Last Abnormal"] = pd.to_datetime(last).strftime('%Y-%m-%d')
+        
+        alerts = alerts[(alerts["Low"] + alerts["High"]) > 0]
+        return alerts.sort_values(["High", "Low"], ascending=False).reset_index(drop=True)
+    
+    def create_multi_test_trend_chart(self, df, parameter, report_type=None, x_range=None,
+                                      point_budget=CHART_POINT_BUDGET):
+        """Create a multi-line trend chart showing all tests of same type
+        
+        Series longer than point_budget are LTTB-downsampled and large charts
+        switch to WebGL traces; pass x_range=(start, end) to zoom into a date
+        window, which is drawn at full resolution when it fits the budget.
+        """
         if df.empty or parameter not in df.columns:
             return None
         
@@ -46,6 +165,10 @@ class Visualizer:
         if report_type and 'Report Type' in df.columns:
             df = df[df['Report Type'] == report_type]
         
+        if x_range and 'Date' in df.columns:
+            start, end = pd.to_datetime(x_range[0]), pd.to_datetime(x_range[1])
+            df = df[(df['Date'] >= start) & (df['Date'] <= end)]
+        
         if df.empty:
             return None
         
@@ -55,40 +178,56 @@ class Visualizer:
         else:
             patients = ['All Tests']
         
-        fig = go.Figure()
-        
-        # Add a line for each patient
-        for i, patient in enumerate(patients):
+        series = []
+        for patient in patients:
             if 'Patient Name' in df.columns:
                 patient_data = df[df['Patient Name'] == patient]
             else:
                 patient_data = df
             
-            patient_data = patient_data[['Date', parameter]].dropna()
+            patient_data = patient_data[['Date', parameter]].copy()
+            patient_data[parameter] = pd.to_numeric(patient_data[parameter], errors='coerce')
+            patient_data = patient_data.dropna().sort_values('Date')
             
+            if len(patient_data) > point_budget:
+                keep = lttb_downsample(
+                    patient_data['Date'].to_numpy(dtype='datetime64[ns]').view('int64'),
+                    patient_data[parameter].to_numpy(),
+                    point_budget
+                )
+                patient_data = patient_data.iloc[keep]
+            series.append((patient, patient_data))
+        
+        total_points = sum(len(data) for _, data in series)
+        trace_type = go.Scattergl if total_points > CHART_WEBGL_THRESHOLD else go.Scatter
+        marker_size = 10 if total_points <= 200 else 4
+        
+        fig = go.Figure()
+        
+        # Add a line for each patient
+        for i, (patient, patient_data) in enumerate(series):
             if not patient_data.empty:
                 color = COLOR_PALETTE[i % len(COLOR_PALETTE)]
                 
-                fig.add_trace(go.Scatter(
+                fig.add_trace(trace_type(
                     x=patient_data['Date'],
                     y=patient_data[parameter],
                     mode='lines+markers',
                     name=f"{patient}",
                     line=dict(color=color, width=3),
-                    marker=dict(size=10, symbol='circle'),
+                    marker=dict(size=marker_size, symbol='circle'),
                     hovertemplate=(
-                        '<b>%{text}</b><br>' +
-                        'Date: %{x}<br>' +
+                        '<b>%{x|%Y-%m-%d}</b><br>' +
                         f'{parameter}: %{{y}}<br>' +
                         'Patient: ' + str(patient) +
                         '<extra></extra>'
-                    ),
-                    text=patient_data['Date'].dt.strftime('%Y-%m-%d')
+                    )
                 ))
         
         # Set y-axis to start from 0
         y_min = 0
-        y_max = df[parameter].max() * 1.1 if not df[parameter].empty else 10
+        values = pd.to_numeric(df[parameter], errors='coerce')
+        y_max = values.max() * 1.1 if values.notna().any() else 10
         
         fig.update_layout(
             title={
@@ -134,6 +273,121 @@ class Visualizer:
         
         return fig
     
+    def build_series(self, df, parameters, point_budget=CHART_POINT_BUDGET):
+        """Group the frame once by (patient, report type) and slice every series
+        
+        Returns {parameter: [((patient, report_type), data), ...]} where data
+        is a Date-sorted, numeric, downsampled two-column frame.
+        """
+        keys = [c for c in ('Patient Name', 'Report Type') if c in df.columns]
+        columns = [p for p in parameters if p in df.columns]
+        
+        frame = df[['Date'] + keys + columns].copy()
+        frame[columns] = frame[columns].apply(pd.to_numeric, errors='coerce')
+        frame = frame.sort_values('Date')
+        
+        series = {param: [] for param in columns}
+        groups = frame.groupby(keys, dropna=False, sort=False) if keys else [(("All Tests",), frame)]
+        for key, group in groups:
+            key = key if isinstance(key, tuple) else (key,)
+            key = tuple("Unknown" if pd.isna(k) else k for k in key)
+            for param in columns:
+                data = group[['Date', param]].dropna()
+                if data.empty:
+                    continue
+                if len(data) > point_budget:
+                    data = data.iloc[lttb_downsample(
+                        data['Date'].to_numpy(dtype='datetime64[ns]').view('int64'),
+                        data[param].to_numpy(),
+                        point_budget
+                    )]
+                series[param].append((key, data))
+        return series
+    
+    def create_dashboard_figure(self, df, parameters, report_type=None, x_range=None,
+                                data_version=None, columns=2, point_budget=CHART_POINT_BUDGET):
+        """Small-multiples trend figure for several parameters in one pass
+        
+        Figures are memoized by data_version (e.g. DataManager.data_version()),
+        so reruns without new data reuse the previous figure.
+        """
+        cache_key = None
+        if data_version is not None:
+            cache_key = (data_version, tuple(parameters), report_type,
+                         tuple(str(x) for x in x_range) if x_range else None, columns, point_budget)
+            with self._figure_cache_lock:
+                if cache_key in self._figure_cache:
+                    self._figure_cache.move_to_end(cache_key)
+                    return self._figure_cache[cache_key]
+        
+        if df.empty or 'Date' not in df.columns:
+            return None
+        if report_type and 'Report Type' in df.columns:
+            df = df[df['Report Type'] == report_type]
+        if x_range:
+            start, end = pd.to_datetime(x_range[0]), pd.to_datetime(x_range[1])
+            df = df[(df['Date'] >= start) & (df['Date'] <= end)]
+        
+        series = self.build_series(df, parameters, point_budget)
+        parameters = [p for p in parameters if series.get(p)]
+        if not parameters:
+            return None
+        
+        rows = math.ceil(len(parameters) / columns)
+        fig = make_subplots(rows=rows, cols=columns, subplot_titles=parameters,
+                            vertical_spacing=0.12 / max(rows, 1) + 0.04)
+        
+        total_points = sum(len(data) for p in parameters for _, data in series[p])
+        trace_type = go.Scattergl if total_points > CHART_WEBGL_THRESHOLD else go.Scatter
+        marker_size = 8 if total_points <= 200 else 3
+        
+        # One color and legend entry per patient / report type across all panels
+        colors, shown = {}, set()
+        for i, param in enumerate(parameters):
+            row, col = i // columns + 1, i % columns + 1
+            for key, data in series[param]:
+                name = key[0] if report_type or len(key) == 1 else f"{key[0]} · {key[1]}"
+                color = colors.setdefault(name, COLOR_PALETTE[len(colors) % len(COLOR_PALETTE)])
+                fig.add_trace(trace_type(
+                    x=data['Date'],
+                    y=data[param],
+                    mode='lines+markers',
+                    name=str(name),
+                    legendgroup=str(name),
+                    showlegend=name not in shown,
+                    line=dict(color=color, width=2),
+                    marker=dict(size=marker_size),
+                    hovertemplate=(
+                        '<b>%{x|%Y-%m-%d}</b><br>' +
+                        f'{param}: %{{y}}<br>' +
+                        f'Patient: {name}' +
+                        '<extra></extra>'
+                    )
+                ), row=row, col=col)
+                shown.add(name)
+        
+        fig.update_layout(
+            height=320 * rows,
+            hovermode='closest',
+            plot_bgcolor='white',
+            paper_bgcolor='white',
+            legend=dict(
+                font=dict(color='black', size=12),
+                bgcolor='rgba(255,255,255,0.8)',
+                bordercolor='black',
+                borderwidth=1
+            )
+        )
+        fig.update_xaxes(showgrid=True, gridcolor='lightgray', tickfont=dict(color='black'))
+        fig.update_yaxes(showgrid=True, gridcolor='lightgray', tickfont=dict(color='black'), rangemode='tozero')
+        
+        if cache_key is not None:
+            with self._figure_cache_lock:
+                self._figure_cache[cache_key] = fig
+                while len(self._figure_cache) > self._figure_cache_size:
+                    self._figure_cache.popitem(last=False)
+        return fig
+    
     def create_comparison_chart(self, df, parameters, report_type=None):
         """Create comparison chart for multiple parameters"""
         if df.empty: